@@ -5,6 +5,8 @@ Django settings for carbon_tracker project.
 from pathlib import Path
 import os
 
+from decouple import config, Csv
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -12,9 +14,9 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 SECRET_KEY = 'django-insecure-your-secret-key-here-change-in-production'
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = config('DEBUG', default=True, cast=bool)
 
-ALLOWED_HOSTS = []
+ALLOWED_HOSTS = config('ALLOWED_HOSTS', default='', cast=Csv())
 
 # Application definition
 INSTALLED_APPS = [
@@ -24,18 +26,24 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
-    'rest_framework',
     'crispy_forms',
     'crispy_bootstrap5',
     'footprint',
 ]
 
+# No view uses Django REST framework yet, so it is only loaded where the
+# browsable API is wanted; every other process boots without it.
+if config('ENABLE_REST_FRAMEWORK', default=False, cast=bool):
+    INSTALLED_APPS.insert(INSTALLED_APPS.index('crispy_forms'), 'rest_framework')
+
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'footprint.middleware.HouseholdMiddleware',
+    'footprint.middleware.ReadReplicaMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -58,16 +66,103 @@ TEMPLATES = [
     },
 ]
 
+# Production always renders through the cached template loader, compiling
+# each template once per process instead of on every request.
+if not DEBUG:
+    TEMPLATES[0]['APP_DIRS'] = False
+    TEMPLATES[0]['OPTIONS']['loaders'] = [
+        ('django.template.loaders.cached.Loader', [
+            'django.template.loaders.filesystem.Loader',
+            'django.template.loaders.app_directories.Loader',
+        ]),
+    ]
+
 WSGI_APPLICATION = 'carbon_tracker.wsgi.application'
 
+# Import views, template libraries and the NumPy engines when the WSGI
+# module loads and freeze the heap, so workers forked from a preloading
+# master (gunicorn --preload) share them copy-on-write.
+WSGI_WARM_UP = config('WSGI_WARM_UP', default=not DEBUG, cast=bool)
+
 # Database
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': config('DATABASE_NAME', default=str(BASE_DIR / 'db.sqlite3')),
+        # On disk rather than in memory, so tests can use several connections
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
     }
 }
 
+# Optional read replica for read-only views (dashboard, reports, tips,
+# chart data): a copy of the primary refreshed by `manage.py refresh_replica`.
+DATABASE_REPLICA = config('DATABASE_REPLICA', default='')
+if DATABASE_REPLICA:
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': DATABASE_REPLICA,
+        'TEST': {'MIRROR': 'default'},
+    }
+
+# Seconds a client's reads stay on the primary after it writes; keep this
+# above the replica refresh interval
+READ_REPLICA_STICKY_SECONDS = config('READ_REPLICA_STICKY_SECONDS', default=60, cast=int)
+
+# Optional sharding of households, their activity data and footprints over
+# shard_0 .. shard_N-1 by a stable hash of the household id. Create the
+# shard files with `manage.py shard_households`.
+DATABASE_SHARDS = config('DATABASE_SHARDS', default=0, cast=int)
+DATABASE_SHARD_DIR = config('DATABASE_SHARD_DIR', default=str(BASE_DIR / 'shards'))
+for i in range(DATABASE_SHARDS):
+    DATABASES[f'shard_{i}'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(DATABASE_SHARD_DIR, f'shard_{i}.sqlite3'),
+    }
+
+# ShardRouter picks the shard for household-owned models; ReplicaRouter
+# comes last and sends everything else to the primary (or the replica)
+DATABASE_ROUTERS = ['footprint.replica.ReplicaRouter'] if DATABASE_REPLICA or DATABASE_SHARDS else []
+if DATABASE_SHARDS:
+    DATABASE_ROUTERS.insert(0, 'footprint.sharding.ShardRouter')
+
+# Cache (template fragments are keyed on row versions, see footprint/caching.py)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'carbon-tracker',
+    }
+}
+
+# Seconds a rendered template fragment may live in the cache
+FRAGMENT_CACHE_TIMEOUT = 60 * 60
+
+# Seconds the logged-in user and their household may be served from the
+# cache. Entries are dropped when either is saved, so this only applies to
+# a cache shared between workers (e.g. Redis or Memcached); with the
+# per-process default they are read from the database on every request.
+IDENTITY_CACHE_TIMEOUT = 5 * 60
+
+# Live dashboard updates (server-sent events, served through asgi.py). One
+# task per process polls for new footprints every LIVE_POLL_SECONDS; each
+# stream ends after LIVE_STREAM_SECONDS and the browser reconnects, resuming
+# from the last event it saw as long as it is within the retention window.
+LIVE_POLL_SECONDS = config('LIVE_POLL_SECONDS', default=1.0, cast=float)
+LIVE_STREAM_SECONDS = 5 * 60
+LIVE_EVENT_RETENTION_SECONDS = 60 * 60
+
+# ModelBackend stays listed so sessions it logged in remain valid
+AUTHENTICATION_BACKENDS = [
+    'footprint.backends.CachedModelBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+
+# 'django.contrib.sessions.backends.cached_db' or '...signed_cookies' serve
+# sessions without a database read on every request.
+SESSION_ENGINE = config('SESSION_ENGINE', default='django.contrib.sessions.backends.db')
+
+# Memory-mapped analytics snapshot written by `manage.py build_snapshot`
+ANALYTICS_SNAPSHOT_DIR = config('ANALYTICS_SNAPSHOT_DIR', default=str(BASE_DIR / 'snapshots'))
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -7,10 +7,46 @@ For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/wsgi/
 """
 
+import gc
 import os
 
+from django.conf import settings
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'carbon_tracker.settings')
 
-application = get_wsgi_application() 
\ No newline at end of file
+application = get_wsgi_application()
+
+# Templates compiled up front when the cached loader is active
+WARM_TEMPLATES = [
+    'base.html',
+    'footprint/home.html',
+    'footprint/dashboard.html',
+    'footprint/calculate_footprint.html',
+]
+
+
+def warm_up():
+    """Load what the first requests would, then move it out of the GC's reach"""
+    from django.template import engines
+    from django.urls import get_resolver
+
+    import footprint.archive  # noqa: F401
+    import footprint.forecasting  # noqa: F401
+    import footprint.grid  # noqa: F401
+    import footprint.scenarios  # noqa: F401
+    import footprint.snapshot  # noqa: F401
+
+    get_resolver().url_patterns
+    engine = engines['django']
+    for name in WARM_TEMPLATES:
+        engine.get_template(name)
+
+    # Objects alive now are never collected; freezing them stops the first
+    # collection in each worker from writing to (and so copying) every page.
+    gc.collect()
+    gc.freeze()
+
+
+if settings.WSGI_WARM_UP:
+    warm_up()
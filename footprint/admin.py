@@ -1,12 +1,136 @@
 from django.contrib import admin
+from django.core.exceptions import FieldDoesNotExist
+from django.http import QueryDict
+
 from .models import (
-    Household, EnergyUsage, Transportation, Diet, Waste, 
-    CarbonFootprint, SustainabilityTip
+    Household, HouseholdDirectory, EnergyUsage, Transportation, Diet, Waste, 
+    CarbonFootprint, FootprintEvent, FootprintForecast, SustainabilityTip, ActivitySketch,
+    ActivityArchive, Organisation, OrganisationMember, OrganisationRollup,
+    LeaderboardEntry, LeaderboardNode,
+    MeterDay, MeterMonth, TripMonth, TripBatch, GridFactor, ApiKey
 )
+from .sharding import is_sharded, shard_aliases, sharding_enabled, use_shard
+
+
+# Changelist parameter naming the shard a sharded changelist shows
+SHARD_PARAM = 'shard'
+
+
+def same_database(model, path):
+    """Whether a lookup path from ``model`` only crosses relations on its own database when sharded"""
+    sharded = is_sharded(model)
+    for name in path.lstrip('^=@').split('__'):
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            break
+        if not field.is_relation:
+            break
+        model = field.related_model
+        if is_sharded(model) != sharded:
+            return False
+    return True
+
+
+def admin_shard(request):
+    """Shard picked with ShardFilter; change pages carry it in their preserved filters"""
+    shard = request.GET.get(SHARD_PARAM) or QueryDict(request.GET.get('_changelist_filters', '')).get(SHARD_PARAM)
+    return shard if shard in shard_aliases() else shard_aliases()[0]
+
+
+class ShardFilter(admin.SimpleListFilter):
+    """Shard a sharded changelist shows, the first one unless another is picked"""
+    title = 'shard'
+    parameter_name = SHARD_PARAM
+
+    def lookups(self, request, model_admin):
+        return [(alias, alias) for alias in shard_aliases()]
+
+    def value(self):
+        value = super().value()
+        return value if value in shard_aliases() else shard_aliases()[0]
+
+    def choices(self, changelist):
+        # No "All": a changelist is read from one database
+        for alias, title in self.lookup_choices:
+            yield {
+                'selected': self.value() == alias,
+                'query_string': changelist.get_query_string({self.parameter_name: alias}),
+                'display': title,
+            }
+
+    def queryset(self, request, queryset):
+        # ShardedAdmin.get_queryset already reads the picked shard
+        return queryset
+
+
+class ShardAwareAdmin(admin.ModelAdmin):
+    """Admin whose joins and searches stay on one database when households are sharded.
+
+    Users and organisations stay on the default database while households
+    and their rows move to shards. With sharding on, the changelist only
+    joins relations on the model's own database and loads the others row
+    by row through the router, and searches on the others are dropped.
+    """
+
+    def get_list_select_related(self, request):
+        select_related = super().get_list_select_related(request)
+        if not sharding_enabled():
+            return select_related
+        if not isinstance(select_related, (list, tuple)):
+            select_related = [
+                field.name for field in self.model._meta.concrete_fields
+                if field.many_to_one or field.one_to_one
+            ]
+        return [path for path in select_related if same_database(self.model, path)]
+
+    def get_search_fields(self, request):
+        search_fields = super().get_search_fields(request)
+        if not sharding_enabled():
+            return search_fields
+        return [path for path in search_fields if same_database(self.model, path)]
+
+
+class ShardedAdmin(ShardAwareAdmin):
+    """Admin for households and their rows, which live on shards when sharding is on.
+
+    Ids are only unique within a shard, so the changelist shows one shard
+    at a time, picked with the shard filter, and its change pages follow it.
+    """
+
+    def get_list_filter(self, request):
+        list_filter = super().get_list_filter(request)
+        return (ShardFilter, *list_filter) if sharding_enabled() else list_filter
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        return queryset.using(admin_shard(request)) if sharding_enabled() else queryset
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        # Choices, and raw id labels, come from the picked shard
+        if sharding_enabled() and is_sharded(db_field.related_model):
+            kwargs.setdefault('using', admin_shard(request))
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+    def on_shard(self, request):
+        # The admin opens its transactions on router.db_for_write(model)
+        return use_shard(admin_shard(request) if sharding_enabled() else None)
+
+    def changelist_view(self, request, extra_context=None):
+        with self.on_shard(request):
+            return super().changelist_view(request, extra_context)
+
+    def changeform_view(self, request, object_id=None, form_url='', extra_context=None):
+        with self.on_shard(request):
+            return super().changeform_view(request, object_id, form_url, extra_context)
+
+    def delete_view(self, request, object_id, extra_context=None):
+        with self.on_shard(request):
+            return super().delete_view(request, object_id, extra_context)
 
 
 @admin.register(Household)
-class HouseholdAdmin(admin.ModelAdmin):
+class HouseholdAdmin(ShardedAdmin):
     list_display = ('name', 'city', 'state', 'family_size', 'user', 'created_at')
     list_filter = ('state', 'family_size', 'created_at')
     search_fields = ('name', 'city', 'user__username')
@@ -14,52 +138,136 @@ class HouseholdAdmin(admin.ModelAdmin):
     ordering = ('-created_at',)
 
 
+@admin.register(HouseholdDirectory)
+class HouseholdDirectoryAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'created_at')
+    list_select_related = ('user',)
+    search_fields = ('user__username',)
+    raw_id_fields = ('user',)
+    readonly_fields = ('created_at',)
+    ordering = ('id',)
+
+
 @admin.register(EnergyUsage)
-class EnergyUsageAdmin(admin.ModelAdmin):
-    list_display = ('household', 'fuel_type', 'consumption', 'unit', 'month', 'created_at')
-    list_filter = ('fuel_type', 'unit', 'month', 'created_at')
+class EnergyUsageAdmin(ShardedAdmin):
+    list_display = ('household', 'fuel_type', 'consumption', 'unit', 'month', 'source', 'is_anomaly', 'created_at')
+    list_filter = ('is_anomaly', 'fuel_type', 'unit', 'source', 'month', 'created_at')
     search_fields = ('household__name', 'household__user__username')
-    readonly_fields = ('created_at',)
+    readonly_fields = ('anomaly_score', 'created_at')
     ordering = ('-month', '-created_at')
 
 
 @admin.register(Transportation)
-class TransportationAdmin(admin.ModelAdmin):
-    list_display = ('household', 'vehicle_type', 'distance_km', 'frequency_per_week', 'month', 'created_at')
-    list_filter = ('vehicle_type', 'month', 'created_at')
+class TransportationAdmin(ShardedAdmin):
+    list_display = ('household', 'vehicle_type', 'distance_km', 'frequency_per_week', 'month', 'is_anomaly', 'created_at')
+    list_filter = ('is_anomaly', 'vehicle_type', 'month', 'created_at')
     search_fields = ('household__name', 'household__user__username')
-    readonly_fields = ('created_at',)
+    readonly_fields = ('anomaly_score', 'created_at')
     ordering = ('-month', '-created_at')
 
 
 @admin.register(Diet)
-class DietAdmin(admin.ModelAdmin):
-    list_display = ('household', 'food_type', 'consumption_kg', 'month', 'created_at')
-    list_filter = ('food_type', 'month', 'created_at')
+class DietAdmin(ShardedAdmin):
+    list_display = ('household', 'food_type', 'consumption_kg', 'month', 'is_anomaly', 'created_at')
+    list_filter = ('is_anomaly', 'food_type', 'month', 'created_at')
     search_fields = ('household__name', 'household__user__username')
-    readonly_fields = ('created_at',)
+    readonly_fields = ('anomaly_score', 'created_at')
     ordering = ('-month', '-created_at')
 
 
 @admin.register(Waste)
-class WasteAdmin(admin.ModelAdmin):
-    list_display = ('household', 'waste_type', 'quantity_kg', 'month', 'created_at')
-    list_filter = ('waste_type', 'month', 'created_at')
+class WasteAdmin(ShardedAdmin):
+    list_display = ('household', 'waste_type', 'quantity_kg', 'month', 'is_anomaly', 'created_at')
+    list_filter = ('is_anomaly', 'waste_type', 'month', 'created_at')
     search_fields = ('household__name', 'household__user__username')
-    readonly_fields = ('created_at',)
+    readonly_fields = ('anomaly_score', 'created_at')
     ordering = ('-month', '-created_at')
 
 
 @admin.register(CarbonFootprint)
-class CarbonFootprintAdmin(admin.ModelAdmin):
+class CarbonFootprintAdmin(ShardedAdmin):
     list_display = ('household', 'total_footprint', 'energy_footprint', 'transport_footprint', 'diet_footprint', 'waste_footprint', 'month', 'created_at')
+    list_select_related = ('household',)
     list_filter = ('month', 'created_at')
     search_fields = ('household__name', 'household__user__username')
     readonly_fields = ('created_at',)
     ordering = ('-month', '-created_at')
-    
-    def get_queryset(self, request):
-        return super().get_queryset(request).select_related('household', 'household__user')
+
+
+@admin.register(FootprintEvent)
+class FootprintEventAdmin(ShardedAdmin):
+    list_display = ('id', 'household', 'month', 'total_footprint', 'created_at')
+    list_select_related = ('household',)
+    list_filter = ('month',)
+    raw_id_fields = ('household',)
+    readonly_fields = ('created_at',)
+    ordering = ('-id',)
+
+
+@admin.register(ActivityArchive)
+class ActivityArchiveAdmin(ShardedAdmin):
+    list_display = ('household', 'month', 'created_at')
+    list_select_related = ('household',)
+    list_filter = ('month',)
+    search_fields = ('household__name', 'household__user__username')
+    readonly_fields = ('data', 'created_at')
+    ordering = ('-month',)
+
+
+@admin.register(MeterDay)
+class MeterDayAdmin(ShardAwareAdmin):
+    list_display = ('household', 'day', 'kwh', 'updated_at')
+    list_select_related = ('household',)
+    list_filter = ('day',)
+    search_fields = ('household__name', 'household__user__username')
+    readonly_fields = ('readings', 'updated_at')
+    ordering = ('-day',)
+
+
+@admin.register(MeterMonth)
+class MeterMonthAdmin(ShardAwareAdmin):
+    list_display = ('household', 'month', 'updated_at')
+    list_select_related = ('household',)
+    list_filter = ('month',)
+    search_fields = ('household__name', 'household__user__username')
+    readonly_fields = ('slot_kwh', 'slot_days', 'updated_at')
+    ordering = ('-month',)
+
+
+@admin.register(TripMonth)
+class TripMonthAdmin(ShardAwareAdmin):
+    list_display = ('household', 'month', 'vehicle_type', 'distance_km', 'trips', 'updated_at')
+    list_select_related = ('household',)
+    list_filter = ('vehicle_type', 'month')
+    search_fields = ('household__name', 'household__user__username')
+    ordering = ('-month',)
+
+
+@admin.register(TripBatch)
+class TripBatchAdmin(ShardAwareAdmin):
+    list_display = ('household', 'batch_id', 'trips', 'created_at')
+    list_select_related = ('household',)
+    search_fields = ('household__name', 'batch_id')
+    ordering = ('-created_at',)
+
+
+@admin.register(GridFactor)
+class GridFactorAdmin(admin.ModelAdmin):
+    list_display = ('state', 'month', 'factor', 'source', 'updated_at')
+    list_filter = ('state',)
+    search_fields = ('state', 'source')
+    readonly_fields = ('updated_at',)
+    ordering = ('state', '-month')
+
+
+@admin.register(FootprintForecast)
+class FootprintForecastAdmin(ShardAwareAdmin):
+    list_display = ('household', 'total_footprint', 'energy_footprint', 'transport_footprint', 'diet_footprint', 'waste_footprint', 'month', 'created_at')
+    list_select_related = ('household',)
+    list_filter = ('month', 'created_at')
+    search_fields = ('household__name', 'household__user__username')
+    readonly_fields = ('created_at',)
+    ordering = ('month',)
 
 
 @admin.register(SustainabilityTip)
@@ -81,4 +289,76 @@ class SustainabilityTipAdmin(admin.ModelAdmin):
             'fields': ('created_at',),
             'classes': ('collapse',)
         }),
-    ) 
\ No newline at end of file
+    ) 
+
+@admin.register(ActivitySketch)
+class ActivitySketchAdmin(admin.ModelAdmin):
+    list_display = ('activity', 'item_type', 'state', 'total', 'updated_at')
+    list_filter = ('activity', 'item_type', 'state')
+    readonly_fields = ('counts', 'total', 'updated_at')
+    ordering = ('activity', 'item_type', 'state')
+
+
+@admin.register(Organisation)
+class OrganisationAdmin(admin.ModelAdmin):
+    list_display = ('name', 'kind', 'parent', 'created_at')
+    list_select_related = ('parent',)
+    list_filter = ('kind',)
+    search_fields = ('name',)
+    raw_id_fields = ('parent',)
+    filter_horizontal = ('managers',)
+    readonly_fields = ('created_at',)
+    ordering = ('name',)
+
+
+@admin.register(OrganisationMember)
+class OrganisationMemberAdmin(ShardAwareAdmin):
+    list_display = ('household', 'organisation', 'joined_at')
+    list_select_related = ('household', 'organisation')
+    list_filter = ('organisation',)
+    search_fields = ('household__name', 'household__user__username', 'organisation__name')
+    raw_id_fields = ('household', 'organisation')
+    readonly_fields = ('joined_at',)
+
+
+@admin.register(OrganisationRollup)
+class OrganisationRollupAdmin(admin.ModelAdmin):
+    list_display = ('organisation', 'month', 'household_count', 'total_footprint', 'updated_at')
+    list_filter = ('month', 'organisation')
+    readonly_fields = (
+        'organisation', 'month', 'household_count', 'total_footprint', 'energy_footprint',
+        'transport_footprint', 'diet_footprint', 'waste_footprint', 'updated_at',
+    )
+    ordering = ('organisation', '-month')
+
+
+@admin.register(LeaderboardEntry)
+class LeaderboardEntryAdmin(admin.ModelAdmin):
+    list_display = ('region', 'scope', 'month', 'name', 'per_person', 'bucket')
+    list_filter = ('scope', 'month')
+    search_fields = ('region', 'name')
+    readonly_fields = ('scope', 'region', 'month', 'household', 'name', 'per_person', 'bucket')
+    ordering = ('scope', 'region', '-month', 'bucket', 'per_person')
+
+
+@admin.register(LeaderboardNode)
+class LeaderboardNodeAdmin(admin.ModelAdmin):
+    list_display = ('region', 'scope', 'month', 'node', 'count')
+    list_filter = ('scope', 'month')
+    search_fields = ('region',)
+    readonly_fields = ('scope', 'region', 'month', 'node', 'count')
+    ordering = ('scope', 'region', '-month', 'node')
+
+
+@admin.register(ApiKey)
+class ApiKeyAdmin(admin.ModelAdmin):
+    # Keys are issued with `manage.py create_api_key`; here they can be revoked
+    list_display = ('name', 'user', 'created_at')
+    list_select_related = ('user',)
+    search_fields = ('name', 'user__username')
+    raw_id_fields = ('user',)
+    readonly_fields = ('key_hash', 'created_at')
+    ordering = ('-created_at',)
+
+    def has_add_permission(self, request):
+        return False
@@ -0,0 +1,297 @@
+import math
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import EnergyUsage, Transportation, Diet, Waste, ActivitySketch
+from .sharding import household_db, map_shards
+
+
+# Robust z-score above which a row is flagged (Iglewicz & Hoaglin)
+Z_THRESHOLD = 3.5
+
+# A sketch needs this many observations before it is trusted for scoring
+MIN_SAMPLES = 30
+
+# Activity models, the field holding their type and their quantity
+ACTIVITIES = {
+    EnergyUsage: ('energy', 'fuel_type', lambda row: row.consumption),
+    Transportation: ('transport', 'vehicle_type', lambda row: row.distance_km * row.frequency_per_week),
+    Diet: ('diet', 'food_type', lambda row: row.consumption_kg),
+    Waste: ('waste', 'waste_type', lambda row: row.quantity_kg),
+}
+
+
+class Sketch:
+    """Fixed-size log-scale histogram with approximate median and MAD.
+
+    Quantities are bucketed by log10 into BINS buckets of WIDTH decades
+    starting at LOW, so adding a value and computing the robust statistics
+    cost the same however many values have been seen. Working in log space
+    suits consumption data, where a slipped digit is a 10x error.
+    """
+
+    BINS = 140
+    LOW = -2.0
+    WIDTH = 0.05
+
+    def __init__(self, counts=None):
+        self.counts = list(counts) if counts else [0] * self.BINS
+        self.total = sum(self.counts)
+
+    @classmethod
+    def bucket(cls, log_value):
+        index = int((log_value - cls.LOW) / cls.WIDTH)
+        return min(max(index, 0), cls.BINS - 1)
+
+    @classmethod
+    def center(cls, index):
+        return cls.LOW + (index + 0.5) * cls.WIDTH
+
+    def add(self, log_value):
+        self.counts[self.bucket(log_value)] += 1
+        self.total += 1
+
+    def remove(self, log_value):
+        """Forget one observation, e.g. of a row that is being replaced"""
+        index = self.bucket(log_value)
+        if self.counts[index]:
+            self.counts[index] -= 1
+            self.total -= 1
+
+    def merge(self, other):
+        """Add another sketch's observations to this one"""
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.total += other.total
+
+    @staticmethod
+    def _weighted_median(points):
+        """Median of (value, weight) pairs"""
+        points = sorted(points)
+        half = sum(weight for _, weight in points) / 2
+        seen = 0
+        for value, weight in points:
+            seen += weight
+            if seen >= half:
+                return value
+        return points[-1][0]
+
+    def median_mad(self):
+        """Approximate (median, MAD) of the log10 values seen so far"""
+        points = [(self.center(i), c) for i, c in enumerate(self.counts) if c]
+        median = self._weighted_median(points)
+        mad = self._weighted_median([(abs(value - median), c) for value, c in points])
+        # MAD below one bucket is quantisation noise, not a tight distribution
+        return median, max(mad, self.WIDTH)
+
+    def score(self, log_value):
+        """Robust z-score of a log10 value against this sketch"""
+        median, mad = self.median_mad()
+        return 0.6745 * (log_value - median) / mad
+
+
+def per_person_log(row, household):
+    """log10 of the row's quantity per household member, None if not positive"""
+    _, _, quantity = ACTIVITIES[type(row)]
+    value = Decimal(quantity(row)) / max(household.family_size, 1)
+    return math.log10(value) if value > 0 else None
+
+
+def sketch_keys(row, household):
+    """(activity, item_type, state) keys: state-level first, then national"""
+    activity, type_field, _ = ACTIVITIES[type(row)]
+    item_type = getattr(row, type_field)
+    return [(activity, item_type, household.state), (activity, item_type, '')]
+
+
+def score_row(row, household, update=True):
+    """Score one new activity row in O(1) and optionally learn from it.
+
+    Sets ``anomaly_score`` and ``is_anomaly`` on the row without saving it,
+    using the state sketch when it has enough samples and the national one
+    otherwise. Returns the score, or None when no sketch is trusted yet.
+    """
+    return score_rows([row], household, update)[0]
+
+
+def stored_rows(rows, household):
+    """Stored rows of the household with the same month and type as ``rows``"""
+    by_model = {}
+    for row in rows:
+        by_model.setdefault(type(row), []).append(row)
+    stored = []
+    for model, model_rows in by_model.items():
+        _, type_field, _ = ACTIVITIES[model]
+        stored += model.objects.using(household_db(household.id)).filter(
+            household=household,
+            month__in={row.month for row in model_rows},
+            **{f'{type_field}__in': {getattr(row, type_field) for row in model_rows}},
+        )
+    keys = {(type(row), row.month, getattr(row, ACTIVITIES[type(row)][1])) for row in rows}
+    return [row for row in stored if (type(row), row.month, getattr(row, ACTIVITIES[type(row)][1])) in keys]
+
+
+def score_rows(rows, household, update=True, replacing=False):
+    """Score a batch of new rows for one household, as score_row does for each.
+
+    Every sketch the batch touches is read once and written once, so a
+    bulk entry costs three queries however many rows it holds. When
+    updating, the read and the write happen in one transaction that takes
+    the write lock first, so concurrent uploads serialise instead of
+    overwriting each other's counts.
+
+    With ``replacing``, rows about to overwrite a stored row of the same
+    month and type take that row's place in the sketches instead of being
+    counted a second time. The stored rows are read (one query per model)
+    once the lock is held, so callers should write the rows before the
+    transaction ends.
+    """
+    if update:
+        with transaction.atomic(savepoint=False):
+            return _score_rows(rows, household, update, replacing)
+    return _score_rows(rows, household, update, replacing)
+
+
+def _score_rows(rows, household, update, replacing):
+    logs = [per_person_log(row, household) for row in rows]
+    keys = {
+        key for row, log_value in zip(rows, logs) if log_value is not None
+        for key in sketch_keys(row, household)
+    }
+
+    records = {}
+    if keys:
+        if update:
+            # Insert missing sketches before reading, which also takes the
+            # write lock up front and holds it until the counts are written
+            ActivitySketch.objects.bulk_create(
+                [ActivitySketch(activity=a, item_type=i, state=s) for a, i, s in keys],
+                ignore_conflicts=True,
+            )
+        lookup = Q()
+        for activity, item_type, state in keys:
+            lookup |= Q(activity=activity, item_type=item_type, state=state)
+        sketch_rows = ActivitySketch.objects.filter(lookup)
+        if update:
+            sketch_rows = sketch_rows.select_for_update()
+        records = {(r.activity, r.item_type, r.state): r for r in sketch_rows}
+    sketches = {key: Sketch(records[key].counts if key in records else None) for key in keys}
+
+    if update and replacing and keys:
+        for old in stored_rows(rows, household):
+            log_value = per_person_log(old, household)
+            if log_value is None:
+                continue
+            for key in sketch_keys(old, household):
+                if key in sketches:
+                    sketches[key].remove(log_value)
+
+    scores = []
+    for row, log_value in zip(rows, logs):
+        score = None
+        if log_value is not None:
+            row_sketches = [sketches[key] for key in sketch_keys(row, household)]
+            for sketch in row_sketches:
+                if sketch.total >= MIN_SAMPLES:
+                    score = sketch.score(log_value)
+                    break
+            if update:
+                for sketch in row_sketches:
+                    sketch.add(log_value)
+        row.anomaly_score = score
+        row.is_anomaly = score is not None and abs(score) > Z_THRESHOLD
+        scores.append(score)
+
+    if update and records:
+        now = timezone.now()
+        for key, record in records.items():
+            record.counts = sketches[key].counts
+            record.total = sketches[key].total
+            record.updated_at = now
+        ActivitySketch.objects.bulk_update(list(records.values()), ['counts', 'total', 'updated_at'])
+    return scores
+
+
+def history_sketches():
+    """Sketches of the activity history on one database (a shard, when sharded)"""
+    sketches = {}
+    for model in ACTIVITIES:
+        for row in model.objects.select_related('household').iterator(chunk_size=2000):
+            log_value = per_person_log(row, row.household)
+            if log_value is None:
+                continue
+            for key in sketch_keys(row, row.household):
+                sketches.setdefault(key, Sketch()).add(log_value)
+    return sketches
+
+
+def rebuild_sketches():
+    """Rebuild every sketch from the full activity history of all shards"""
+    sketches = {}
+    for part in map_shards(lambda alias: history_sketches()):
+        for key, sketch in part.items():
+            sketches.setdefault(key, Sketch()).merge(sketch)
+
+    with transaction.atomic():
+        ActivitySketch.objects.all().delete()
+        ActivitySketch.objects.bulk_create([
+            ActivitySketch(
+                activity=activity, item_type=item_type, state=state,
+                counts=sketch.counts, total=sketch.total,
+            )
+            for (activity, item_type, state), sketch in sketches.items()
+        ])
+    return sketches
+
+
+def rescore_history(sketches=None, batch_size=2000):
+    """Re-score every stored activity row against the current sketches.
+
+    Returns a dict of flagged row counts per activity.
+    """
+    if sketches is None:
+        sketches = {
+            (s.activity, s.item_type, s.state): Sketch(s.counts)
+            for s in ActivitySketch.objects.all()
+        }
+    # Median and MAD only change when sketches do, so compute them once
+    stats = {key: sketch.median_mad() for key, sketch in sketches.items() if sketch.total >= MIN_SAMPLES}
+
+    def rescore(alias):
+        with transaction.atomic(using=alias):
+            return rescore_rows(stats, batch_size)
+
+    flagged = {}
+    for part in map_shards(rescore):
+        for activity, count in part.items():
+            flagged[activity] = flagged.get(activity, 0) + count
+    return flagged
+
+
+def rescore_rows(stats, batch_size):
+    """Re-score the activity rows on one database against (median, MAD) per sketch key"""
+    flagged = {}
+    for model, (activity, _, _) in ACTIVITIES.items():
+        flagged[activity] = 0
+        batch = []
+        for row in model.objects.select_related('household').iterator(chunk_size=batch_size):
+            log_value = per_person_log(row, row.household)
+            score = None
+            if log_value is not None:
+                for key in sketch_keys(row, row.household):
+                    if key in stats:
+                        median, mad = stats[key]
+                        score = 0.6745 * (log_value - median) / mad
+                        break
+            row.anomaly_score = score
+            row.is_anomaly = score is not None and abs(score) > Z_THRESHOLD
+            flagged[activity] += row.is_anomaly
+            batch.append(row)
+            if len(batch) >= batch_size:
+                model.objects.bulk_update(batch, ['anomaly_score', 'is_anomaly'])
+                batch = []
+        if batch:
+            model.objects.bulk_update(batch, ['anomaly_score', 'is_anomaly'])
+    return flagged
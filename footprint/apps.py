@@ -3,4 +3,7 @@ from django.apps import AppConfig
 
 class FootprintConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'footprint' 
\ No newline at end of file
+    name = 'footprint'
+
+    def ready(self):
+        from . import signals  # noqa: F401
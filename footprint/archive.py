@@ -0,0 +1,105 @@
+import hashlib
+from collections import defaultdict
+from decimal import Decimal
+
+import numpy as np
+
+from .anomalies import ACTIVITIES
+from .models import EnergyUsage, Transportation, Diet, Waste
+from .units import CANONICAL_UNITS
+
+
+FORMAT_VERSION = 2
+
+# Blob layout: the format version byte, LAYOUT (8 bytes), then one int64
+# slot per choice, values in hundredths so the DecimalFields (2 decimal
+# places) round-trip exactly. Segments appear in this order; a type that
+# had no row holds MISSING.
+SEGMENTS = [
+    (EnergyUsage, 'fuel_type', 'consumption'),
+    (Transportation, 'vehicle_type', 'distance_km'),
+    (Transportation, 'vehicle_type', 'frequency_per_week'),
+    (Diet, 'food_type', 'consumption_kg'),
+    (Waste, 'waste_type', 'quantity_kg'),
+]
+
+MISSING = np.iinfo(np.int64).min
+
+
+def _choices(model, type_field):
+    return [key for key, _ in model._meta.get_field(type_field).choices]
+
+
+def _offsets():
+    offsets, position = [], 0
+    for model, type_field, _ in SEGMENTS:
+        choices = _choices(model, type_field)
+        offsets.append((position, {key: i for i, key in enumerate(choices)}, choices))
+        position += len(choices)
+    return offsets, position
+
+
+OFFSETS, WIDTH = _offsets()
+
+
+def _layout():
+    """Hash of the segments and their choices, which decide where each slot is"""
+    layout = [
+        [model._meta.label_lower, type_field, value_field, _choices(model, type_field)]
+        for model, type_field, value_field in SEGMENTS
+    ]
+    return hashlib.sha256(repr(layout).encode()).digest()[:8]
+
+
+# Adding, removing or reordering a fuel, vehicle, food or waste choice
+# changes LAYOUT, and blobs written before then can no longer be read
+# (unpack raises rather than misreading them). Repack them first.
+LAYOUT = _layout()
+
+# Version 1 blobs carry no layout; they were written with this one
+V1_LAYOUT = bytes.fromhex('ec9c574b301fe3e4')
+
+
+def pack(rows):
+    """Pack one household-month of activity rows into a compact blob"""
+    values = np.full(WIDTH, MISSING, dtype='<i8')
+    for (model, type_field, value_field), (start, index, _) in zip(SEGMENTS, OFFSETS):
+        for row in rows.get(model, ()):
+            slot = start + index[getattr(row, type_field)]
+            values[slot] = int(round(Decimal(getattr(row, value_field)) * 100))
+    return bytes([FORMAT_VERSION]) + LAYOUT + values.tobytes()
+
+
+def unpack(blob, household, month):
+    """Rebuild unsaved activity instances from a blob, keyed by model"""
+    blob = bytes(blob)
+    if blob[0] == 1:
+        layout, offset = V1_LAYOUT, 1
+    elif blob[0] == FORMAT_VERSION:
+        layout, offset = blob[1:9], 9
+    else:
+        raise ValueError(f'Unsupported archive format {blob[0]}')
+    if layout != LAYOUT:
+        raise ValueError(
+            f'Archive of {month} was packed with different activity choices (layout {layout.hex()}, '
+            f'now {LAYOUT.hex()})'
+        )
+    values = np.frombuffer(blob, dtype='<i8', offset=offset)
+
+    fields = defaultdict(dict)
+    for (model, type_field, value_field), (start, _, choices) in zip(SEGMENTS, OFFSETS):
+        for i, key in enumerate(choices):
+            if values[start + i] != MISSING:
+                fields[(model, key)][value_field] = Decimal(int(values[start + i])) / 100
+
+    rows = defaultdict(list)
+    for (model, key), row_fields in fields.items():
+        _, type_field, _ = ACTIVITIES[model]
+        if model is Transportation:
+            row_fields['frequency_per_week'] = int(row_fields['frequency_per_week'])
+        if model is EnergyUsage:
+            row_fields['unit'] = CANONICAL_UNITS.get(key, '')
+        rows[model].append(model(
+            household=household, month=month, **{type_field: key}, **row_fields
+        ))
+    return rows
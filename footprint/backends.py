@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+from django.core.exceptions import PermissionDenied
+
+from .caching import identity_cache_enabled, user_cache_key
+
+
+class CachedModelBackend(ModelBackend):
+    """ModelBackend that serves the per-request user lookup from the cache.
+
+    The session still carries the password hash check, so changing a
+    password (which saves the user and drops the entry) ends other
+    sessions as usual. Users are only cached when the cache is shared by
+    every worker (see identity_cache_enabled); otherwise this is plain
+    ModelBackend.
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        user = super().authenticate(request, username, password, **kwargs)
+        if user is None and password is not None:
+            # ModelBackend is listed after this backend only to load sessions
+            # it logged in; stop here rather than check the password twice
+            raise PermissionDenied
+        return user
+
+    def get_user(self, user_id):
+        if not identity_cache_enabled():
+            return super().get_user(user_id)
+        key = user_cache_key(user_id)
+        user = cache.get(key)
+        if user is None:
+            user = super().get_user(user_id)
+            if user is None:
+                return None
+            cache.set(key, user, settings.IDENTITY_CACHE_TIMEOUT)
+        return user if self.user_can_authenticate(user) else None
@@ -0,0 +1,95 @@
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Count, Max
+
+from .models import GridFactor, Household, SustainabilityTip
+from .sharding import sharding_enabled, user_household_db
+
+
+def table_version(queryset):
+    """A value that changes whenever a row of the table is added, edited or deleted.
+
+    It is read from the table itself (row count and latest ``updated_at``)
+    rather than kept in the cache, which is per process, so every process
+    sees a change as soon as it is committed, whichever process made it.
+    """
+    state = queryset.aggregate(count=Count('pk'), changed=Max('updated_at'))
+    changed = state['changed'].isoformat() if state['changed'] else ''
+    return f"{state['count']}:{changed}"
+
+
+def get_tips_version():
+    """Get the current version of the sustainability tips table.
+
+    Template fragments that render tips include this value in their cache
+    key, so any change to the table retires every cached tip card at once.
+    """
+    return table_version(SustainabilityTip.objects.all())
+
+
+def get_grid_version():
+    """Get the current version of the grid factor table.
+
+    Each process keeps its own dense copy of the table and reloads it when
+    this value changes.
+    """
+    return table_version(GridFactor.objects.all())
+
+
+def identity_cache_enabled():
+    """Whether users and households may be served from the cache.
+
+    Only when every worker shares the cache: saving a user or household
+    drops its entry from this process's cache, so with a per-process cache
+    other workers would keep a changed password, a deactivated account or
+    an edited household until the entry expired.
+    """
+    return not isinstance(caches['default'], (LocMemCache, DummyCache))
+
+
+def household_cache_key(user_id):
+    return f'footprint:household:{user_id}'
+
+
+def user_cache_key(user_id):
+    return f'footprint:user:{user_id}'
+
+
+def cached_household(user):
+    """Get the user's household from the cache, falling back to one query.
+
+    Users without a household are not cached, so setting one up takes
+    effect on the next request. Without a shared cache this is always the
+    query (see identity_cache_enabled). It reads the primary even inside
+    ``replica_reads`` views, so a stale copy is never cached.
+    """
+    key = household_cache_key(user.pk)
+    use_cache = identity_cache_enabled()
+    household = cache.get(key) if use_cache else None
+    if household is None:
+        if sharding_enabled():
+            # Without a directory entry there is no shard to look on
+            using = user_household_db(user.pk)
+            household = Household.objects.using(using).filter(user_id=user.pk).first() if using else None
+        else:
+            household = Household.objects.using(DEFAULT_DB_ALIAS).filter(user_id=user.pk).first()
+        if household is None:
+            return None
+        if use_cache:
+            cache.set(key, household, settings.IDENTITY_CACHE_TIMEOUT)
+    # Reuse the request's user rather than loading it again
+    household.user = user
+    return household
+
+
+def forget_household(user_id):
+    """Drop a cached household after it is saved or deleted"""
+    cache.delete(household_cache_key(user_id))
+
+
+def forget_user(user_id):
+    """Drop a cached user after it is saved or deleted"""
+    cache.delete(user_cache_key(user_id))
@@ -0,0 +1,155 @@
+from datetime import date
+
+import numpy as np
+from django.db.models import FloatField, IntegerField
+from django.db.models.functions import Cast, ExtractMonth, ExtractYear
+
+from .models import CarbonFootprint, FootprintForecast
+from .sharding import map_shards
+
+
+CATEGORIES = ('energy', 'transport', 'diet', 'waste')
+
+# Ridge penalty on the trend slope: keeps households with one or two months
+# of history solvable and damps trends fitted to very short series.
+SLOPE_RIDGE = 1.0
+
+
+def month_ordinal(value):
+    """Months since year 0, so consecutive months differ by one"""
+    return value.year * 12 + value.month - 1
+
+
+def ordinal_to_date(ordinal):
+    return date(ordinal // 12, ordinal % 12 + 1, 1)
+
+
+def load_history(end_month, history_months):
+    """Load every household's footprints for the window ending at end_month.
+
+    Returns (household_ids, values, mask, first_ordinal) where values has
+    shape (households, months, categories) with NaN for missing months and
+    mask marks the observed months. Conversion to floats and month
+    ordinals happens in SQL so no model instances or Decimals are built;
+    shards are read in parallel.
+    """
+    last = month_ordinal(end_month)
+    first = last - history_months + 1
+
+    def load(alias):
+        rows = (
+            CarbonFootprint.objects
+            .filter(month__gte=ordinal_to_date(first), month__lte=end_month)
+            .annotate(
+                ordinal=Cast(ExtractYear('month') * 12 + ExtractMonth('month') - 1, IntegerField()),
+                **{c: Cast(f'{c}_footprint', FloatField()) for c in CATEGORIES},
+            )
+            .values_list('household_id', 'ordinal', *CATEGORIES)
+        )
+        return np.array(list(rows.iterator(chunk_size=10000)), dtype=np.float64).reshape(-1, 2 + len(CATEGORIES))
+
+    # Shards hold disjoint households, so their rows simply stack
+    data = np.concatenate(map_shards(load))
+
+    household_ids, rows_index = np.unique(data[:, 0].astype(np.int64), return_inverse=True)
+    month_index = data[:, 1].astype(np.int64) - first
+    values = np.full((len(household_ids), history_months, len(CATEGORIES)), np.nan)
+    values[rows_index, month_index] = data[:, 2:]
+    return household_ids, values, ~np.isnan(values[:, :, 0]), first
+
+
+def seasonal_index(values, mask, first_ordinal):
+    """Population-wide multiplicative seasonality per calendar month.
+
+    Each observation is divided by its household's mean for the category,
+    and the ratios are averaged per calendar month across all households.
+    Returns an array of shape (12, categories) normalised to mean 1.
+    """
+    means = np.nanmean(np.where(mask[:, :, None], values, np.nan), axis=1, keepdims=True)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratios = np.where(means > 0, values / means, np.nan)
+
+    calendar = (first_ordinal + np.arange(values.shape[1])) % 12
+    sums = np.zeros((12, values.shape[2]))
+    counts = np.zeros((12, values.shape[2]))
+    observed = ~np.isnan(ratios)
+    np.add.at(sums, calendar, np.nansum(ratios, axis=0))
+    np.add.at(counts, calendar, observed.sum(axis=0))
+
+    season = np.divide(sums, counts, out=np.ones_like(sums), where=counts > 0)
+    season = np.where(season > 0, season, 1.0)
+    return season / season.mean(axis=0, keepdims=True)
+
+
+def fit_trends(values, mask, season, first_ordinal):
+    """Fit a linear trend to every household's deseasonalised series at once.
+
+    Solves the weighted normal equations (X' W X + R) beta = X' W y for all
+    households and categories in one batched call; returns coefficients of
+    shape (households, 2, categories) as (intercept, slope).
+    """
+    months = values.shape[1]
+    t = np.arange(months, dtype=np.float64)
+    calendar = (first_ordinal + np.arange(months)) % 12
+    deseasonalised = np.where(mask[:, :, None], values / season[calendar][None], 0.0)
+    weights = mask.astype(np.float64)
+
+    design = np.stack([np.ones(months), t], axis=1)
+    normal = np.einsum('tp,ht,tq->hpq', design, weights, design)
+    normal[:, 1, 1] += SLOPE_RIDGE
+    rhs = np.einsum('tp,htc->hpc', design, deseasonalised)
+    return np.linalg.solve(normal, rhs)
+
+
+def predict(coefficients, season, first_ordinal, history_months, horizon):
+    """Forecast (households, horizon, categories), never below zero"""
+    t = np.arange(history_months, history_months + horizon, dtype=np.float64)
+    calendar = (first_ordinal + history_months + np.arange(horizon)) % 12
+    trend = coefficients[:, 0, None, :] + coefficients[:, 1, None, :] * t[None, :, None]
+    return np.clip(trend * season[calendar][None], 0.0, None)
+
+
+def forecast_all(end_month=None, history_months=36, horizon=6):
+    """Fit every household and return (household_ids, months, forecasts)"""
+    end_month = (end_month or date.today()).replace(day=1)
+    household_ids, values, mask, first = load_history(end_month, history_months)
+    if not len(household_ids):
+        return household_ids, [], np.zeros((0, horizon, len(CATEGORIES)))
+    season = seasonal_index(values, mask, first)
+    coefficients = fit_trends(values, mask, season, first)
+    forecasts = predict(coefficients, season, first, history_months, horizon)
+    months = [ordinal_to_date(first + history_months + i) for i in range(horizon)]
+    return household_ids, months, forecasts
+
+
+def store_forecasts(household_ids, months, forecasts, batch_size=5000):
+    """Replace the forecast table with freshly computed rows"""
+    FootprintForecast.objects.all().delete()
+    totals = forecasts.sum(axis=2)
+    rounded = np.round(forecasts, 2).tolist()
+    rounded_totals = np.round(totals, 2).tolist()
+    objects = (
+        FootprintForecast(
+            household_id=household_id,
+            month=month,
+            total_footprint=rounded_totals[h][m],
+            energy_footprint=rounded[h][m][0],
+            transport_footprint=rounded[h][m][1],
+            diet_footprint=rounded[h][m][2],
+            waste_footprint=rounded[h][m][3],
+        )
+        for h, household_id in enumerate(household_ids.tolist())
+        for m, month in enumerate(months)
+    )
+    created = 0
+    batch = []
+    for forecast in objects:
+        batch.append(forecast)
+        if len(batch) >= batch_size:
+            FootprintForecast.objects.bulk_create(batch)
+            created += len(batch)
+            batch = []
+    if batch:
+        FootprintForecast.objects.bulk_create(batch)
+        created += len(batch)
+    return created
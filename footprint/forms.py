@@ -1,7 +1,8 @@
 from django import forms
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
-from .models import Household, EnergyUsage, Transportation, Diet, Waste
+from .models import Household, EnergyUsage, Transportation, Diet, Waste, SustainabilityTip
+from .units import first_of_month, months_between
 
 
 class UserRegistrationForm(UserCreationForm):
@@ -67,7 +68,18 @@ class HouseholdForm(forms.ModelForm):
         }
 
 
-class EnergyUsageForm(forms.ModelForm):
+class MonthFormMixin:
+    """Accept the YYYY-MM value of a month input and store the first of the month"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['month'].input_formats = ['%Y-%m', '%Y-%m-%d']
+
+    def clean_month(self):
+        return first_of_month(self.cleaned_data['month'])
+
+
+class EnergyUsageForm(MonthFormMixin, forms.ModelForm):
     """Form for energy usage data"""
     class Meta:
         model = EnergyUsage
@@ -78,6 +90,7 @@ class EnergyUsageForm(forms.ModelForm):
             'unit': forms.Select(attrs={'class': 'form-control'}, choices=[
                 ('kWh', 'kWh (Electricity)'),
                 ('kg', 'kg (LPG, Charcoal)'),
+                ('cylinder', 'Cylinders (LPG, 14.2 kg)'),
                 ('liter', 'Liter (Kerosene)'),
                 ('m3', 'm³ (Biogas)'),
                 ('kg', 'kg (Firewood)'),
@@ -86,7 +99,7 @@ class EnergyUsageForm(forms.ModelForm):
         }
 
 
-class TransportationForm(forms.ModelForm):
+class TransportationForm(MonthFormMixin, forms.ModelForm):
     """Form for transportation data"""
     class Meta:
         model = Transportation
@@ -99,7 +112,7 @@ class TransportationForm(forms.ModelForm):
         }
 
 
-class DietForm(forms.ModelForm):
+class DietForm(MonthFormMixin, forms.ModelForm):
     """Form for dietary consumption data"""
     class Meta:
         model = Diet
@@ -111,7 +124,7 @@ class DietForm(forms.ModelForm):
         }
 
 
-class WasteForm(forms.ModelForm):
+class WasteForm(MonthFormMixin, forms.ModelForm):
     """Form for waste generation data"""
     class Meta:
         model = Waste
@@ -187,4 +200,110 @@ class BulkDataForm(forms.Form):
         required=False,
         widget=forms.NumberInput(attrs={'class': 'form-control', 'step': '0.1', 'min': '0', 'placeholder': 'Plastic waste in kg'}),
         label='Plastic Waste (kg)'
-    ) 
\ No newline at end of file
+    ) 
+
+class ScenarioForm(forms.Form):
+    """Form for what-if substitutions, e.g. petrol car to metro"""
+    ACTIVITY_CHOICES = [
+        ('', 'Select activity'),
+        ('Energy', EnergyUsage.FUEL_CHOICES),
+        ('Transport', Transportation.VEHICLE_CHOICES),
+        ('Diet', Diet.FOOD_CHOICES),
+    ]
+    SWAP_COUNT = 3
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for i in range(1, self.SWAP_COUNT + 1):
+            self.fields[f'swap_{i}_from'] = forms.ChoiceField(
+                required=False,
+                choices=self.ACTIVITY_CHOICES,
+                widget=forms.Select(attrs={'class': 'form-control'}),
+                label='Switch from'
+            )
+            self.fields[f'swap_{i}_to'] = forms.ChoiceField(
+                required=False,
+                choices=self.ACTIVITY_CHOICES,
+                widget=forms.Select(attrs={'class': 'form-control'}),
+                label='Switch to'
+            )
+            self.fields[f'swap_{i}_percent'] = forms.IntegerField(
+                required=False,
+                initial=100,
+                min_value=1,
+                max_value=100,
+                widget=forms.NumberInput(attrs={'class': 'form-control', 'min': '1', 'max': '100'}),
+                label='Share (%)'
+            )
+
+    def swap_rows(self):
+        """Bound fields grouped per substitution row, for the template"""
+        return [
+            (self[f'swap_{i}_from'], self[f'swap_{i}_to'], self[f'swap_{i}_percent'])
+            for i in range(1, self.SWAP_COUNT + 1)
+        ]
+
+    def substitutions(self):
+        """Filled-in rows as 'source:target:fraction' strings"""
+        result = []
+        for i in range(1, self.SWAP_COUNT + 1):
+            source = self.cleaned_data.get(f'swap_{i}_from')
+            target = self.cleaned_data.get(f'swap_{i}_to')
+            if source and target:
+                percent = self.cleaned_data.get(f'swap_{i}_percent') or 100
+                result.append(f'{source}:{target}:{percent / 100}')
+        return result
+
+
+class MonthRangeForm(forms.Form):
+    """Form for calculating footprints over a range of months"""
+    MAX_MONTHS = 36
+
+    start = forms.DateField(
+        widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'month'}, format='%Y-%m'),
+        input_formats=['%Y-%m'],
+        label='From'
+    )
+    end = forms.DateField(
+        widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'month'}, format='%Y-%m'),
+        input_formats=['%Y-%m'],
+        label='To'
+    )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        start, end = cleaned_data.get('start'), cleaned_data.get('end')
+        if start and end:
+            if start > end:
+                raise forms.ValidationError('The first month must not be after the last.')
+            if len(months_between(start, end)) > self.MAX_MONTHS:
+                raise forms.ValidationError(f'Calculate at most {self.MAX_MONTHS} months at a time.')
+        return cleaned_data
+
+    def months(self):
+        """First day of every month in the range"""
+        return months_between(self.cleaned_data['start'], self.cleaned_data['end'])
+
+
+class TipSearchForm(forms.Form):
+    """Form for searching and filtering sustainability tips"""
+    q = forms.CharField(
+        required=False,
+        max_length=200,
+        widget=forms.TextInput(attrs={'class': 'form-control', 'type': 'search', 'placeholder': 'Search tips, e.g. solar geyser'}),
+        label='Search'
+    )
+    category = forms.ChoiceField(
+        required=False,
+        choices=[('', 'All categories')] + SustainabilityTip.CATEGORY_CHOICES,
+        widget=forms.Select(attrs={'class': 'form-control'}),
+        label='Category'
+    )
+    min_impact = forms.DecimalField(
+        required=False,
+        min_value=0,
+        max_digits=8,
+        decimal_places=2,
+        widget=forms.NumberInput(attrs={'class': 'form-control', 'step': '1', 'min': '0', 'placeholder': 'kg CO₂e'}),
+        label='Saves at least (kg CO₂e)'
+    )
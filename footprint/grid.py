@@ -0,0 +1,81 @@
+import numpy as np
+
+from .caching import get_grid_version
+from .models import GridFactor
+from .utils import CarbonCalculator
+
+
+def state_key(state):
+    """Case- and whitespace-insensitive key for a state name"""
+    return (state or '').strip().casefold()
+
+
+def month_ordinal(month):
+    return month.year * 12 + month.month - 1
+
+
+class GridFactorTable:
+    """Grid emission factors as a dense (state, month) array.
+
+    Rows are states in name order and columns consecutive months from the
+    earliest stored one, so a lookup is a dict hit and an array index. Gaps
+    in a state's series carry its previous month forward; months outside
+    the stored range use the same calendar month of the nearest stored
+    year. States with no factors at all use the national average.
+    """
+
+    def __init__(self, rows, default):
+        self.default = float(default)
+        states = sorted({state_key(state) for state, _, _ in rows})
+        self.index = {state: i for i, state in enumerate(states)}
+        if not rows:
+            self.start, self.factors = 0, np.empty((0, 0))
+            return
+
+        ordinals = [month_ordinal(month) for _, month, _ in rows]
+        self.start = min(ordinals)
+        values = np.full((len(states), max(ordinals) - self.start + 1), np.nan)
+        for (state, _, factor), ordinal in zip(rows, ordinals):
+            values[self.index[state_key(state)], ordinal - self.start] = float(factor)
+
+        # Index of the latest stored month at or before each column, falling
+        # back to the state's first stored month before its series starts
+        valid = ~np.isnan(values)
+        filled = np.where(valid, np.arange(values.shape[1]), -1)
+        np.maximum.accumulate(filled, axis=1, out=filled)
+        filled = np.where(filled < 0, valid.argmax(axis=1)[:, None], filled)
+        self.factors = np.take_along_axis(values, filled, axis=1)
+
+    @classmethod
+    def load(cls):
+        return cls(
+            list(GridFactor.objects.values_list('state', 'month', 'factor')),
+            CarbonCalculator.ENERGY_EMISSION_FACTORS['electricity'],
+        )
+
+    def factor(self, state, month):
+        """kg CO2e per kWh for a household in ``state`` during ``month``"""
+        row = self.index.get(state_key(state))
+        if row is None:
+            return self.default
+        offset = month_ordinal(month) - self.start
+        last = self.factors.shape[1] - 1
+        if offset > last:
+            offset -= 12 * -(-(offset - last) // 12)
+        elif offset < 0:
+            offset += 12 * -(offset // 12)
+        return float(self.factors[row, min(max(offset, 0), last)])
+
+
+_table = None
+_version = None
+
+
+def grid_factors():
+    """This process's copy of the grid factor table, reloaded after changes"""
+    global _table, _version
+    version = get_grid_version()
+    if _table is None or version != _version:
+        _table = GridFactorTable.load()
+        _version = version
+    return _table
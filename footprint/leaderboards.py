@@ -0,0 +1,266 @@
+import math
+from collections import Counter, defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F, Q
+
+from .models import CarbonFootprint, LeaderboardEntry, LeaderboardNode
+from .sharding import map_shards
+
+
+# Households shown at the top of each leaderboard
+TOP = 10
+
+SCOPES = ['city', 'state']
+
+# Footprints per person are bucketed by log10 into BUCKETS buckets between
+# 10**LOW and 10**HIGH kg CO2e. A power of two, so the Fenwick tree's last
+# node counts the whole leaderboard.
+BUCKETS = 4096
+LOW = -1.0
+HIGH = 5.0
+
+
+class Fenwick:
+    """Node arithmetic of a Fenwick (binary indexed) tree over buckets 1..BUCKETS.
+
+    Each leaderboard stores the tree's non-zero nodes as LeaderboardNode
+    rows. Adding a household touches update_nodes(bucket) and counting the
+    households in lower buckets sums prefix_nodes(bucket - 1), so both cost
+    log2(BUCKETS) = 12 rows however many households the leaderboard holds.
+    """
+
+    @staticmethod
+    def update_nodes(index):
+        while index <= BUCKETS:
+            yield index
+            index += index & -index
+
+    @staticmethod
+    def prefix_nodes(index):
+        while index > 0:
+            yield index
+            index -= index & -index
+
+    @classmethod
+    def build(cls, counts):
+        """Nodes of the tree for {bucket: count}, touching only occupied buckets' paths"""
+        tree = Counter()
+        for index, count in counts.items():
+            for node in cls.update_nodes(index):
+                tree[node] += count
+        return tree
+
+
+def bucket(per_person):
+    """Bucket (1..BUCKETS) of a footprint per person; lower footprints get lower buckets"""
+    if per_person <= 0:
+        return 1
+    index = int((math.log10(per_person) - LOW) / (HIGH - LOW) * BUCKETS) + 1
+    return min(max(index, 1), BUCKETS)
+
+
+def region_name(value):
+    """City or state as stored on leaderboards, so 'new  delhi' and 'New Delhi' share one"""
+    return ' '.join(value.split()).title()
+
+
+def footprint_per_person(total, family_size):
+    # Totals are rounded as CarbonFootprint stores them, so a freshly
+    # calculated footprint lands where a rebuild would put it
+    total = Decimal(total).quantize(Decimal('0.01'))
+    return (total / max(family_size, 1)).quantize(Decimal('0.01'))
+
+
+def household_boards(household):
+    """(scope, region) of each leaderboard the household belongs on"""
+    return [('city', region_name(household.city)), ('state', region_name(household.state))]
+
+
+def _add_counts(deltas, ensure=True):
+    """Apply {(scope, region, month, node): delta} to the Fenwick trees.
+
+    Costs one UPDATE per distinct delta (usually +1 and -1), plus one
+    INSERT creating any missing nodes unless the caller already has
+    (``ensure=False``).
+    """
+    if ensure:
+        LeaderboardNode.objects.bulk_create(
+            [
+                LeaderboardNode(scope=scope, region=region, month=month, node=node)
+                for (scope, region, month, node), delta in deltas.items() if delta > 0
+            ],
+            ignore_conflicts=True,
+        )
+    by_delta = defaultdict(lambda: defaultdict(list))
+    for (scope, region, month, node), delta in deltas.items():
+        if delta:
+            by_delta[delta][(scope, region, month)].append(node)
+    for delta, boards in by_delta.items():
+        condition = Q()
+        for (scope, region, month), nodes in boards.items():
+            condition |= Q(scope=scope, region=region, month=month, node__in=nodes)
+        LeaderboardNode.objects.filter(condition).update(count=F('count') + delta)
+
+
+def place_footprints(household, footprints):
+    """Put a household's (month, total_footprint) pairs on its city and state leaderboards.
+
+    Entries already on a leaderboard are moved: only the Fenwick nodes of
+    the old and new buckets change, so an update costs a handful of
+    statements however large the leaderboards are.
+    """
+    entries = [
+        LeaderboardEntry(
+            scope=scope, region=region, month=month, household_id=household.pk, name=household.name,
+            per_person=per_person, bucket=bucket(per_person),
+        )
+        for month, total in footprints
+        for per_person in [footprint_per_person(total, household.family_size)]
+        for scope, region in household_boards(household)
+    ]
+    if not entries:
+        return
+    months = {entry.month for entry in entries}
+    with transaction.atomic(savepoint=False):
+        # Creating the new buckets' nodes first takes the write lock before
+        # the old entries are read, so concurrent updates serialise.
+        LeaderboardNode.objects.bulk_create(
+            [
+                LeaderboardNode(scope=entry.scope, region=entry.region, month=entry.month, node=node)
+                for entry in entries for node in Fenwick.update_nodes(entry.bucket)
+            ],
+            ignore_conflicts=True,
+        )
+        old = {
+            (month, scope): (region, old_bucket)
+            for scope, region, month, old_bucket in LeaderboardEntry.objects.filter(
+                household_id=household.pk, month__in=months
+            ).values_list('scope', 'region', 'month', 'bucket')
+        }
+        deltas = Counter()
+        for entry in entries:
+            previous = old.get((entry.month, entry.scope))
+            if previous == (entry.region, entry.bucket):
+                continue
+            if previous is not None:
+                region, old_bucket = previous
+                for node in Fenwick.update_nodes(old_bucket):
+                    deltas[entry.scope, region, entry.month, node] -= 1
+            for node in Fenwick.update_nodes(entry.bucket):
+                deltas[entry.scope, entry.region, entry.month, node] += 1
+        _add_counts(deltas, ensure=False)
+        LeaderboardEntry.objects.bulk_create(
+            entries,
+            update_conflicts=True,
+            unique_fields=['household', 'month', 'scope'],
+            update_fields=['region', 'name', 'per_person', 'bucket'],
+        )
+
+
+def remove_footprints(household_id, months=None):
+    """Take a household's months (all of them when None) off its leaderboards"""
+    entries = LeaderboardEntry.objects.filter(household_id=household_id)
+    if months is not None:
+        entries = entries.filter(month__in=months)
+    with transaction.atomic(savepoint=False):
+        rows = list(entries.select_for_update().values_list('pk', 'scope', 'region', 'month', 'bucket'))
+        if not rows:
+            return
+        deltas = Counter()
+        for _, scope, region, month, entry_bucket in rows:
+            for node in Fenwick.update_nodes(entry_bucket):
+                deltas[scope, region, month, node] -= 1
+        _add_counts(deltas, ensure=False)
+        LeaderboardEntry.objects.filter(pk__in=[row[0] for row in rows]).delete()
+
+
+def top(scope, region, month, limit=TOP):
+    """The lowest footprints per person on a leaderboard, read in index order.
+
+    Households with the same footprint share a rank.
+    """
+    rows = LeaderboardEntry.objects.filter(scope=scope, region=region, month=month).order_by(
+        'bucket', 'per_person', 'household'
+    ).values('household_id', 'name', 'per_person')[:limit]
+    result = []
+    for position, row in enumerate(rows, start=1):
+        tied = result and result[-1]['per_person'] == row['per_person']
+        result.append({**row, 'rank': result[-1]['rank'] if tied else position})
+    return result
+
+
+def rank(household_id, scope, month):
+    """(rank, households on the leaderboard, footprint per person), or None when not on it.
+
+    Reads the household's entry, log2(BUCKETS) tree nodes, and the entries
+    sharing its bucket, instead of counting everyone ahead of it.
+    """
+    entry = LeaderboardEntry.objects.filter(household_id=household_id, month=month, scope=scope).values(
+        'region', 'bucket', 'per_person'
+    ).first()
+    if entry is None:
+        return None
+    board = {'scope': scope, 'region': entry['region'], 'month': month}
+    counts = dict(
+        LeaderboardNode.objects.filter(
+            **board, node__in=[*Fenwick.prefix_nodes(entry['bucket'] - 1), BUCKETS]
+        ).values_list('node', 'count')
+    )
+    total = counts.pop(BUCKETS, 0)
+    ahead = sum(counts.values()) + LeaderboardEntry.objects.filter(
+        **board, bucket=entry['bucket'], per_person__lt=entry['per_person']
+    ).count()
+    return ahead + 1, total, entry['per_person']
+
+
+def boards(household, month, limit=TOP):
+    """The household's city and state leaderboards for a month, with its own rank"""
+    result = []
+    for scope, region in household_boards(household):
+        mine = rank(household.pk, scope, month)
+        result.append({
+            'scope': scope,
+            'region': region,
+            'top': top(scope, region, month, limit),
+            'rank': mine[0] if mine else None,
+            'households': mine[1] if mine else None,
+            'per_person': mine[2] if mine else None,
+        })
+    return result
+
+
+def rebuild_leaderboards():
+    """Recompute every leaderboard from CarbonFootprint, returning the number of entries written"""
+    def shard_entries(alias):
+        rows = CarbonFootprint.objects.values_list(
+            'household_id', 'household__name', 'household__city', 'household__state',
+            'household__family_size', 'month', 'total_footprint',
+        )
+        entries = []
+        for household_id, name, city, state, family_size, month, total in rows.iterator(chunk_size=2000):
+            per_person = footprint_per_person(total, family_size)
+            for scope, region in (('city', region_name(city)), ('state', region_name(state))):
+                entries.append(LeaderboardEntry(
+                    scope=scope, region=region, month=month, household_id=household_id, name=name,
+                    per_person=per_person, bucket=bucket(per_person),
+                ))
+        return entries
+
+    # Shards hold disjoint households, so their entries simply combine
+    entries = [entry for shard in map_shards(shard_entries) for entry in shard]
+    counts = defaultdict(Counter)
+    for entry in entries:
+        counts[entry.scope, entry.region, entry.month][entry.bucket] += 1
+    nodes = [
+        LeaderboardNode(scope=scope, region=region, month=month, node=node, count=count)
+        for (scope, region, month), buckets in counts.items()
+        for node, count in Fenwick.build(buckets).items()
+    ]
+    with transaction.atomic():
+        LeaderboardNode.objects.all().delete()
+        LeaderboardEntry.objects.all().delete()
+        LeaderboardEntry.objects.bulk_create(entries, batch_size=1000)
+        LeaderboardNode.objects.bulk_create(nodes, batch_size=1000)
+    return len(entries)
@@ -0,0 +1,188 @@
+import asyncio
+import json
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError
+from django.utils import timezone
+
+from .models import FootprintEvent
+from .rollups import FIELDS
+from .sharding import household_db, shard_aliases
+
+
+# Figures sent with each event, under the names api_footprint_data uses
+KEYS = {
+    'total_footprint': 'total', 'energy_footprint': 'energy', 'transport_footprint': 'transport',
+    'diet_footprint': 'diet', 'waste_footprint': 'waste',
+}
+
+# Milliseconds the browser waits before reconnecting: soon after a stream
+# ends, and at a polling pace when served without ASGI
+STREAM_RETRY_MS = 1000
+POLL_RETRY_MS = 15000
+
+# Comment lines keep idle connections from being closed by proxies
+KEEPALIVE_SECONDS = 20
+
+# Seconds between deletes of expired events on each database, per process
+PRUNE_SECONDS = 60
+
+# When this process last pruned each database (time.monotonic())
+_pruned = {}
+
+
+def event_databases():
+    """Databases holding events: every shard, or just the default database"""
+    return shard_aliases() or [DEFAULT_DB_ALIAS]
+
+
+def record_events(footprints):
+    """Publish saved footprints to the open dashboards of their households.
+
+    Events are stored beside their household's footprints, on its shard
+    when sharding is on, and that database's expired events are pruned
+    at most once every PRUNE_SECONDS.
+    """
+    by_database = {}
+    for footprint in footprints:
+        by_database.setdefault(household_db(footprint.household_id), []).append(FootprintEvent(
+            household_id=footprint.household_id, month=footprint.month,
+            **{field: getattr(footprint, field) for field in FIELDS},
+        ))
+    for using, events in by_database.items():
+        FootprintEvent.objects.using(using).bulk_create(events)
+        now = time.monotonic()
+        if now - _pruned.get(using, float('-inf')) > PRUNE_SECONDS:
+            prune_events(using)
+            _pruned[using] = now
+
+
+def latest_event_id(using=None):
+    return FootprintEvent.objects.using(using).order_by('-pk').values_list('pk', flat=True).first() or 0
+
+
+def events_after(last_id, household_id=None, using=None):
+    """Events newer than ``last_id`` on one database as dicts, oldest first"""
+    events = FootprintEvent.objects.using(using).filter(pk__gt=last_id)
+    if household_id is not None:
+        events = events.filter(household_id=household_id)
+    return list(events.order_by('pk').values('pk', 'household_id', 'month', *FIELDS))
+
+
+def latest_event_ids():
+    """The newest event id on each database holding events"""
+    return {using: latest_event_id(using) for using in event_databases()}
+
+
+def new_events(last_ids):
+    """(database, event) pairs newer than each database's entry in ``last_ids``"""
+    return [(using, event) for using, last_id in last_ids.items() for event in events_after(last_id, using=using)]
+
+
+def prune_events(using=None):
+    """Delete events too old for any reconnecting dashboard to ask for"""
+    cutoff = timezone.now() - timedelta(seconds=settings.LIVE_EVENT_RETENTION_SECONDS)
+    FootprintEvent.objects.using(using).filter(created_at__lt=cutoff).delete()
+
+
+def format_event(event):
+    data = {
+        'month': event['month'].strftime('%Y-%m'),
+        'label': event['month'].strftime('%b %Y'),
+        **{key: float(event[field]) for field, key in KEYS.items()},
+    }
+    return f"id: {event['pk']}\nevent: footprint\ndata: {json.dumps(data)}\n\n"
+
+
+class EventHub:
+    """Hand new footprint events to the open streams of this process.
+
+    One task polls the event table and puts each event on the queues of its
+    household's streams, so each database sees one query per poll however
+    many dashboards are open. Event ids are counted per database (shard),
+    and so is the position of the poll. The task starts with the first
+    stream and stops once the last one has closed.
+    """
+
+    def __init__(self):
+        self.queues = defaultdict(set)
+        self.task = None
+
+    def subscribe(self, household_id):
+        queue = asyncio.Queue()
+        self.queues[household_id].add(queue)
+        loop = asyncio.get_running_loop()
+        if self.task is None or self.task.done() or self.task.get_loop() is not loop:
+            self.task = loop.create_task(self.run())
+        return queue
+
+    def unsubscribe(self, household_id, queue):
+        queues = self.queues.get(household_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self.queues[household_id]
+
+    async def run(self):
+        last_ids = await sync_to_async(latest_event_ids)()
+        while self.queues:
+            await asyncio.sleep(settings.LIVE_POLL_SECONDS)
+            try:
+                events = await sync_to_async(new_events)(last_ids)
+            except DatabaseError:
+                # e.g. the database is locked; try again on the next poll
+                continue
+            for using, event in events:
+                last_ids[using] = event['pk']
+                for queue in self.queues.get(event['household_id'], ()):
+                    queue.put_nowait(event)
+
+
+hub = EventHub()
+
+
+async def stream(household_id, last_event_id=None):
+    """Server-sent events for one dashboard, ending after LIVE_STREAM_SECONDS.
+
+    Events after ``last_event_id`` (the browser's Last-Event-ID) are sent
+    first, so nothing is missed across reconnects.
+    """
+    using = household_db(household_id)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + settings.LIVE_STREAM_SECONDS
+    queue = hub.subscribe(household_id)
+    try:
+        yield f'retry: {STREAM_RETRY_MS}\n\n'
+        if last_event_id is None:
+            last_event_id = await sync_to_async(latest_event_id)(using)
+            yield f'id: {last_event_id}\n\n'
+        else:
+            for event in await sync_to_async(events_after)(last_event_id, household_id, using):
+                last_event_id = event['pk']
+                yield format_event(event)
+        while (remaining := deadline - loop.time()) > 0:
+            try:
+                event = await asyncio.wait_for(queue.get(), min(KEEPALIVE_SECONDS, remaining))
+            except asyncio.TimeoutError:
+                yield ': keep-alive\n\n'
+                continue
+            if event['pk'] > last_event_id:
+                last_event_id = event['pk']
+                yield format_event(event)
+    finally:
+        hub.unsubscribe(household_id, queue)
+
+
+def poll_events(household_id, last_event_id=None):
+    """The same events as one short response, for servers without ASGI"""
+    using = household_db(household_id)
+    lines = [f'retry: {POLL_RETRY_MS}\n\n']
+    if last_event_id is None:
+        lines.append(f'id: {latest_event_id(using)}\n\n')
+    else:
+        lines.extend(format_event(event) for event in events_after(last_event_id, household_id, using))
+    return ''.join(lines)
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+
+class UncheckedCommand(BaseCommand):
+    """Base for commands run from cron, a supervisor or a deploy script.
+
+    Django's system checks import every URLconf and so every view module
+    before the command starts, which costs more than many of these
+    commands' own work. They skip the checks; deploys run
+    ``manage.py check`` once instead.
+    """
+
+    requires_system_checks = []
@@ -0,0 +1,103 @@
+from collections import defaultdict
+from datetime import date
+
+from django.core.management.base import CommandError
+from django.db import transaction
+
+from footprint.anomalies import ACTIVITIES
+from footprint.archive import pack, unpack
+from footprint.management.base import UncheckedCommand
+from footprint.models import ActivityArchive, CarbonFootprint, Household
+from footprint.sharding import map_shards
+from footprint.utils import CarbonCalculator, upsert_footprint
+
+
+class Command(UncheckedCommand):
+    help = 'Pack closed months of activity data into compact archive blobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than', type=int, default=24,
+            help='Archive months at least this many months old (minimum 12, default 24)'
+        )
+        parser.add_argument('--batch-size', type=int, default=500, help='Households per transaction')
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        # The what-if simulator reads the last twelve months row by row
+        if options['older_than'] < 12:
+            raise CommandError('--older-than must be at least 12 months.')
+        today = date.today()
+        months = today.year * 12 + today.month - 1 - options['older_than']
+        cutoff = date(months // 12, months % 12 + 1, 1)
+
+        def archive_shard(alias):
+            household_ids = list(Household.objects.order_by('id').values_list('id', flat=True))
+            archived_rows = archives = 0
+            for i in range(0, len(household_ids), options['batch_size']):
+                batch = household_ids[i:i + options['batch_size']]
+                with transaction.atomic(using=alias):
+                    rows, written = self.archive_batch(batch, cutoff, options['dry_run'])
+                archived_rows += rows
+                archives += written
+            return archived_rows, archives
+
+        results = map_shards(archive_shard)
+        archived_rows = sum(rows for rows, _ in results)
+        archives = sum(written for _, written in results)
+
+        verb = 'Would archive' if options['dry_run'] else 'Archived'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {archived_rows} activity rows into {archives} household-months before {cutoff}'
+        ))
+
+    def archive_batch(self, household_ids, cutoff, dry_run):
+        grouped = defaultdict(lambda: defaultdict(list))
+        for model in ACTIVITIES:
+            rows = model.objects.filter(household_id__in=household_ids, month__lt=cutoff)
+            for row in rows.iterator():
+                grouped[(row.household_id, row.month)][model].append(row)
+        row_count = sum(len(r) for models in grouped.values() for r in models.values())
+        if dry_run or not grouped:
+            return row_count, len(grouped)
+
+        households = Household.objects.in_bulk(household_ids)
+        existing = {
+            (a.household_id, a.month): a
+            for a in ActivityArchive.objects.filter(household_id__in=household_ids, month__lt=cutoff)
+        }
+        calculated = set(
+            CarbonFootprint.objects.filter(household_id__in=household_ids, month__lt=cutoff)
+            .values_list('household_id', 'month')
+        )
+
+        archives = []
+        for (household_id, month), rows in grouped.items():
+            household = households[household_id]
+            # Reports read CarbonFootprint, so make sure the month has one
+            # before its rows disappear.
+            if (household_id, month) not in calculated:
+                upsert_footprint(
+                    household, month,
+                    CarbonCalculator.calculate_total_footprint(household, month)
+                )
+            if (household_id, month) in existing:
+                merged = unpack(existing[(household_id, month)].data, household, month)
+                for model, live in rows.items():
+                    _, type_field, _ = ACTIVITIES[model]
+                    live_types = {getattr(row, type_field) for row in live}
+                    merged[model] = [
+                        row for row in merged[model] if getattr(row, type_field) not in live_types
+                    ] + live
+                rows = merged
+            archives.append(ActivityArchive(household=household, month=month, data=pack(rows)))
+
+        ActivityArchive.objects.bulk_create(
+            archives,
+            update_conflicts=True,
+            unique_fields=['household', 'month'],
+            update_fields=['data'],
+        )
+        for model in ACTIVITIES:
+            model.objects.filter(household_id__in=household_ids, month__lt=cutoff).delete()
+        return row_count, len(archives)
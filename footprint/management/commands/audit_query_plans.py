@@ -0,0 +1,151 @@
+import json
+from collections import Counter
+
+from django.core.cache import cache
+from django.core.management.base import CommandError
+from django.db import connection, transaction
+from django.template import TemplateDoesNotExist
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from footprint.metering import load_profile
+from footprint.utils import CarbonCalculator
+
+from .query_budget import Command as QueryBudgetCommand
+
+
+ISSUES = [
+    'full_scan', 'automatic_index', 'temp_btree_order_by', 'temp_btree_group_by',
+    'temp_btree_distinct', 'not_covering',
+]
+
+
+def plan_issues(plan):
+    """Problems in an EXPLAIN QUERY PLAN listing, as (issue, detail) pairs"""
+    issues = []
+    for detail in plan:
+        if detail.startswith('SCAN ') and ' USING ' not in detail:
+            # A virtual table scan with an index number is an FTS5 lookup
+            if ' VIRTUAL TABLE INDEX ' not in detail:
+                issues.append(('full_scan', detail))
+        elif 'AUTOMATIC' in detail:
+            # SQLite builds a throwaway index because no real one fits
+            issues.append(('automatic_index', detail))
+        elif detail.startswith('USE TEMP B-TREE FOR '):
+            if 'GROUP BY' in detail:
+                issues.append(('temp_btree_group_by', detail))
+            elif 'DISTINCT' in detail:
+                issues.append(('temp_btree_distinct', detail))
+            else:
+                issues.append(('temp_btree_order_by', detail))
+        elif ' USING INDEX ' in detail and 'COVERING' not in detail:
+            issues.append(('not_covering', detail))
+    return issues
+
+
+class Command(QueryBudgetCommand):
+    help = (
+        'Run the queries of CarbonCalculator and each view against seeded data '
+        '(rolled back afterwards) and report their EXPLAIN QUERY PLAN, flagging '
+        'full table scans, temporary B-trees and indexes that do not cover the query'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--households', type=int, default=5)
+        parser.add_argument('--months', type=int, default=12)
+        parser.add_argument('--format', choices=['json', 'text'], default='json')
+        parser.add_argument(
+            '--fail-on', action='append', choices=ISSUES, default=[],
+            help='Exit with an error if any query has this issue (repeatable)'
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('EXPLAIN QUERY PLAN auditing needs the SQLite backend')
+
+        statements = {}
+        with transaction.atomic(), override_settings(DEBUG=False, ALLOWED_HOSTS=['localhost']):
+            self.seed(options)
+            for source, call in self.sources():
+                cache.clear()
+                with connection.execute_wrapper(self.collector(source, statements)):
+                    try:
+                        call()
+                    except TemplateDoesNotExist:
+                        pass
+            report = self.explain(statements)
+            transaction.set_rollback(True)
+
+        if options['format'] == 'json':
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            self.write_text(report)
+
+        failing = [issue for issue in options['fail_on'] if report['summary'].get(issue)]
+        if failing:
+            raise CommandError(f"Query plans with {', '.join(failing)} found")
+
+    def sources(self):
+        """(name, callable) for every code path whose queries are audited"""
+        household = self.household
+        month = household.carbonfootprint_set.latest('month').month
+        yield 'CarbonCalculator.calculate_total_footprint', (
+            lambda: CarbonCalculator.calculate_total_footprint(household, month)
+        )
+        yield 'metering.load_profile', lambda: load_profile(household)
+
+        pages = [(label, user, method, path, data) for label, _, user, method, path, data in self.pages()]
+        organisation = household.organisations.first()
+        for name in ('scenarios', 'api_scenarios', 'organisations', 'api_load_profile', 'analytics', 'api_analytics'):
+            pages.append((name, self.admin if 'analytics' in name else household.user, 'get', reverse(name), None))
+        for name in ('organisation_dashboard', 'api_organisation_rollups'):
+            pages.append((name, self.admin, 'get', reverse(name, args=[organisation.pk]), None))
+
+        for label, user, method, path, data in pages:
+            def request(user=user, method=method, path=path, data=data):
+                client = Client(HTTP_HOST='localhost')
+                client.force_login(user)
+                getattr(client, method)(path, data)
+            yield label, request
+
+    def collector(self, source, statements):
+        def collect(execute, sql, params, many, context):
+            verb = sql.lstrip().split(None, 1)[0].upper()
+            if verb in ('SELECT', 'UPDATE', 'DELETE') and not many:
+                entry = statements.setdefault(sql, {'sources': [], 'params': params, 'count': 0})
+                entry['count'] += 1
+                if source not in entry['sources']:
+                    entry['sources'].append(source)
+            return execute(sql, params, many, context)
+        return collect
+
+    def explain(self, statements):
+        queries = []
+        summary = Counter()
+        with connection.cursor() as cursor:
+            for sql, entry in statements.items():
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}', entry['params'])
+                plan = [row[3] for row in cursor.fetchall()]
+                issues = plan_issues(plan)
+                summary.update({issue for issue, _ in issues})
+                queries.append({
+                    'sources': entry['sources'],
+                    'executions': entry['count'],
+                    'sql': sql,
+                    'plan': plan,
+                    'issues': [{'issue': issue, 'detail': detail} for issue, detail in issues],
+                })
+        return {'queries': queries, 'summary': {issue: summary[issue] for issue in ISSUES}}
+
+    def write_text(self, report):
+        for query in report['queries']:
+            if not query['issues']:
+                continue
+            self.stdout.write(self.style.WARNING(', '.join(query['sources'])))
+            self.stdout.write(f"  {query['sql'][:300]}")
+            for issue in query['issues']:
+                self.stdout.write(f"  {issue['issue']:<22}{issue['detail']}")
+        self.stdout.write(f"{len(report['queries'])} distinct statements audited")
+        for issue, count in report['summary'].items():
+            self.stdout.write(f'{issue:<24}{count:>5}')
@@ -0,0 +1,396 @@
+import gc
+import statistics
+import subprocess
+import sys
+import tracemalloc
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from time import perf_counter
+from unittest import mock
+
+import numpy as np
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.template import base as template_base
+from django.test import RequestFactory
+from django.utils import timezone
+
+from footprint import forecasting, metering, scenarios, search, views
+from footprint.models import CarbonFootprint, Household
+from footprint.sharding import sharding_enabled
+from footprint.synthetic import create_synthetic_households, create_synthetic_tips
+
+
+class RenderTimer:
+    """Split the wall time of a view into ORM time and template time.
+
+    Queries fired lazily while a template renders are charged to the ORM,
+    so the template figure is pure rendering cost.
+    """
+
+    def __init__(self):
+        self.sql = 0.0
+        self.template = 0.0
+        self.queries = 0
+        self._depth = 0
+
+    def execute(self, execute, sql, params, many, context):
+        start = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql += perf_counter() - start
+            self.queries += 1
+
+    @contextmanager
+    def installed(self):
+        timer = self
+        original_render = template_base.Template.render
+
+        def render(template, context):
+            if timer._depth:
+                return original_render(template, context)
+            timer._depth += 1
+            sql_before = timer.sql
+            start = perf_counter()
+            try:
+                return original_render(template, context)
+            finally:
+                elapsed = perf_counter() - start
+                timer.template += elapsed - (timer.sql - sql_before)
+                timer._depth -= 1
+
+        with mock.patch.object(template_base.Template, 'render', render):
+            with connection.execute_wrapper(self.execute):
+                yield self
+
+
+# Boots a fresh worker the way the WSGI server does and serves one request;
+# prints seconds spent importing/booting and handling the request.
+STARTUP_SCRIPT = '''
+import os, time
+start = time.perf_counter()
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'carbon_tracker.settings')
+from carbon_tracker.wsgi import application
+booted = time.perf_counter()
+from django.test import Client
+Client(HTTP_HOST='localhost').get('/')
+print(booted - start, time.perf_counter() - booted)
+'''
+
+
+def import_profile(stderr, limit=12):
+    """Top-level imports by cumulative microseconds from -X importtime output"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if not name.startswith('  '):
+            rows.append((int(cumulative), name.strip()))
+    return sorted(rows, reverse=True)[:limit]
+
+
+class Command(BaseCommand):
+    help = 'Benchmark request handling against throwaway synthetic data'
+
+    SECTIONS = ['render', 'chart', 'memory', 'scenarios', 'forecast', 'startup', 'metering', 'search']
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--section', action='append', choices=self.SECTIONS,
+            help='Section to run (repeatable, default: all)'
+        )
+        parser.add_argument('--households', type=int, default=5)
+        parser.add_argument('--months', type=int, default=24)
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--tips', type=int, default=100_000, help='Synthetic tips for the search section')
+        parser.add_argument(
+            '--forecast-households', type=int, default=100_000,
+            help='Households with 36 months of footprints for the forecast section'
+        )
+
+    def handle(self, *args, **options):
+        sections = options['section'] or self.SECTIONS
+        if sharding_enabled():
+            raise CommandError('Run the benchmark against an unsharded database (unset DATABASE_SHARDS)')
+        # Everything runs inside a transaction that is rolled back, so the
+        # synthetic households never reach the real database.
+        with transaction.atomic():
+            self.households = create_synthetic_households(
+                options['households'], months=options['months'], prefix='bench'
+            )
+            for section in sections:
+                self.stdout.write(self.style.MIGRATE_HEADING(f'== {section} =='))
+                getattr(self, f'bench_{section}')(options)
+            transaction.set_rollback(True)
+
+    def request(self, path, household):
+        request = RequestFactory().get(path)
+        request.user = household.user if household else AnonymousUser()
+        return request
+
+    def bench_render(self, options):
+        """Template time vs ORM time for the heavy pages, cold and warm cache"""
+        household = self.households[0]
+        month = household.carbonfootprint_set.latest('month').month.strftime('%Y-%m')
+        pages = [
+            ('dashboard', lambda: views.dashboard(self.request('/dashboard/', household))),
+            ('calculate_footprint', lambda: views.calculate_footprint(
+                self.request(f'/calculate/{month}/', household), month=month
+            )),
+        ]
+        self.stdout.write(
+            f"{'view':<22}{'cache':<7}{'total ms':>10}{'orm ms':>10}"
+            f"{'template ms':>13}{'queries':>9}"
+        )
+        for name, call in pages:
+            for label, cold in (('cold', True), ('warm', False)):
+                totals, orm, templates, queries = [], [], [], []
+                cache.clear()
+                call()
+                for _ in range(options['iterations']):
+                    if cold:
+                        cache.clear()
+                    timer = RenderTimer()
+                    with timer.installed():
+                        start = perf_counter()
+                        call()
+                        totals.append(perf_counter() - start)
+                    orm.append(timer.sql)
+                    templates.append(timer.template)
+                    queries.append(timer.queries)
+                self.stdout.write(
+                    f'{name:<22}{label:<7}'
+                    f'{statistics.mean(totals) * 1000:>10.2f}'
+                    f'{statistics.mean(orm) * 1000:>10.2f}'
+                    f'{statistics.mean(templates) * 1000:>13.2f}'
+                    f'{statistics.mean(queries):>9.1f}'
+                )
+
+    def bench_chart(self, options):
+        """Time to chart data and queries for a dashboard view, inline vs fetched"""
+        household = self.households[0]
+        flows = [
+            ('inline (dashboard)', ['/dashboard/']),
+            ('fetch (+ API call)', ['/dashboard/', '/api/footprint-data/']),
+        ]
+        handlers = {'/dashboard/': views.dashboard, '/api/footprint-data/': views.api_footprint_data}
+        self.stdout.write(f"{'flow':<22}{'requests':>9}{'total ms':>10}{'queries':>9}{'chart bytes':>13}")
+        for name, paths in flows:
+            timings, queries, payload = [], [], 0
+            cache.clear()
+            for _ in range(options['iterations']):
+                timer = RenderTimer()
+                with connection.execute_wrapper(timer.execute):
+                    start = perf_counter()
+                    responses = [handlers[path](self.request(path, household)) for path in paths]
+                    timings.append(perf_counter() - start)
+                queries.append(timer.queries)
+            content = responses[-1].content
+            if len(paths) == 1:
+                # The series embedded in the page by json_script
+                start = content.index(b'id="footprint-chart-data"')
+                payload = content.index(b'</script>', start) - content.index(b'>', start) - 1
+            else:
+                payload = len(content)
+            self.stdout.write(
+                f'{name:<22}{len(paths):>9}{statistics.mean(timings) * 1000:>10.2f}'
+                f'{statistics.mean(queries):>9.1f}{payload:>13}'
+            )
+
+    def bench_memory(self, options):
+        """Peak traced memory and allocated blocks per request on the read paths"""
+        household = self.households[0]
+        pages = [
+            ('dashboard', lambda: views.dashboard(self.request('/dashboard/', household))),
+            ('api_footprint_data', lambda: views.api_footprint_data(
+                self.request('/api/footprint-data/', household)
+            )),
+            ('tips', lambda: views.tips(self.request('/tips/', household))),
+        ]
+        history = household.carbonfootprint_set.count()
+        self.stdout.write(f'household with {history} months of footprints, fragment cache cold')
+        self.stdout.write(f"{'view':<22}{'peak KiB':>10}{'blocks':>9}")
+        for name, call in pages:
+            call()
+            peaks, blocks = [], []
+            tracemalloc.start()
+            try:
+                for _ in range(options['iterations']):
+                    cache.clear()
+                    before = tracemalloc.take_snapshot()
+                    gc.collect()
+                    tracemalloc.reset_peak()
+                    baseline, _ = tracemalloc.get_traced_memory()
+                    response = call()
+                    peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+                    after = tracemalloc.take_snapshot()
+                    # Blocks the request allocated and still held, mostly the response
+                    blocks.append(sum(max(stat.count_diff, 0) for stat in after.compare_to(before, 'lineno')))
+                    del response
+            finally:
+                tracemalloc.stop()
+            self.stdout.write(
+                f'{name:<22}{statistics.mean(peaks) / 1024:>10.1f}{statistics.mean(blocks):>9.0f}'
+            )
+
+    def bench_scenarios(self, options):
+        """Latency of the what-if simulator, split into history load and NumPy scoring"""
+        household = self.households[0]
+        load, score = [], []
+        for _ in range(options['iterations']):
+            start = perf_counter()
+            quantities, factors = scenarios.annual_activity(household)
+            load.append(perf_counter() - start)
+            start = perf_counter()
+            suggestions, evaluated = scenarios.top_scenarios(quantities, factors)
+            score.append(perf_counter() - start)
+        self.stdout.write(f'scenarios evaluated per request: {evaluated}')
+        self.stdout.write(f'history load ms: {statistics.mean(load) * 1000:.2f}')
+        self.stdout.write(f'scoring ms:      {statistics.mean(score) * 1000:.2f}')
+
+    def seed_footprints(self, households, months, end_month, batch=5000):
+        """Insert households with ``months`` of seasonal footprints ending at ``end_month``.
+
+        Rows go in with executemany in batches rather than as model
+        instances, so seeding millions of them takes seconds.
+        """
+        rng = np.random.default_rng(0)
+        last = forecasting.month_ordinal(end_month)
+        month_dates = [forecasting.ordinal_to_date(last - months + 1 + i) for i in range(months)]
+        seasonal = 1 + 0.2 * np.sin(np.arange(months) * np.pi / 6)
+        table = CarbonFootprint._meta.db_table
+        columns = ['household_id', 'month', 'total_footprint', *(f'{c}_footprint' for c in forecasting.CATEGORIES), 'created_at']
+        sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})"
+        now = timezone.now()
+        for offset in range(0, households, batch):
+            count = min(batch, households - offset)
+            users = User.objects.bulk_create(
+                [User(username=f'forecast-{offset + i}', password='!') for i in range(count)]
+            )
+            homes = Household.objects.bulk_create([
+                Household(user=user, name=user.username, address='-', city='Pune', state='Maharashtra', pincode='411001')
+                for user in users
+            ])
+            values = rng.gamma(4.0, 50.0, size=(count, 1, len(forecasting.CATEGORIES)))
+            values = values * seasonal[None, :, None] * rng.normal(1, 0.1, size=(count, months, 1))
+            observed = rng.random((count, months)) > 0.1
+            values = np.round(values, 2).tolist()
+            rows = [
+                (home.pk, month, round(sum(values[h][m]), 2), *values[h][m], now)
+                for h, home in enumerate(homes)
+                for m, month in enumerate(month_dates) if observed[h, m]
+            ]
+            with connection.cursor() as cursor:
+                cursor.executemany(sql, rows)
+
+    def bench_forecast(self, options):
+        """End-to-end batch forecast (load, fit, store) at production scale"""
+        households, months, horizon = options['forecast_households'], 36, 6
+        end_month = date.today().replace(day=1)
+        start = perf_counter()
+        self.seed_footprints(households, months, end_month)
+        self.stdout.write(f'seeded {households} households x {months} months in {perf_counter() - start:.1f}s')
+
+        # The same steps as manage.py forecast_footprints
+        start = perf_counter()
+        household_ids, values, mask, first = forecasting.load_history(end_month, months)
+        loaded = perf_counter()
+        season = forecasting.seasonal_index(values, mask, first)
+        coefficients = forecasting.fit_trends(values, mask, season, first)
+        forecasts = forecasting.predict(coefficients, season, first, months, horizon)
+        forecast_months = [forecasting.ordinal_to_date(first + months + i) for i in range(horizon)]
+        fitted = perf_counter()
+        created = forecasting.store_forecasts(household_ids, forecast_months, forecasts)
+        stored = perf_counter()
+        self.stdout.write(f'load history s:    {loaded - start:.2f}')
+        self.stdout.write(f'fit and predict s: {fitted - loaded:.2f}')
+        self.stdout.write(f'store {created} forecasts s: {stored - fitted:.2f}')
+        self.stdout.write(f'{len(household_ids)} households end to end in {stored - start:.2f}s')
+
+    def run_python(self, *args):
+        return subprocess.run(
+            [sys.executable, *args], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True,
+        )
+
+    def bench_startup(self, options):
+        """Cold start of a worker and of a cron command, plus an import-time profile"""
+        runs = max(3, min(options['iterations'], 10))
+        walls, boots, firsts, commands = [], [], [], []
+        for _ in range(runs):
+            start = perf_counter()
+            boot, first = map(float, self.run_python('-c', STARTUP_SCRIPT).stdout.split())
+            walls.append(perf_counter() - start)
+            boots.append(boot)
+            firsts.append(first)
+            start = perf_counter()
+            self.run_python('manage.py', 'rebuild_rollups', '--help')
+            commands.append(perf_counter() - start)
+        self.stdout.write(f'time to first request ms:   {statistics.median(walls) * 1000:.0f}')
+        self.stdout.write(f'  wsgi import + warm-up ms: {statistics.median(boots) * 1000:.0f}')
+        self.stdout.write(f'  first request ms:         {statistics.median(firsts) * 1000:.0f}')
+        self.stdout.write(f'manage.py command start ms: {statistics.median(commands) * 1000:.0f}')
+
+        profile = import_profile(self.run_python('-X', 'importtime', '-c', STARTUP_SCRIPT).stderr)
+        self.stdout.write(f"{'top-level import':<40}{'cumulative ms':>14}")
+        for cumulative, name in profile:
+            self.stdout.write(f'{name:<40}{cumulative / 1000:>14.1f}')
+
+    def bench_metering(self, options):
+        """Smart-meter ingestion as daily uploads, and the load-profile query"""
+        household = self.households[0]
+        start = timezone.make_aware(datetime(2024, 1, 1))
+        step = timedelta(minutes=metering.SLOT_MINUTES)
+        rng = np.random.default_rng(0)
+        days = 365
+        uploads = []
+        for day in range(days):
+            base = start + timedelta(days=day)
+            values = rng.gamma(2.0, 0.05, size=metering.SLOTS)
+            readings = [
+                {'timestamp': (base + i * step).isoformat(), 'kwh': float(v)}
+                for i, v in enumerate(values)
+            ]
+            begin = perf_counter()
+            metering.ingest_readings(household, readings)
+            uploads.append(perf_counter() - begin)
+        self.stdout.write(f'{days} daily uploads of {metering.SLOTS} readings')
+        self.stdout.write(f'upload ms (mean / max): {statistics.mean(uploads) * 1000:.2f} / {max(uploads) * 1000:.2f}')
+
+        timings = []
+        for _ in range(options['iterations']):
+            begin = perf_counter()
+            metering.load_profile(household)
+            timings.append(perf_counter() - begin)
+        self.stdout.write(f'12-month load profile ms: {statistics.mean(timings) * 1000:.2f}')
+
+    def bench_search(self, options):
+        """Full-text tip search latency over a table of synthetic tips"""
+        start = perf_counter()
+        create_synthetic_tips(options['tips'])
+        self.stdout.write(f"{options['tips']} tips inserted and indexed in {perf_counter() - start:.1f}s")
+        queries = [
+            ('one word', 'solar', {}),
+            ('prefix', 'sol', {}),
+            ('rare word', 'kari', {}),
+            ('two words', 'solar inverter', {}),
+            ('category', 'bus', {'category': 'transport'}),
+            ('category, no match', 'bus', {'category': 'energy'}),
+            ('two words, category', 'compost plastic', {'category': 'waste'}),
+            ('min impact', 'bus metro', {'min_impact': 400}),
+        ]
+        self.stdout.write(f"{'query':<36}{'tips':>6}{'p50 ms':>11}{'p95 ms':>9}")
+        for label, query, filters in queries:
+            timings = []
+            for _ in range(options['iterations']):
+                begin = perf_counter()
+                results = search.search_tips(query, **filters)
+                timings.append(perf_counter() - begin)
+            p50, p95 = np.percentile(timings, [50, 95]) * 1000
+            self.stdout.write(f"{f'{label} ({query})':<36}{len(results):>6}{p50:>11.2f}{p95:>9.2f}")
@@ -0,0 +1,21 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from footprint.apikeys import create_api_key
+
+
+class Command(BaseCommand):
+    help = 'Issue an API key for a user, for smart meters and the mobile app (printed once)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument('--name', default='device', help='What the key is for, e.g. "kitchen meter"')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f"No user named {options['username']!r}")
+        key = create_api_key(user, options['name'])
+        self.stdout.write(key)
+        self.stderr.write('Store this key now; it cannot be shown again. Send it as "Authorization: Bearer <key>".')
@@ -0,0 +1,42 @@
+from time import perf_counter
+
+from django.core.management.base import CommandError
+from django.db import transaction
+
+from footprint.forecasting import forecast_all, store_forecasts
+from footprint.management.base import UncheckedCommand
+
+
+class Command(UncheckedCommand):
+    help = 'Forecast the next months of carbon footprint for every household'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--horizon', type=int, default=6,
+            help='Number of months to forecast (3-6, default 6)'
+        )
+        parser.add_argument(
+            '--history', type=int, default=36,
+            help='Months of history to fit on (default 36)'
+        )
+
+    def handle(self, *args, **options):
+        if not 3 <= options['horizon'] <= 6:
+            raise CommandError('--horizon must be between 3 and 6 months.')
+        if options['history'] < 2:
+            raise CommandError('--history must be at least 2 months.')
+
+        start = perf_counter()
+        household_ids, months, forecasts = forecast_all(
+            history_months=options['history'], horizon=options['horizon']
+        )
+        fitted = perf_counter()
+        with transaction.atomic():
+            created = store_forecasts(household_ids, months, forecasts)
+        stored = perf_counter()
+
+        self.stdout.write(
+            f'Fitted {len(household_ids)} households in {fitted - start:.2f}s, '
+            f'stored {created} forecasts in {stored - fitted:.2f}s'
+        )
+        self.stdout.write(self.style.SUCCESS('Forecasts updated successfully!'))
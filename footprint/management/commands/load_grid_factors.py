@@ -0,0 +1,46 @@
+import csv
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from django.core.management.base import CommandError
+
+from footprint.management.base import UncheckedCommand
+from footprint.models import GridFactor
+
+
+class Command(UncheckedCommand):
+    help = 'Load state grid emission factors from a CSV with columns state, month (YYYY-MM), factor[, source]'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV file to load')
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['path'], newline='', encoding='utf-8') as handle:
+                rows = list(csv.DictReader(handle))
+        except OSError as exc:
+            raise CommandError(exc)
+
+        factors = []
+        for line, row in enumerate(rows, start=2):
+            try:
+                factors.append(GridFactor(
+                    state=row['state'].strip(),
+                    month=datetime.strptime(row['month'].strip(), '%Y-%m').date(),
+                    factor=Decimal(row['factor'].strip()),
+                    source=(row.get('source') or '').strip(),
+                ))
+            except (AttributeError, KeyError, ValueError, InvalidOperation):
+                raise CommandError(f'Line {line}: expected state, month (YYYY-MM) and a numeric factor.')
+            if factors[-1].factor < 0:
+                raise CommandError(f'Line {line}: factor cannot be negative.')
+
+        # Every process sees the new updated_at values and reloads its table
+        GridFactor.objects.bulk_create(
+            factors,
+            update_conflicts=True,
+            unique_fields=['state', 'month'],
+            update_fields=['factor', 'source', 'updated_at'],
+            batch_size=1000,
+        )
+        self.stdout.write(self.style.SUCCESS(f'Loaded {len(factors)} grid factors'))
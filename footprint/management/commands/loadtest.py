@@ -0,0 +1,356 @@
+import http.client
+import json
+import random
+import secrets
+import socket
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from http.cookies import SimpleCookie
+from time import perf_counter
+from urllib.parse import urlencode
+
+import numpy as np
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from footprint.models import Organisation, OrganisationMember
+from footprint.synthetic import create_synthetic_households, month_range
+from footprint.urls import urlpatterns
+
+
+# Serves the production WSGI application on a threaded server. Unhandled
+# exceptions are echoed back in a response header so the harness can tell
+# SQLite lock errors from other failures without DEBUG pages.
+SERVER_SCRIPT = '''
+import os, sys
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'carbon_tracker.settings')
+from carbon_tracker.wsgi import application
+from django.core.servers.basehttp import run
+from django.core.signals import got_request_exception
+
+def record(sender, request=None, **kwargs):
+    exc = sys.exc_info()[1]
+    if request is not None and exc is not None:
+        message = ' '.join(f'{type(exc).__name__}: {exc}'.split())[:200]
+        request.META['loadtest.error'] = message.encode('latin-1', 'replace').decode('latin-1')
+
+got_request_exception.connect(record)
+
+def app(environ, start_response):
+    def respond(status, headers, exc_info=None):
+        if 'loadtest.error' in environ:
+            headers.append(('X-Load-Test-Error', environ['loadtest.error']))
+        return start_response(status, headers, exc_info)
+    return application(environ, respond)
+
+run(sys.argv[1], int(sys.argv[2]), app, threading=True)
+'''
+
+LOCK_ERRORS = ('database is locked', 'database table is locked')
+
+# Tip searches users type
+SEARCHES = ['solar', 'led bulb', 'metro', 'compost', 'water', 'cycl']
+
+
+def form(path, data):
+    return 'POST', path, urlencode(data), 'application/x-www-form-urlencoded'
+
+
+def get(path, params=None):
+    return 'GET', f'{path}?{urlencode(params)}' if params else path, None, None
+
+
+def post_json(path, data):
+    return 'POST', path, json.dumps(data), 'application/json'
+
+
+def meter_day(user, rng):
+    day = datetime.fromisoformat(rng.choice(user.months)) + timedelta(days=rng.randrange(28))
+    return post_json('/api/meter-readings/', {'readings': [
+        {'timestamp': (day + timedelta(minutes=15 * i)).isoformat(), 'kwh': round(rng.uniform(0, 0.4), 3)}
+        for i in range(96)
+    ]})
+
+
+def trip_batch(user, rng):
+    return post_json('/api/trips/', {
+        'batch_id': f'{user.username}-{rng.getrandbits(48):x}',
+        'trips': [
+            {
+                'mode': rng.choice(['bus', 'metro', 'car_petrol', 'auto']),
+                'distance_km': round(rng.uniform(1, 30), 1),
+                'date': f'{rng.choice(user.months)[:8]}{rng.randint(1, 28):02d}',
+            }
+            for _ in range(rng.randint(1, 20))
+        ],
+    })
+
+
+# (url name, weight, request builder). Reads dominate, as in production;
+# every pattern in footprint/urls.py must appear here.
+ROUTES = [
+    ('home', 3, lambda u, r: get('/')),
+    ('register', 1, lambda u, r: get('/register/')),
+    ('dashboard', 15, lambda u, r: get('/dashboard/')),
+    ('setup_household', 1, lambda u, r: get('/setup-household/')),
+    ('add_energy_data', 2, lambda u, r: form('/add-energy/', {
+        'fuel_type': 'electricity', 'consumption': round(r.uniform(80, 400), 2),
+        'unit': 'kWh', 'month': r.choice(u.months)[:7],
+    })),
+    ('add_transport_data', 2, lambda u, r: form('/add-transport/', {
+        'vehicle_type': r.choice(['car_petrol', 'bus', 'metro']), 'distance_km': round(r.uniform(5, 60), 1),
+        'frequency_per_week': r.randint(1, 7), 'month': r.choice(u.months)[:7],
+    })),
+    ('add_diet_data', 2, lambda u, r: form('/add-diet/', {
+        'food_type': r.choice(['rice', 'wheat', 'milk']), 'consumption_kg': round(r.uniform(2, 30), 2),
+        'month': r.choice(u.months)[:7],
+    })),
+    ('add_waste_data', 2, lambda u, r: form('/add-waste/', {
+        'waste_type': r.choice(['organic', 'plastic']), 'quantity_kg': round(r.uniform(1, 25), 2),
+        'month': r.choice(u.months)[:7],
+    })),
+    ('bulk_data_entry', 3, lambda u, r: form('/bulk-entry/', {
+        'month': r.choice(u.months)[:7], 'electricity_kwh': round(r.uniform(80, 400), 2),
+        'lpg_kg': round(r.uniform(5, 20), 2), 'car_km': round(r.uniform(5, 60), 1),
+        'rice_kg': round(r.uniform(2, 30), 2), 'organic_waste_kg': round(r.uniform(1, 25), 2),
+    })),
+    ('calculate_footprint', 5, lambda u, r: get('/calculate/')),
+    ('calculate_footprint_month', 5, lambda u, r: get(f'/calculate/{r.choice(u.months)[:7]}/')),
+    ('calculate_range', 1, lambda u, r: form('/calculate/range/', {
+        'start': min(u.months)[:7], 'end': max(u.months)[:7],
+    })),
+    ('tips', 5, lambda u, r: get('/tips/', {'q': r.choice(SEARCHES)} if r.random() < 0.5 else None)),
+    ('reports', 5, lambda u, r: get('/reports/')),
+    ('scenarios', 3, lambda u, r: get('/scenarios/')),
+    ('leaderboard', 3, lambda u, r: get('/leaderboard/', {'month': r.choice(u.months)[:7]})),
+    ('analytics', 1, lambda u, r: get('/analytics/')),
+    ('organisations', 2, lambda u, r: get('/organisations/')),
+    ('organisation_dashboard', 3, lambda u, r: get(f'/organisations/{u.organisation}/')),
+    ('api_footprint_data', 10, lambda u, r: get('/api/footprint-data/')),
+    ('api_footprint_stream', 5, lambda u, r: get('/api/footprint-stream/')),
+    ('api_scenarios', 3, lambda u, r: get('/api/scenarios/', {'swap': 'car_petrol:metro'})),
+    ('api_analytics', 1, lambda u, r: get('/api/analytics/')),
+    ('api_meter_readings', 2, meter_day),
+    ('api_trips', 2, trip_batch),
+    ('api_calculate_range', 1, lambda u, r: post_json('/api/calculate/', {
+        'from': min(u.months)[:7], 'to': max(u.months)[:7],
+    })),
+    ('api_load_profile', 3, lambda u, r: get('/api/load-profile/')),
+    ('api_leaderboard', 3, lambda u, r: get('/api/leaderboard/', {'month': r.choice(u.months)[:7]})),
+    ('api_tip_search', 2, lambda u, r: get('/api/tips/search/', {'q': r.choice(SEARCHES)})),
+    ('api_organisation_rollups', 3, lambda u, r: get(f'/api/organisations/{u.organisation}/rollups/')),
+    ('setup_sample_data', 1, lambda u, r: form('/setup-sample-data/', {})),
+]
+
+
+class Session:
+    """One virtual user: a keep-alive connection plus its cookies"""
+
+    def __init__(self, port, username, password, months, organisation):
+        self.port = port
+        self.username = username
+        self.password = password
+        self.months = months
+        self.organisation = organisation
+        self.cookies = {}
+        self.connection = None
+
+    def request(self, method, path, body=None, content_type=None):
+        """Send one request, returning (status, error header)"""
+        headers = {'Host': f'localhost:{self.port}'}
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f'{k}={v}' for k, v in self.cookies.items())
+        if method == 'POST':
+            headers['X-CSRFToken'] = self.cookies.get('csrftoken', '')
+            headers['Content-Type'] = content_type
+        if self.connection is None:
+            self.connection = http.client.HTTPConnection('127.0.0.1', self.port, timeout=60)
+        try:
+            self.connection.request(method, path, body=body, headers=headers)
+            response = self.connection.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            self.connection.close()
+            self.connection = None
+            raise
+        for header in response.headers.get_all('Set-Cookie') or []:
+            for name, morsel in SimpleCookie(header).items():
+                self.cookies[name] = morsel.value
+        if response.will_close:
+            self.connection.close()
+            self.connection = None
+        return response.status, response.headers.get('X-Load-Test-Error')
+
+    def log_in(self):
+        self.request('GET', '/accounts/login/')
+        status, _ = self.request(*form('/accounts/login/', {
+            'username': self.username, 'password': self.password,
+        }))
+        if status != 302 or 'sessionid' not in self.cookies:
+            raise CommandError(f'{self.username} could not log in (HTTP {status})')
+
+
+class Command(BaseCommand):
+    help = (
+        'Start the app on a local threaded server and drive every route with '
+        'concurrent synthetic users, reporting throughput, latency percentiles '
+        'and error rates per route. Writes to the configured database, so it '
+        'refuses to run unless that database has no other users.'
+    )
+
+    PREFIX = 'loadtest'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=8, help='Concurrent virtual users')
+        parser.add_argument('--users', type=int, help='Seeded households (default: --concurrency)')
+        parser.add_argument('--months', type=int, default=12, help='Months of history per household')
+        parser.add_argument('--duration', type=float, default=30, help='Seconds of load')
+        parser.add_argument('--port', type=int, default=0, help='Server port (default: any free port)')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--max-error-rate', type=float, help='Fail if more than this fraction of requests error')
+        parser.add_argument('--keep-data', action='store_true', help='Leave the seeded households in place')
+
+    def handle(self, *args, **options):
+        missing = {p.name for p in urlpatterns} - {name for name, _, _ in ROUTES}
+        if missing:
+            raise CommandError(f"Routes with no load-test scenario: {', '.join(sorted(missing))}")
+
+        if User.objects.exclude(username__startswith=f'{self.PREFIX}-').exists():
+            raise CommandError(
+                'The database has real users. Run the load test against a scratch database, '
+                'e.g. DATABASE_NAME=/tmp/loadtest.sqlite3 (migrated first).'
+            )
+        users = options['users'] or options['concurrency']
+        port = options['port'] or self.free_port()
+        self.clean_up()
+        try:
+            sessions = self.seed(users, options['months'], port)
+            server = subprocess.Popen(
+                [sys.executable, '-c', SERVER_SCRIPT, '127.0.0.1', str(port)],
+                cwd=settings.BASE_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            )
+            try:
+                self.wait_for(server, port)
+                for session in sessions:
+                    session.log_in()
+                results, elapsed = self.run_load(sessions, options)
+            finally:
+                server.terminate()
+                server.wait()
+        finally:
+            if not options['keep_data']:
+                self.clean_up()
+
+        self.report(results, elapsed, options)
+
+    def free_port(self):
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            return sock.getsockname()[1]
+
+    def clean_up(self):
+        Organisation.objects.filter(name=f'{self.PREFIX} organisation').delete()
+        User.objects.filter(username__startswith=f'{self.PREFIX}-').delete()
+
+    def seed(self, count, months, port):
+        """Synthetic households, all managers of one shared organisation.
+
+        They are not staff, so the staff-only analytics routes measure the
+        redirect to the admin login. The password is new for every run.
+        """
+        password = secrets.token_urlsafe(16)
+        households = create_synthetic_households(count, months=months, prefix=self.PREFIX, password=password)
+        organisation = Organisation.objects.create(name=f'{self.PREFIX} organisation', kind='company')
+        organisation.managers.set([h.user_id for h in households])
+        OrganisationMember.objects.bulk_create([
+            OrganisationMember(organisation=organisation, household=h) for h in households
+        ])
+        month_keys = [month.isoformat() for month in month_range(months)]
+        self.stdout.write(f'Seeded {count} households with {months} months of history')
+        return [Session(port, h.user.username, password, month_keys, organisation.pk) for h in households]
+
+    def wait_for(self, server, port, timeout=60):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError(f'Server exited with status {server.returncode}')
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                return
+            except OSError:
+                time.sleep(0.1)
+        raise CommandError(f'Server did not start within {timeout}s')
+
+    def run_load(self, sessions, options):
+        names = [name for name, _, _ in ROUTES]
+        weights = [weight for _, weight, _ in ROUTES]
+        builders = dict((name, builder) for name, _, builder in ROUTES)
+        results = defaultdict(lambda: {'latency': [], 'errors': 0, 'locked': 0, 'messages': set()})
+        lock = threading.Lock()
+        stop = time.monotonic() + options['duration']
+
+        def worker(index):
+            rng = random.Random(options['seed'] * 1000 + index)
+            session = sessions[index % len(sessions)]
+            while time.monotonic() < stop:
+                name = rng.choices(names, weights)[0]
+                request = builders[name](session, rng)
+                start = perf_counter()
+                try:
+                    status, error = session.request(*request)
+                except (OSError, http.client.HTTPException) as exc:
+                    status, error = None, f'{type(exc).__name__}: {exc}'
+                latency = perf_counter() - start
+                with lock:
+                    result = results[name]
+                    result['latency'].append(latency)
+                    if status is None or status >= 400:
+                        result['errors'] += 1
+                        message = error or f'HTTP {status}'
+                        result['locked'] += any(text in message for text in LOCK_ERRORS)
+                        result['messages'].add(message)
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(options['concurrency'])]
+        start = perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results, perf_counter() - start
+
+    def report(self, results, elapsed, options):
+        self.stdout.write(
+            f"{options['concurrency']} concurrent users for {elapsed:.1f}s\n"
+            f"{'route':<28}{'requests':>9}{'req/s':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+            f"{'errors':>8}{'locked':>8}"
+        )
+        rows = [(name, results[name]) for name, _, _ in ROUTES if name in results]
+        every = {
+            'latency': [t for _, r in rows for t in r['latency']],
+            'errors': sum(r['errors'] for _, r in rows),
+            'locked': sum(r['locked'] for _, r in rows),
+        }
+        for name, result in rows + [('total', every)]:
+            count = len(result['latency'])
+            p50, p95, p99 = np.percentile(result['latency'], [50, 95, 99]) * 1000
+            self.stdout.write(
+                f'{name:<28}{count:>9}{count / elapsed:>8.1f}{p50:>9.1f}{p95:>9.1f}{p99:>9.1f}'
+                f"{result['errors'] / count:>8.1%}{result['locked']:>8}"
+            )
+        for name, result in rows:
+            for message in sorted(result['messages'])[:3]:
+                self.stdout.write(self.style.WARNING(f'{name}: {message}'))
+
+        broken = [name for name, result in rows if result['errors'] == len(result['latency'])]
+        if broken:
+            raise CommandError(f"Every request failed on: {', '.join(broken)}")
+        total = len(every['latency'])
+        rate = every['errors'] / total if total else 0
+        if options['max_error_rate'] is not None and rate > options['max_error_rate']:
+            raise CommandError(f"Error rate {rate:.1%} exceeds {options['max_error_rate']:.1%}")
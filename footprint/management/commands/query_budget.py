@@ -0,0 +1,167 @@
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.template import TemplateDoesNotExist
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from footprint.models import (
+    FootprintForecast, Organisation, OrganisationMember, SustainabilityTip
+)
+from footprint.rollups import rebuild_rollups
+from footprint.sharding import sharding_enabled
+from footprint.synthetic import create_synthetic_households
+from footprint.utils import create_sample_tips
+
+
+# Most SQL statements each page may run on a cold cache. The seeded data
+# has many rows per table, so a per-row query pushes a page far over.
+BUDGETS = {
+    # Includes reading the tips table version for the tip cards' cache key
+    'dashboard': 8,
+    # Includes the organisation rollup update, the grid factor table version,
+    # publishing the footprint to open dashboards (and, once a minute per
+    # process, deleting expired events) and moving its leaderboard entries
+    # (up to five statements when its bucket changes)
+    'calculate_footprint': 24,
+    'calculate_footprint_month': 24,
+    # Twelve months: the same fixed queries plus one rollup UPDATE per month
+    'calculate_range (POST)': 37,
+    'reports': 4,
+    'tips': 3,
+    # Title matches, then the description matches when those fall short
+    'tips (search)': 4,
+    'api_tip_search': 5,
+    'api_footprint_data': 4,
+    'api_footprint_stream': 4,
+    # The household's entry, tree nodes, bucket count and top list, per leaderboard
+    'leaderboard': 12,
+    'api_leaderboard': 12,
+    'bulk_data_entry': 3,
+    # Includes reading the rows a resubmission replaces, one query per
+    # activity, inside the transaction that writes them
+    'bulk_data_entry (POST)': 16,
+}
+
+# Budget for every admin changelist (session, user, count, page and filters)
+ADMIN_BUDGET = 8
+
+
+class Command(BaseCommand):
+    help = (
+        'Check that each view, API endpoint and admin changelist renders and '
+        'stays within a fixed SQL query budget against seeded data (rolled '
+        'back afterwards)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--households', type=int, default=5)
+        parser.add_argument('--months', type=int, default=12)
+        parser.add_argument('--verbose-queries', action='store_true', help='Print the SQL of every page, not only failures')
+
+    def handle(self, *args, **options):
+        # Production settings: no debug query log or technical error pages,
+        # whose rendering would run queries of its own
+        with transaction.atomic(), override_settings(DEBUG=False, ALLOWED_HOSTS=['localhost']):
+            self.seed(options)
+            failures = self.check_pages(options)
+            transaction.set_rollback(True)
+
+        if failures:
+            raise CommandError(f"{len(failures)} pages failed or over budget: {', '.join(failures)}")
+        self.stdout.write(self.style.SUCCESS('All pages within their query budgets'))
+
+    def seed(self, options):
+        if sharding_enabled():
+            # The seeded rows are rolled back and queries counted on the
+            # default database only
+            raise CommandError('Run this against an unsharded database (unset DATABASE_SHARDS)')
+        households = create_synthetic_households(
+            options['households'], months=options['months'], prefix='budget'
+        )
+        self.household = households[0]
+        for tip in create_sample_tips():
+            SustainabilityTip.objects.get_or_create(title=tip['title'], defaults=tip)
+        months = [f.month for f in self.household.carbonfootprint_set.all()]
+        self.month = months[-1].strftime('%Y-%m')
+        FootprintForecast.objects.bulk_create([
+            FootprintForecast(
+                household=household, month=month.replace(year=month.year + 2),
+                total_footprint=1, energy_footprint=1, transport_footprint=0,
+                diet_footprint=0, waste_footprint=0,
+            )
+            for household in households for month in months[:6]
+        ])
+        parent = Organisation.objects.create(name='budget parent', kind='company')
+        for i, household in enumerate(households):
+            organisation = Organisation.objects.create(name=f'budget {i}', kind='society', parent=parent)
+            OrganisationMember.objects.create(organisation=organisation, household=household)
+        rebuild_rollups()
+        self.admin = User.objects.create_superuser('budget-admin', 'budget@example.com', 'budget-pass')
+
+    def pages(self):
+        """(label, budget, user, method, path, data) for every checked page"""
+        user = self.household.user
+        yield 'dashboard', BUDGETS['dashboard'], user, 'get', reverse('dashboard'), None
+        yield 'calculate_footprint', BUDGETS['calculate_footprint'], user, 'get', reverse('calculate_footprint'), None
+        yield (
+            'calculate_footprint_month', BUDGETS['calculate_footprint_month'], user, 'get',
+            reverse('calculate_footprint_month', args=[self.month]), None,
+        )
+        yield 'reports', BUDGETS['reports'], user, 'get', reverse('reports'), None
+        yield 'tips', BUDGETS['tips'], user, 'get', reverse('tips'), None
+        yield 'tips (search)', BUDGETS['tips (search)'], user, 'get', reverse('tips') + '?q=solar', None
+        yield 'api_tip_search', BUDGETS['api_tip_search'], user, 'get', reverse('api_tip_search') + '?q=bus', None
+        yield 'api_footprint_data', BUDGETS['api_footprint_data'], user, 'get', reverse('api_footprint_data'), None
+        yield 'api_footprint_stream', BUDGETS['api_footprint_stream'], user, 'get', reverse('api_footprint_stream'), None
+        yield 'leaderboard', BUDGETS['leaderboard'], user, 'get', reverse('leaderboard'), None
+        yield 'api_leaderboard', BUDGETS['api_leaderboard'], user, 'get', reverse('api_leaderboard'), None
+        yield 'bulk_data_entry', BUDGETS['bulk_data_entry'], user, 'get', reverse('bulk_data_entry'), None
+        yield 'bulk_data_entry (POST)', BUDGETS['bulk_data_entry (POST)'], user, 'post', reverse('bulk_data_entry'), {
+            'month': self.month, 'electricity_kwh': '250', 'lpg_kg': '14', 'car_km': '40',
+            'bus_km': '20', 'rice_kg': '10', 'milk_kg': '12', 'organic_waste_kg': '15',
+        }
+        start = self.household.carbonfootprint_set.earliest('month').month.strftime('%Y-%m')
+        yield (
+            'calculate_range (POST)', BUDGETS['calculate_range (POST)'], user, 'post', reverse('calculate_range'),
+            {'start': start, 'end': self.month},
+        )
+        for model in admin.site._registry:
+            opts = model._meta
+            yield (
+                f'admin {opts.app_label}.{opts.model_name}', ADMIN_BUDGET, self.admin, 'get',
+                reverse(f'admin:{opts.app_label}_{opts.model_name}_changelist'), None,
+            )
+
+    def check_pages(self, options):
+        failures = []
+        self.stdout.write(f"{'page':<44}{'queries':>8}{'budget':>8}")
+        for label, budget, user, method, path, data in self.pages():
+            client = Client(HTTP_HOST='localhost')
+            client.force_login(user)
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                try:
+                    response = getattr(client, method)(path, data)
+                    status = response.status_code
+                except TemplateDoesNotExist as exc:
+                    status = f'no template {exc}'
+            count = len(queries)
+            over = count > budget
+            line = f'{label:<44}{count:>8}{budget:>8}'
+            if over:
+                failures.append(label)
+                self.stdout.write(self.style.ERROR(f'{line}  OVER BUDGET'))
+            elif not isinstance(status, int) or status >= 400:
+                # An error page runs fewer queries than the real one
+                failures.append(label)
+                self.stdout.write(self.style.ERROR(f'{line}  {status}'))
+            else:
+                self.stdout.write(line)
+            if over or options['verbose_queries']:
+                for query in queries.captured_queries:
+                    self.stdout.write(f"    {query['sql']}")
+        return failures
@@ -0,0 +1,10 @@
+from footprint.leaderboards import rebuild_leaderboards
+from footprint.management.base import UncheckedCommand
+
+
+class Command(UncheckedCommand):
+    help = 'Recompute city and state leaderboards from stored footprints (after bulk imports or restores)'
+
+    def handle(self, *args, **options):
+        written = rebuild_leaderboards()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt leaderboards with {written} entries'))
@@ -0,0 +1,10 @@
+from footprint.management.base import UncheckedCommand
+from footprint.rollups import rebuild_rollups
+
+
+class Command(UncheckedCommand):
+    help = 'Recompute organisation rollups from stored footprints (after bulk imports or restores)'
+
+    def handle(self, *args, **options):
+        written = rebuild_rollups()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {written} organisation rollups'))
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import CommandError
+
+from footprint.management.base import UncheckedCommand
+from footprint.replica import refresh_replica, replica_configured
+
+
+class Command(UncheckedCommand):
+    help = 'Copy the primary database into the read replica (DATABASE_REPLICA) with the SQLite backup API'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=float,
+            help='Keep refreshing every INTERVAL seconds instead of copying once'
+        )
+
+    def handle(self, *args, **options):
+        if not replica_configured():
+            raise CommandError('No replica configured; set DATABASE_REPLICA to the copy\'s path')
+        while True:
+            start = time.monotonic()
+            target = refresh_replica()
+            self.stdout.write(f'Refreshed {target} in {time.monotonic() - start:.2f}s')
+            if not options['interval']:
+                break
+            time.sleep(max(options['interval'] - (time.monotonic() - start), 0))
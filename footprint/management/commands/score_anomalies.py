@@ -0,0 +1,25 @@
+from footprint.anomalies import rebuild_sketches, rescore_history
+from footprint.management.base import UncheckedCommand
+
+
+class Command(UncheckedCommand):
+    help = 'Re-score stored activity data for outliers such as mistyped readings'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild', action='store_true',
+            help='Rebuild the robust statistics from the full history first'
+        )
+
+    def handle(self, *args, **options):
+        # Both steps read every shard in parallel, each in its own transaction
+        sketches = None
+        if options['rebuild']:
+            self.stdout.write('Rebuilding sketches from history...')
+            sketches = rebuild_sketches()
+            self.stdout.write(f'Built {len(sketches)} sketches')
+        flagged = rescore_history(sketches)
+
+        for activity, count in flagged.items():
+            self.stdout.write(f'{activity}: {count} rows flagged')
+        self.stdout.write(self.style.SUCCESS('Anomaly scores updated successfully!'))
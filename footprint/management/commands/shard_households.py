@@ -0,0 +1,79 @@
+import os
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from footprint.management.base import UncheckedCommand
+from footprint.models import (
+    ActivityArchive, CarbonFootprint, Diet, EnergyUsage, FootprintEvent, Household, HouseholdDirectory,
+    Transportation, Waste
+)
+from footprint.sharding import shard_aliases, shard_for, sharding_enabled
+
+
+# Copied parents first, so foreign keys hold on the shard
+MOVED_MODELS = [
+    Household, EnergyUsage, Transportation, Diet, Waste, ActivityArchive, CarbonFootprint, FootprintEvent,
+]
+
+
+class Command(UncheckedCommand):
+    help = (
+        'Create or migrate the shard databases (DATABASE_SHARDS) and move households '
+        'still on the default database, with their activity and footprint rows, to their shard'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Households per transaction')
+
+    def handle(self, *args, **options):
+        if not sharding_enabled():
+            raise CommandError('Sharding is off; set DATABASE_SHARDS to the number of shards')
+        os.makedirs(settings.DATABASE_SHARD_DIR, exist_ok=True)
+        for alias in shard_aliases():
+            self.stdout.write(f'Migrating {alias}...')
+            call_command('migrate', database=alias, verbosity=0, interactive=False)
+
+        household_ids = list(
+            Household.objects.using(DEFAULT_DB_ALIAS).order_by('id').values_list('id', flat=True)
+        )
+        moved = defaultdict(int)
+        for i in range(0, len(household_ids), options['batch_size']):
+            by_shard = defaultdict(list)
+            for household_id in household_ids[i:i + options['batch_size']]:
+                by_shard[shard_for(household_id)].append(household_id)
+            for alias, batch in by_shard.items():
+                self.move(batch, alias)
+                moved[alias] += len(batch)
+
+        for alias in shard_aliases():
+            self.stdout.write(f'{alias}: {moved[alias]} households moved')
+        self.stdout.write(self.style.SUCCESS(f'Moved {len(household_ids)} households to {len(shard_aliases())} shards'))
+
+    def move(self, household_ids, alias):
+        """Copy households and their rows to ``alias`` and remove them from the default database.
+
+        Copies keep their primary keys and skip rows already on the shard,
+        so an interrupted run can simply be repeated.
+        """
+        def rows(model):
+            field = 'pk__in' if model is Household else 'household_id__in'
+            return model.objects.using(DEFAULT_DB_ALIAS).filter(**{field: household_ids})
+
+        with transaction.atomic(), transaction.atomic(using=alias):
+            HouseholdDirectory.objects.bulk_create(
+                [
+                    HouseholdDirectory(pk=pk, user_id=user_id)
+                    for pk, user_id in rows(Household).values_list('pk', 'user_id')
+                ],
+                ignore_conflicts=True,
+            )
+            for model in MOVED_MODELS:
+                model.objects.using(alias).bulk_create(list(rows(model)), batch_size=1000, ignore_conflicts=True)
+            for model in reversed(MOVED_MODELS):
+                # A plain DELETE: the ORM cascade would also remove the meter,
+                # trip and membership rows that stay on the default database
+                rows(model)._raw_delete(DEFAULT_DB_ALIAS)
@@ -0,0 +1,195 @@
+from collections import defaultdict
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import numpy as np
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import EnergyUsage, MeterDay, MeterMonth
+from .sharding import household_db
+from .units import first_of_month
+from .utils import upsert_activities
+
+
+SLOT_MINUTES = 15
+SLOTS = 24 * 60 // SLOT_MINUTES
+
+# Largest batch accepted in one request (about a month for three meters)
+MAX_READINGS = 10000
+
+# Upper bound for one 15-minute reading; anything above is a meter fault
+MAX_SLOT_KWH = 25.0
+
+
+class MeterError(ValueError):
+    """A batch of meter readings could not be accepted"""
+
+
+def pack_day(values):
+    return np.asarray(values, dtype='<f4').tobytes()
+
+
+def unpack_day(blob):
+    """96 float32 kWh values for a day, NaN where no reading arrived"""
+    if not blob:
+        return np.full(SLOTS, np.nan, dtype='<f4')
+    return np.frombuffer(bytes(blob), dtype='<f4').copy()
+
+
+def unpack_month(meter_month):
+    """(kWh sums, day counts) per slot for a MeterMonth, zeros when new"""
+    if not meter_month.slot_kwh:
+        return np.zeros(SLOTS), np.zeros(SLOTS, dtype='<i4')
+    return (
+        np.frombuffer(bytes(meter_month.slot_kwh), dtype='<f8').copy(),
+        np.frombuffer(bytes(meter_month.slot_days), dtype='<i4').copy(),
+    )
+
+
+def parse_readings(readings):
+    """Group raw readings into {local day: {slot: kWh}}.
+
+    Each reading is ``{"timestamp": ISO 8601, "kwh": number}`` where the
+    timestamp is the start of the 15-minute interval; naive timestamps are
+    taken as local time. A later reading for the same slot wins.
+    """
+    if not isinstance(readings, list) or not readings:
+        raise MeterError('readings must be a non-empty list.')
+    if len(readings) > MAX_READINGS:
+        raise MeterError(f'At most {MAX_READINGS} readings per request.')
+
+    days = defaultdict(dict)
+    for i, reading in enumerate(readings):
+        try:
+            moment = parse_datetime(reading['timestamp'])
+            kwh = float(reading['kwh'])
+        except (KeyError, TypeError, ValueError):
+            moment = None
+        if moment is None:
+            raise MeterError(f'Reading {i} needs an ISO 8601 timestamp and a numeric kwh.')
+        if not 0 <= kwh <= MAX_SLOT_KWH:
+            raise MeterError(f'Reading {i}: kwh must be between 0 and {MAX_SLOT_KWH}.')
+        if timezone.is_naive(moment):
+            moment = timezone.make_aware(moment)
+        local = timezone.localtime(moment)
+        days[local.date()][(local.hour * 60 + local.minute) // SLOT_MINUTES] = kwh
+    return days
+
+
+def ingest_readings(household, readings):
+    """Store a batch of 15-minute readings and roll them up.
+
+    Each affected household-day is rewritten as a fixed 384-byte array; the
+    change per slot is added to the month's time-of-day sums, and the
+    month's EnergyUsage electricity row is set from those sums, so the cost
+    depends on the days touched, not on the history held.
+
+    Months whose electricity usage was entered by hand keep it: they are
+    returned in ``manual_months`` instead. Only closed months are scored
+    for anomalies; the current month's total is still growing and would
+    teach the sketches a low outlier on every upload.
+    """
+    days = parse_readings(readings)
+    months = sorted({first_of_month(day) for day in days})
+
+    with transaction.atomic():
+        # Create the month rows first: the write takes the database lock
+        # before anything is read, so concurrent batches serialise.
+        MeterMonth.objects.bulk_create(
+            [MeterMonth(household=household, month=month) for month in months],
+            ignore_conflicts=True,
+        )
+        month_rows = {
+            m.month: m for m in
+            MeterMonth.objects.select_for_update().filter(household=household, month__in=months)
+        }
+        stored = {
+            d.day: d for d in MeterDay.objects.filter(household=household, day__in=list(days))
+        }
+
+        profiles = {month: unpack_month(row) for month, row in month_rows.items()}
+        day_rows = []
+        for day, slots in days.items():
+            old = unpack_day(stored[day].readings) if day in stored else unpack_day(None)
+            new = old.copy()
+            new[list(slots)] = list(slots.values())
+            sums, counts = profiles[first_of_month(day)]
+            sums += np.nan_to_num(new).astype('<f8') - np.nan_to_num(old)
+            counts += ~np.isnan(new) & np.isnan(old)
+            day_rows.append(MeterDay(
+                household=household, day=day, readings=pack_day(new),
+                kwh=Decimal(str(round(float(np.nansum(new)), 3))),
+            ))
+
+        MeterDay.objects.bulk_create(
+            day_rows,
+            update_conflicts=True,
+            unique_fields=['household', 'day'],
+            update_fields=['readings', 'kwh', 'updated_at'],
+        )
+        for month, row in month_rows.items():
+            sums, counts = profiles[month]
+            row.slot_kwh = sums.tobytes()
+            row.slot_days = counts.tobytes()
+            row.updated_at = timezone.now()
+        MeterMonth.objects.bulk_update(list(month_rows.values()), ['slot_kwh', 'slot_days', 'updated_at'])
+
+        manual = set(
+            EnergyUsage.objects.using(household_db(household.id))
+            .filter(household=household, fuel_type='electricity', month__in=months, source='manual')
+            .values_list('month', flat=True)
+        )
+        usage = [
+            EnergyUsage(
+                fuel_type='electricity', unit='kWh', month=month, source='meter',
+                consumption=Decimal(str(round(float(profiles[month][0].sum()), 2))),
+            )
+            for month in months if month not in manual
+        ]
+        current = first_of_month(timezone.localdate())
+        closed = [row for row in usage if row.month < current]
+        open_months = [row for row in usage if row.month >= current]
+        if closed:
+            upsert_activities(household, closed)
+        if open_months:
+            upsert_activities(household, open_months, score=False)
+
+    return {
+        'readings': len(readings),
+        'days': len(days),
+        'months': [month.isoformat() for month in months],
+        'manual_months': [month.isoformat() for month in sorted(manual)],
+    }
+
+
+def load_profile(household, start=None, end=None):
+    """Average kWh per 15-minute slot over the stored months in [start, end].
+
+    Reads one packed row per month rather than every day's readings.
+    """
+    rows = MeterMonth.objects.filter(household=household)
+    if start:
+        rows = rows.filter(month__gte=first_of_month(start))
+    if end:
+        rows = rows.filter(month__lte=first_of_month(end))
+
+    sums, counts = np.zeros(SLOTS), np.zeros(SLOTS, dtype='<i8')
+    months = 0
+    for row in rows.only('slot_kwh', 'slot_days'):
+        row_sums, row_counts = unpack_month(row)
+        sums += row_sums
+        counts += row_counts
+        months += 1
+
+    average = np.divide(sums, counts, out=np.zeros(SLOTS), where=counts > 0)
+    midnight = datetime(2000, 1, 1)
+    return {
+        'months': months,
+        'slots': [
+            (midnight + timedelta(minutes=i * SLOT_MINUTES)).strftime('%H:%M') for i in range(SLOTS)
+        ],
+        'average_kwh': average.round(4).tolist(),
+        'days': counts.tolist(),
+    }
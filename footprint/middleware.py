@@ -0,0 +1,84 @@
+from functools import wraps
+
+from django.conf import settings
+from django.http import Http404
+from django.utils.functional import SimpleLazyObject
+
+from .caching import cached_household
+from .replica import STICKY_COOKIE, replica_configured, track_writes
+from .sharding import shard_for, sharding_enabled, use_shard
+
+
+def get_household(request):
+    """The logged-in user's household or None, looked up at most once per request"""
+    if not hasattr(request, '_cached_household'):
+        user = request.user
+        request._cached_household = cached_household(user) if user.is_authenticated else None
+    return request._cached_household
+
+
+def get_household_or_404(request):
+    household = get_household(request)
+    if household is None:
+        raise Http404('No household has been set up for this user.')
+    return household
+
+
+def request_shard(request):
+    """Shard holding the request's household, or None"""
+    household = get_household(request)
+    return shard_for(household.pk) if household is not None else None
+
+
+def household_shard(view):
+    """Send the view's queries on household-owned rows to the user's household shard.
+
+    Only views that work on the logged-in household use this; elsewhere
+    (the admin, organisation pages) such queries name their database.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not sharding_enabled():
+            return view(request, *args, **kwargs)
+        with use_shard(lambda: request_shard(request)):
+            return view(request, *args, **kwargs)
+    return wrapper
+
+
+class HouseholdMiddleware:
+    """Attach ``request.household``, resolved lazily on first access.
+
+    Must come after AuthenticationMiddleware. The value is falsy when the
+    user is anonymous or has not set up a household yet.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.household = SimpleLazyObject(lambda: get_household(request))
+        return self.get_response(request)
+
+
+class ReadReplicaMiddleware:
+    """Keep a client's reads on the primary for a while after it writes.
+
+    Any request that writes sets a short-lived cookie that ``replica_reads``
+    views honour, so users see their own changes before the replica is
+    refreshed. Does nothing unless a ``replica`` database is configured.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not replica_configured():
+            return self.get_response(request)
+        wrote = track_writes()
+        response = self.get_response(request)
+        if wrote():
+            response.set_cookie(
+                STICKY_COOKIE, '1', max_age=settings.READ_REPLICA_STICKY_SECONDS,
+                httponly=True, samesite='Lax',
+            )
+        return response
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.7 on 2026-10-18 22:57
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('footprint', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FootprintForecast',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_footprint', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('energy_footprint', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('transport_footprint', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('diet_footprint', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('waste_footprint', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('month', models.DateField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('household', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='footprint.household')),
+            ],
+            options={
+                'unique_together': {('household', 'month')},
+            },
+        ),
+    ]
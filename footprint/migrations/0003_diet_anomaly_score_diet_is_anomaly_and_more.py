@@ -0,0 +1,68 @@
+# Generated by Django 4.2.7 on 2026-10-18 22:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('footprint', '0002_footprintforecast'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='diet',
+            name='anomaly_score',
+            field=models.FloatField(blank=True, help_text='Robust z-score against similar households', null=True),
+        ),
+        migrations.AddField(
+            model_name='diet',
+            name='is_anomaly',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='energyusage',
+            name='anomaly_score',
+            field=models.FloatField(blank=True, help_text='Robust z-score against similar households', null=True),
+        ),
+        migrations.AddField(
+            model_name='energyusage',
+            name='is_anomaly',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='transportation',
+            name='anomaly_score',
+            field=models.FloatField(blank=True, help_text='Robust z-score against similar households', null=True),
+        ),
+        migrations.AddField(
+            model_name='transportation',
+            name='is_anomaly',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='waste',
+            name='anomaly_score',
+            field=models.FloatField(blank=True, help_text='Robust z-score against similar households', null=True),
+        ),
+        migrations.AddField(
+            model_name='waste',
+            name='is_anomaly',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.CreateModel(
+            name='ActivitySketch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('activity', models.CharField(max_length=20)),
+                ('item_type', models.CharField(max_length=20)),
+                ('state', models.CharField(blank=True, max_length=50)),
+                ('counts', models.JSONField(default=list)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'unique_together': {('activity', 'item_type', 'state')},
+            },
+        ),
+    ]
@@ -0,0 +1,121 @@
+# Generated by Django 4.2.7 on 2026-10-18 23:00
+
+from decimal import Decimal
+
+from django.db import migrations
+from django.db.models import Count, Max
+
+
+ACTIVITY_TYPE_FIELDS = {
+    'EnergyUsage': 'fuel_type',
+    'Transportation': 'vehicle_type',
+    'Diet': 'food_type',
+    'Waste': 'waste_type',
+}
+
+# Frozen copy of how CarbonCalculator worked at the time of this migration:
+# the footprint field of each activity, its monthly quantity and factors
+FOOTPRINT_FIELDS = {
+    'EnergyUsage': 'energy_footprint',
+    'Transportation': 'transport_footprint',
+    'Diet': 'diet_footprint',
+    'Waste': 'waste_footprint',
+}
+MONTHLY_QUANTITY = {
+    'EnergyUsage': lambda row: row.consumption,
+    'Transportation': lambda row: row.distance_km * row.frequency_per_week * Decimal('4.33'),
+    'Diet': lambda row: row.consumption_kg,
+    'Waste': lambda row: row.quantity_kg,
+}
+EMISSION_FACTORS = {
+    'EnergyUsage': {
+        'electricity': 0.82, 'lpg': 2.31, 'kerosene': 2.53, 'biogas': 0.5, 'firewood': 1.5, 'charcoal': 2.93,
+    },
+    'Transportation': {
+        'car_petrol': 0.2, 'car_diesel': 0.18, 'car_cng': 0.12, 'car_electric': 0.05, 'bike_petrol': 0.08,
+        'bike_electric': 0.02, 'bus': 0.04, 'train': 0.02, 'metro': 0.015, 'auto': 0.06, 'cycle': 0, 'walk': 0,
+    },
+    'Diet': {
+        'rice': 2.5, 'wheat': 1.4, 'pulses': 0.9, 'vegetables': 0.4, 'fruits': 0.3, 'milk': 1.4, 'eggs': 4.8,
+        'chicken': 6.9, 'mutton': 24.0, 'fish': 3.0, 'processed_food': 2.0,
+    },
+    'Waste': {
+        'organic': 0.5, 'plastic': 2.7, 'paper': 0.8, 'glass': 0.3, 'metal': 1.2, 'electronic': 4.5,
+    },
+}
+
+
+def remove_duplicate_activities(apps, schema_editor):
+    """Keep the latest row per household, month and type (a resubmitted form).
+
+    Footprints already calculated for those months counted every duplicate,
+    so they are recalculated from the rows that remain.
+    """
+    db_alias = schema_editor.connection.alias
+    affected = set()
+    for model_name, type_field in ACTIVITY_TYPE_FIELDS.items():
+        model = apps.get_model('footprint', model_name)
+        duplicates = (
+            model.objects.using(db_alias)
+            .values('household_id', 'month', type_field)
+            .annotate(keep=Max('id'), rows=Count('id'))
+            .filter(rows__gt=1)
+        )
+        for group in duplicates.iterator():
+            model.objects.using(db_alias).filter(
+                household_id=group['household_id'],
+                month=group['month'],
+                **{type_field: group[type_field]}
+            ).exclude(id=group['keep']).delete()
+            affected.add((group['household_id'], group['month']))
+    recalculate_footprints(apps, db_alias, affected)
+
+
+def recalculate_footprints(apps, db_alias, months):
+    """Recalculate the stored footprints of (household id, month) pairs"""
+    CarbonFootprint = apps.get_model('footprint', 'CarbonFootprint')
+    for household_id, month in months:
+        footprint = CarbonFootprint.objects.using(db_alias).filter(household_id=household_id, month=month).first()
+        if footprint is None:
+            continue
+        footprint.total_footprint = Decimal('0.0')
+        for model_name, type_field in ACTIVITY_TYPE_FIELDS.items():
+            model = apps.get_model('footprint', model_name)
+            factors = EMISSION_FACTORS[model_name]
+            part = sum(
+                (
+                    MONTHLY_QUANTITY[model_name](row) * Decimal(str(factors.get(getattr(row, type_field), 0)))
+                    for row in model.objects.using(db_alias).filter(household_id=household_id, month=month)
+                ),
+                Decimal('0.0'),
+            )
+            setattr(footprint, FOOTPRINT_FIELDS[model_name], part)
+            footprint.total_footprint += part
+        footprint.save()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('footprint', '0003_diet_anomaly_score_diet_is_anomaly_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_activities, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='diet',
+            unique_together={('household', 'month', 'food_type')},
+        ),
+        migrations.AlterUniqueTogether(
+            name='energyusage',
+            unique_together={('household', 'month', 'fuel_type')},
+        ),
+        migrations.AlterUniqueTogether(
+            name='transportation',
+            unique_together={('household', 'month', 'vehicle_type')},
+        ),
+        migrations.AlterUniqueTogether(
+            name='waste',
+            unique_together={('household', 'month', 'waste_type')},
+        ),
+    ]
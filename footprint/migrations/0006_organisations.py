@@ -0,0 +1,66 @@
+# Generated by Django 4.2.7 on 2026-10-18 23:06
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('footprint', '0005_activityarchive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Organisation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200)),
+                ('kind', models.CharField(choices=[('society', 'Housing Society'), ('campus', 'Campus'), ('company', 'Company'), ('other', 'Other')], default='other', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('managers', models.ManyToManyField(blank=True, related_name='managed_organisations', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='OrganisationMember',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('joined_at', models.DateTimeField(auto_now_add=True)),
+                ('household', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='footprint.household')),
+                ('organisation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='footprint.organisation')),
+            ],
+            options={
+                'unique_together': {('organisation', 'household')},
+            },
+        ),
+        migrations.AddField(
+            model_name='organisation',
+            name='members',
+            field=models.ManyToManyField(related_name='organisations', through='footprint.OrganisationMember', to='footprint.household'),
+        ),
+        migrations.AddField(
+            model_name='organisation',
+            name='parent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='children', to='footprint.organisation'),
+        ),
+        migrations.CreateModel(
+            name='OrganisationRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('household_count', models.IntegerField(default=0)),
+                ('total_footprint', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('energy_footprint', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('transport_footprint', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('diet_footprint', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('waste_footprint', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('organisation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rollups', to='footprint.organisation')),
+            ],
+            options={
+                'unique_together': {('organisation', 'month')},
+            },
+        ),
+    ]
@@ -0,0 +1,88 @@
+# Generated by Django 4.2.7 on 2026-10-19 05:10
+
+from decimal import Decimal
+
+from django.db import migrations
+
+
+ACTIVITY_TYPE_FIELDS = {
+    'EnergyUsage': 'fuel_type',
+    'Transportation': 'vehicle_type',
+    'Diet': 'food_type',
+    'Waste': 'waste_type',
+}
+
+# Frozen copy of footprint.units at the time of this migration
+CANONICAL_UNITS = {
+    'electricity': 'kWh',
+    'lpg': 'kg',
+    'kerosene': 'liter',
+    'biogas': 'm3',
+    'firewood': 'kg',
+    'charcoal': 'kg',
+}
+ENERGY = {'kwh': 1, 'unit': 1, 'units': 1, 'wh': '0.001', 'mwh': 1000}
+MASS = {'kg': 1, 'kgs': 1, 'g': '0.001', 'gram': '0.001', 'quintal': 100, 'tonne': 1000, 't': 1000}
+LIQUID = {'liter': 1, 'litre': 1, 'l': 1, 'ml': '0.001'}
+GAS = {'m3': 1, 'cubicmeter': 1, 'cubicmetre': 1, 'cum': 1}
+CONVERSIONS = {
+    'electricity': ENERGY,
+    'lpg': {**MASS, 'cylinder': '14.2', 'cylinders': '14.2'},
+    'kerosene': LIQUID,
+    'biogas': GAS,
+    'firewood': MASS,
+    'charcoal': MASS,
+}
+
+
+def truncate_months(apps, schema_editor):
+    """Move every activity row to the first of its month.
+
+    When that collides with a row already on day 1, the latest entered row
+    is kept, as in 0004.
+    """
+    db_alias = schema_editor.connection.alias
+    for model_name, type_field in ACTIVITY_TYPE_FIELDS.items():
+        model = apps.get_model('footprint', model_name)
+        for row in model.objects.using(db_alias).exclude(month__day=1).order_by('id').iterator():
+            target = row.month.replace(day=1)
+            clashes = model.objects.using(db_alias).filter(
+                household_id=row.household_id, month=target,
+                **{type_field: getattr(row, type_field)}
+            )
+            if clashes.filter(id__gt=row.id).exists():
+                row.delete()
+                continue
+            clashes.delete()
+            row.month = target
+            row.save(update_fields=['month'])
+
+
+def convert_energy_units(apps, schema_editor):
+    """Convert energy quantities to each fuel's canonical unit.
+
+    Rows in units the table does not know are left alone; calculations
+    have always read them as canonical.
+    """
+    EnergyUsage = apps.get_model('footprint', 'EnergyUsage')
+    for row in EnergyUsage.objects.using(schema_editor.connection.alias).iterator():
+        canonical = CANONICAL_UNITS.get(row.fuel_type)
+        key = (row.unit or '').strip().lower().replace(' ', '').replace('.', '').replace('³', '3')
+        factor = CONVERSIONS.get(row.fuel_type, {}).get(key) if key else 1
+        if canonical is None or factor is None or row.unit == canonical:
+            continue
+        row.consumption = (row.consumption * Decimal(str(factor))).quantize(Decimal('0.01'))
+        row.unit = canonical
+        row.save(update_fields=['consumption', 'unit'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('footprint', '0006_organisations'),
+    ]
+
+    operations = [
+        migrations.RunPython(truncate_months, migrations.RunPython.noop),
+        migrations.RunPython(convert_energy_units, migrations.RunPython.noop),
+    ]
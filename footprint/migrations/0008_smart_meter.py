@@ -0,0 +1,42 @@
+# Generated by Django 4.2.7 on 2026-10-18 23:16
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('footprint', '0007_normalise_activity_units_and_months'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MeterMonth',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('slot_kwh', models.BinaryField()),
+                ('slot_days', models.BinaryField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('household', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='footprint.household')),
+            ],
+            options={
+                'unique_together': {('household', 'month')},
+            },
+        ),
+        migrations.CreateModel(
+            name='MeterDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('readings', models.BinaryField()),
+                ('kwh', models.DecimalField(decimal_places=3, default=0, max_digits=10)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('household', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='footprint.household')),
+            ],
+            options={
+                'unique_together': {('household', 'day')},
+            },
+        ),
+    ]
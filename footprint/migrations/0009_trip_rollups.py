@@ -0,0 +1,42 @@
+# Generated by Django 4.2.7 on 2026-10-18 23:18
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('footprint', '0008_smart_meter'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TripMonth',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('vehicle_type', models.CharField(choices=[('car_petrol', 'Car (Petrol)'), ('car_diesel', 'Car (Diesel)'), ('car_cng', 'Car (CNG)'), ('car_electric', 'Car (Electric)'), ('bike_petrol', 'Bike (Petrol)'), ('bike_electric', 'Bike (Electric)'), ('bus', 'Bus'), ('train', 'Train'), ('metro', 'Metro'), ('auto', 'Auto Rickshaw'), ('cycle', 'Cycle'), ('walk', 'Walking')], max_length=20)),
+                ('distance_km', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('trips', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('household', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='footprint.household')),
+            ],
+            options={
+                'unique_together': {('household', 'month', 'vehicle_type')},
+            },
+        ),
+        migrations.CreateModel(
+            name='TripBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('batch_id', models.CharField(max_length=64)),
+                ('trips', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('household', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='footprint.household')),
+            ],
+            options={
+                'unique_together': {('household', 'batch_id')},
+            },
+        ),
+    ]
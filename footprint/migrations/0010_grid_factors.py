@@ -0,0 +1,29 @@
+# Generated by Django 4.2.7 on 2026-10-18 23:19
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('footprint', '0009_trip_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GridFactor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('state', models.CharField(max_length=50)),
+                ('month', models.DateField()),
+                ('factor', models.DecimalField(decimal_places=4, max_digits=6, validators=[django.core.validators.MinValueValidator(0)])),
+                ('source', models.CharField(blank=True, max_length=200)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['state', 'month'],
+                'unique_together': {('state', 'month')},
+            },
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 4.2.7 on 2026-10-18 23:36
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('footprint', '0010_grid_factors'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='footprintforecast',
+            name='household',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, to='footprint.household'),
+        ),
+        migrations.AlterField(
+            model_name='household',
+            name='user',
+            field=models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='meterday',
+            name='household',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, to='footprint.household'),
+        ),
+        migrations.AlterField(
+            model_name='metermonth',
+            name='household',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, to='footprint.household'),
+        ),
+        migrations.AlterField(
+            model_name='organisationmember',
+            name='household',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, to='footprint.household'),
+        ),
+        migrations.AlterField(
+            model_name='tripbatch',
+            name='household',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, to='footprint.household'),
+        ),
+        migrations.AlterField(
+            model_name='tripmonth',
+            name='household',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, to='footprint.household'),
+        ),
+        migrations.CreateModel(
+            name='HouseholdDirectory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='household_directory', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'household directory',
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.7 on 2026-10-18 23:50
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('footprint', '0011_household_shards'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FootprintEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('total_footprint', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('energy_footprint', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('transport_footprint', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('diet_footprint', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('waste_footprint', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('household', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, to='footprint.household')),
+            ],
+        ),
+    ]
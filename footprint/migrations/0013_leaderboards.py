@@ -0,0 +1,46 @@
+# Generated by Django 4.2.7 on 2026-10-19 00:07
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('footprint', '0012_footprint_events'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardNode',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(choices=[('city', 'City'), ('state', 'State')], max_length=5)),
+                ('region', models.CharField(max_length=50)),
+                ('month', models.DateField()),
+                ('node', models.PositiveSmallIntegerField()),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'unique_together': {('scope', 'region', 'month', 'node')},
+            },
+        ),
+        migrations.CreateModel(
+            name='LeaderboardEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(choices=[('city', 'City'), ('state', 'State')], max_length=5)),
+                ('region', models.CharField(max_length=50)),
+                ('month', models.DateField()),
+                ('name', models.CharField(max_length=100)),
+                ('per_person', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('bucket', models.PositiveSmallIntegerField()),
+                ('household', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, to='footprint.household')),
+            ],
+            options={
+                'verbose_name_plural': 'leaderboard entries',
+                'indexes': [models.Index(fields=['scope', 'region', 'month', 'bucket', 'per_person', 'household'], name='footprint_l_scope_3d5391_idx')],
+                'unique_together': {('household', 'month', 'scope')},
+            },
+        ),
+    ]
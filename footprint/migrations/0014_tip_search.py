@@ -0,0 +1,66 @@
+from django.db import migrations
+
+
+# FTS5 index over tip titles and descriptions, kept in sync with the tips
+# table by triggers (so bulk inserts and queryset updates are indexed too).
+# Category is indexed as well, so that filter is answered inside the index.
+# The index stores no copy of the text: it reads it from the tips table.
+# Words are not stemmed: searches match the last word as a prefix, and the
+# porter stemmer would turn 'bus*' into 'bu*', matching 'bulb'.
+CREATE_INDEX = """
+    CREATE VIRTUAL TABLE footprint_sustainabilitytip_fts USING fts5(
+        title, description, category,
+        content='footprint_sustainabilitytip', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+"""
+
+# SQLite drops these when a migration rebuilds the tips table (as adding or
+# altering a column does), so such migrations must create them again; see
+# 0018_tip_search_triggers.
+TRIGGERS = [
+    """
+    CREATE TRIGGER footprint_sustainabilitytip_fts_insert AFTER INSERT ON footprint_sustainabilitytip BEGIN
+        INSERT INTO footprint_sustainabilitytip_fts (rowid, title, description, category)
+        VALUES (new.id, new.title, new.description, new.category);
+    END
+    """,
+    """
+    CREATE TRIGGER footprint_sustainabilitytip_fts_delete AFTER DELETE ON footprint_sustainabilitytip BEGIN
+        INSERT INTO footprint_sustainabilitytip_fts (footprint_sustainabilitytip_fts, rowid, title, description, category)
+        VALUES ('delete', old.id, old.title, old.description, old.category);
+    END
+    """,
+    """
+    CREATE TRIGGER footprint_sustainabilitytip_fts_update AFTER UPDATE OF title, description, category
+    ON footprint_sustainabilitytip BEGIN
+        INSERT INTO footprint_sustainabilitytip_fts (footprint_sustainabilitytip_fts, rowid, title, description, category)
+        VALUES ('delete', old.id, old.title, old.description, old.category);
+        INSERT INTO footprint_sustainabilitytip_fts (rowid, title, description, category)
+        VALUES (new.id, new.title, new.description, new.category);
+    END
+    """,
+]
+
+REBUILD_INDEX = "INSERT INTO footprint_sustainabilitytip_fts (footprint_sustainabilitytip_fts) VALUES ('rebuild')"
+
+DROP_TRIGGERS = [
+    'DROP TRIGGER IF EXISTS footprint_sustainabilitytip_fts_update',
+    'DROP TRIGGER IF EXISTS footprint_sustainabilitytip_fts_delete',
+    'DROP TRIGGER IF EXISTS footprint_sustainabilitytip_fts_insert',
+]
+
+FORWARD = [CREATE_INDEX, *TRIGGERS, REBUILD_INDEX]
+
+BACKWARD = [*DROP_TRIGGERS, 'DROP TABLE footprint_sustainabilitytip_fts']
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('footprint', '0013_leaderboards'),
+    ]
+
+    operations = [
+        migrations.RunSQL(FORWARD, BACKWARD),
+    ]
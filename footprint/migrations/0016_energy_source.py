@@ -0,0 +1,38 @@
+from django.db import DEFAULT_DB_ALIAS, migrations, models
+from django.db.models import Exists, OuterRef
+
+
+def mark_meter_rows(apps, schema_editor):
+    """Electricity rows of months with smart-meter readings were written by the meter rollup.
+
+    Also runs on shards, whose meter months are on the default database.
+    """
+    EnergyUsage = apps.get_model('footprint', 'EnergyUsage')
+    MeterMonth = apps.get_model('footprint', 'MeterMonth')
+    db_alias = schema_editor.connection.alias
+    electricity = EnergyUsage.objects.using(db_alias).filter(fuel_type='electricity')
+    if db_alias == DEFAULT_DB_ALIAS:
+        metered = MeterMonth.objects.using(db_alias).filter(household_id=OuterRef('household_id'), month=OuterRef('month'))
+        electricity.filter(Exists(metered)).update(source='meter')
+        return
+    months = MeterMonth.objects.using(DEFAULT_DB_ALIAS).values_list('household_id', 'month')
+    for household_id, month in months.iterator():
+        electricity.filter(household_id=household_id, month=month).update(source='meter')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('footprint', '0015_tip_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='energyusage',
+            name='source',
+            field=models.CharField(
+                choices=[('manual', 'Entered by hand'), ('meter', 'Smart meter')], default='manual', max_length=10
+            ),
+        ),
+        migrations.RunPython(mark_meter_rows, migrations.RunPython.noop, hints={'model_name': 'energyusage'}),
+    ]
@@ -0,0 +1,23 @@
+from importlib import import_module
+
+from django.db import migrations
+
+
+# Adding updated_at in 0015 rebuilt the tips table, which dropped the
+# triggers 0014 put on it, so tips written since were never indexed or
+# removed from the index. Recreate the triggers and reindex every tip.
+tip_search = import_module('footprint.migrations.0014_tip_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('footprint', '0017_api_key'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            [*tip_search.DROP_TRIGGERS, *tip_search.TRIGGERS, tip_search.REBUILD_INDEX],
+            tip_search.DROP_TRIGGERS,
+        ),
+    ]
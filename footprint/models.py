@@ -1,11 +1,28 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator, MaxValueValidator
 
+from .units import UnitError, to_canonical
+
+
+class HouseholdQuerySet(models.QuerySet):
+
+    def create(self, **kwargs):
+        # Saved without an alias unless one was given, so the id allocated
+        # in save() picks the shard rather than the unhinted router
+        household = self.model(**kwargs)
+        household.save(force_insert=True, using=self._db)
+        return household
+
 
 class Household(models.Model):
     """Model to store household information"""
-    user = models.OneToOneField(User, on_delete=models.CASCADE)
+    # With DATABASE_SHARDS set, households and their activity, archive and
+    # footprint rows live on a shard (see sharding.py), so foreign keys
+    # between them and default-database tables are enforced by the ORM, not
+    # by SQLite
+    user = models.OneToOneField(User, on_delete=models.CASCADE, db_constraint=False)
     name = models.CharField(max_length=100)
     address = models.TextField()
     city = models.CharField(max_length=50)
@@ -15,9 +32,30 @@ class Household(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = HouseholdQuerySet.as_manager()
+
     def __str__(self):
         return f"{self.name}'s Household"
 
+    def save(self, *args, **kwargs):
+        # A sharded household's id picks its database, so it comes first
+        if self.pk is None:
+            from .sharding import allocate_household_ids
+            allocate_household_ids([self])
+        super().save(*args, **kwargs)
+
+
+class HouseholdDirectory(models.Model):
+    """Model to allocate household ids and find each user's household when households are sharded"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='household_directory')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name_plural = 'household directory'
+
+    def __str__(self):
+        return f"Household {self.pk} ({self.user})"
+
 
 class EnergyUsage(models.Model):
     """Model to store energy consumption data"""
@@ -29,17 +67,34 @@ class EnergyUsage(models.Model):
         ('firewood', 'Firewood'),
         ('charcoal', 'Charcoal'),
     ]
+    SOURCE_CHOICES = [
+        ('manual', 'Entered by hand'),
+        ('meter', 'Smart meter'),
+    ]
     
     household = models.ForeignKey(Household, on_delete=models.CASCADE)
     fuel_type = models.CharField(max_length=20, choices=FUEL_CHOICES)
     consumption = models.DecimalField(max_digits=10, decimal_places=2)
     unit = models.CharField(max_length=20)  # kWh, kg, liters, etc.
     month = models.DateField()
+    source = models.CharField(max_length=10, choices=SOURCE_CHOICES, default='manual')
     created_at = models.DateTimeField(auto_now_add=True)
+    anomaly_score = models.FloatField(null=True, blank=True, help_text="Robust z-score against similar households")
+    is_anomaly = models.BooleanField(default=False)
+
+    class Meta:
+        unique_together = ['household', 'month', 'fuel_type']
 
     def __str__(self):
         return f"{self.household.name} - {self.fuel_type} - {self.month}"
 
+    def clean(self):
+        if self.fuel_type and self.consumption is not None:
+            try:
+                to_canonical(self.fuel_type, self.consumption, self.unit)
+            except UnitError as exc:
+                raise ValidationError({'unit': str(exc)})
+
 
 class Transportation(models.Model):
     """Model to store transportation data"""
@@ -64,6 +119,11 @@ class Transportation(models.Model):
     frequency_per_week = models.PositiveIntegerField(default=1)
     month = models.DateField()
     created_at = models.DateTimeField(auto_now_add=True)
+    anomaly_score = models.FloatField(null=True, blank=True, help_text="Robust z-score against similar households")
+    is_anomaly = models.BooleanField(default=False)
+
+    class Meta:
+        unique_together = ['household', 'month', 'vehicle_type']
 
     def __str__(self):
         return f"{self.household.name} - {self.vehicle_type} - {self.month}"
@@ -90,6 +150,11 @@ class Diet(models.Model):
     consumption_kg = models.DecimalField(max_digits=8, decimal_places=2)
     month = models.DateField()
     created_at = models.DateTimeField(auto_now_add=True)
+    anomaly_score = models.FloatField(null=True, blank=True, help_text="Robust z-score against similar households")
+    is_anomaly = models.BooleanField(default=False)
+
+    class Meta:
+        unique_together = ['household', 'month', 'food_type']
 
     def __str__(self):
         return f"{self.household.name} - {self.food_type} - {self.month}"
@@ -111,6 +176,11 @@ class Waste(models.Model):
     quantity_kg = models.DecimalField(max_digits=8, decimal_places=2)
     month = models.DateField()
     created_at = models.DateTimeField(auto_now_add=True)
+    anomaly_score = models.FloatField(null=True, blank=True, help_text="Robust z-score against similar households")
+    is_anomaly = models.BooleanField(default=False)
+
+    class Meta:
+        unique_together = ['household', 'month', 'waste_type']
 
     def __str__(self):
         return f"{self.household.name} - {self.waste_type} - {self.month}"
@@ -133,6 +203,256 @@ class CarbonFootprint(models.Model):
     def __str__(self):
         return f"{self.household.name} - {self.month} - {self.total_footprint} kg CO2e"
 
+    @property
+    def version(self):
+        """Identify the stored figures, used to key cached template fragments"""
+        return (
+            f"{self.pk}:{self.total_footprint}:{self.energy_footprint}:"
+            f"{self.transport_footprint}:{self.diet_footprint}:{self.waste_footprint}"
+        )
+
+
+class FootprintEvent(models.Model):
+    """Model to store recently saved footprints for live dashboard updates"""
+    household = models.ForeignKey(Household, on_delete=models.CASCADE, db_constraint=False)  # stored on the household's shard
+    month = models.DateField()
+    total_footprint = models.DecimalField(max_digits=10, decimal_places=2)  # in kg CO2e
+    energy_footprint = models.DecimalField(max_digits=10, decimal_places=2)
+    transport_footprint = models.DecimalField(max_digits=10, decimal_places=2)
+    diet_footprint = models.DecimalField(max_digits=10, decimal_places=2)
+    waste_footprint = models.DecimalField(max_digits=10, decimal_places=2)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.household_id} - {self.month} - {self.total_footprint} kg CO2e (event {self.pk})"
+
+
+class ActivityArchive(models.Model):
+    """Model to store a closed month of activity data in packed form"""
+    household = models.ForeignKey(Household, on_delete=models.CASCADE)
+    month = models.DateField()
+    data = models.BinaryField()  # per-type quantity arrays, see archive.pack
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ['household', 'month']
+
+    def __str__(self):
+        return f"{self.household.name} - {self.month} (archived)"
+
+
+class MeterDay(models.Model):
+    """Model to store one day of 15-minute smart-meter readings in packed form"""
+    household = models.ForeignKey(Household, on_delete=models.CASCADE, db_constraint=False)  # stored on the household's shard
+    day = models.DateField()
+    readings = models.BinaryField()  # 96 float32 kWh slots, NaN where missing; see metering
+    kwh = models.DecimalField(max_digits=10, decimal_places=3, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['household', 'day']
+
+    def __str__(self):
+        return f"{self.household.name} - {self.day} - {self.kwh} kWh"
+
+
+class MeterMonth(models.Model):
+    """Model to store a month's smart-meter totals per time-of-day slot"""
+    household = models.ForeignKey(Household, on_delete=models.CASCADE, db_constraint=False)  # stored on the household's shard
+    month = models.DateField()
+    slot_kwh = models.BinaryField()  # 96 float64 kWh sums per 15-minute slot
+    slot_days = models.BinaryField()  # 96 int32 counts of days with a reading
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['household', 'month']
+
+    def __str__(self):
+        return f"{self.household.name} - {self.month} (meter)"
+
+
+class TripMonth(models.Model):
+    """Model to store logged trips aggregated per household, month and vehicle"""
+    household = models.ForeignKey(Household, on_delete=models.CASCADE, db_constraint=False)  # stored on the household's shard
+    month = models.DateField()
+    vehicle_type = models.CharField(max_length=20, choices=Transportation.VEHICLE_CHOICES)
+    distance_km = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    trips = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['household', 'month', 'vehicle_type']
+
+    def __str__(self):
+        return f"{self.household.name} - {self.vehicle_type} - {self.month} ({self.trips} trips)"
+
+
+class TripBatch(models.Model):
+    """Model to store the ids of trip uploads already applied, so retries are ignored"""
+    household = models.ForeignKey(Household, on_delete=models.CASCADE, db_constraint=False)  # stored on the household's shard
+    batch_id = models.CharField(max_length=64)
+    trips = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ['household', 'batch_id']
+
+    def __str__(self):
+        return f"{self.household.name} - {self.batch_id}"
+
+
+class GridFactor(models.Model):
+    """Model to store the electricity grid emission factor of a state for a month"""
+    state = models.CharField(max_length=50)
+    month = models.DateField()
+    factor = models.DecimalField(max_digits=6, decimal_places=4, validators=[MinValueValidator(0)])  # kg CO2e per kWh
+    source = models.CharField(max_length=200, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['state', 'month']
+        ordering = ['state', 'month']
+
+    def __str__(self):
+        return f"{self.state} - {self.month} ({self.factor} kg CO2e/kWh)"
+
+
+class FootprintForecast(models.Model):
+    """Model to store forecast carbon footprint for upcoming months"""
+    household = models.ForeignKey(Household, on_delete=models.CASCADE, db_constraint=False)  # stored on the household's shard
+    total_footprint = models.DecimalField(max_digits=10, decimal_places=2)  # in kg CO2e
+    energy_footprint = models.DecimalField(max_digits=10, decimal_places=2)
+    transport_footprint = models.DecimalField(max_digits=10, decimal_places=2)
+    diet_footprint = models.DecimalField(max_digits=10, decimal_places=2)
+    waste_footprint = models.DecimalField(max_digits=10, decimal_places=2)
+    month = models.DateField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ['household', 'month']
+
+    def __str__(self):
+        return f"{self.household.name} - {self.month} - {self.total_footprint} kg CO2e (forecast)"
+
+
+class ActivitySketch(models.Model):
+    """Model to store streaming robust statistics for anomaly detection"""
+    activity = models.CharField(max_length=20)  # energy, transport, diet, waste
+    item_type = models.CharField(max_length=20)  # fuel, vehicle, food or waste type
+    state = models.CharField(max_length=50, blank=True)  # blank for the national sketch
+    counts = models.JSONField(default=list)  # log-scale histogram, see anomalies.Sketch
+    total = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['activity', 'item_type', 'state']
+
+    def __str__(self):
+        return f"{self.activity} - {self.item_type} - {self.state or 'India'} ({self.total})"
+
+
+class Organisation(models.Model):
+    """Model to store a housing society, campus or company grouping households"""
+    KIND_CHOICES = [
+        ('society', 'Housing Society'),
+        ('campus', 'Campus'),
+        ('company', 'Company'),
+        ('other', 'Other'),
+    ]
+    
+    name = models.CharField(max_length=200)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, default='other')
+    parent = models.ForeignKey(
+        'self', null=True, blank=True, on_delete=models.SET_NULL, related_name='children'
+    )
+    members = models.ManyToManyField(Household, through='OrganisationMember', related_name='organisations')
+    managers = models.ManyToManyField(User, blank=True, related_name='managed_organisations')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.name
+
+
+class OrganisationMember(models.Model):
+    """Model to store a household's direct membership of an organisation"""
+    organisation = models.ForeignKey(Organisation, on_delete=models.CASCADE)
+    household = models.ForeignKey(Household, on_delete=models.CASCADE, db_constraint=False)  # stored on the household's shard
+    joined_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ['organisation', 'household']
+
+    def __str__(self):
+        return f"{self.household.name} - {self.organisation.name}"
+
+
+class OrganisationRollup(models.Model):
+    """Model to store monthly footprint totals over an organisation and its sub-organisations"""
+    organisation = models.ForeignKey(Organisation, on_delete=models.CASCADE, related_name='rollups')
+    month = models.DateField()
+    household_count = models.IntegerField(default=0)
+    total_footprint = models.DecimalField(max_digits=16, decimal_places=2, default=0)  # in kg CO2e
+    energy_footprint = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    transport_footprint = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    diet_footprint = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    waste_footprint = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['organisation', 'month']
+
+    def __str__(self):
+        return f"{self.organisation.name} - {self.month} - {self.total_footprint} kg CO2e"
+
+    @property
+    def average_footprint(self):
+        """Mean total footprint per reporting household"""
+        if not self.household_count:
+            return 0
+        return self.total_footprint / self.household_count
+
+
+class LeaderboardEntry(models.Model):
+    """Model to store a household's place on its city or state leaderboard for a month"""
+    SCOPE_CHOICES = [
+        ('city', 'City'),
+        ('state', 'State'),
+    ]
+
+    scope = models.CharField(max_length=5, choices=SCOPE_CHOICES)
+    region = models.CharField(max_length=50)  # normalised city or state name
+    month = models.DateField()
+    # May be on a shard; entries are removed with their footprints (see leaderboards.py)
+    household = models.ForeignKey(Household, on_delete=models.DO_NOTHING, db_constraint=False)
+    name = models.CharField(max_length=100)  # household name, so top lists need no shard queries
+    per_person = models.DecimalField(max_digits=10, decimal_places=2)  # kg CO2e per person
+    bucket = models.PositiveSmallIntegerField()  # log-scale bucket of per_person, see leaderboards.py
+
+    class Meta:
+        unique_together = ['household', 'month', 'scope']
+        indexes = [
+            models.Index(fields=['scope', 'region', 'month', 'bucket', 'per_person', 'household']),
+        ]
+        verbose_name_plural = 'leaderboard entries'
+
+    def __str__(self):
+        return f"{self.region} {self.month} - {self.name} - {self.per_person} kg CO2e per person"
+
+
+class LeaderboardNode(models.Model):
+    """Model to store one node of a leaderboard's Fenwick tree of bucket counts"""
+    scope = models.CharField(max_length=5, choices=LeaderboardEntry.SCOPE_CHOICES)
+    region = models.CharField(max_length=50)
+    month = models.DateField()
+    node = models.PositiveSmallIntegerField()
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ['scope', 'region', 'month', 'node']
+
+    def __str__(self):
+        return f"{self.region} {self.month} - node {self.node} ({self.count})"
+
 
 class SustainabilityTip(models.Model):
     """Model to store sustainability tips"""
@@ -150,6 +470,18 @@ class SustainabilityTip(models.Model):
     impact_kg_co2 = models.DecimalField(max_digits=8, decimal_places=2, help_text="Potential CO2 savings in kg")
     indian_context = models.BooleanField(default=True, help_text="Tip specific to Indian context")
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.title 
+
+
+class ApiKey(models.Model):
+    """Model to store a key a device or script uses to call the JSON APIs"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='api_keys')
+    name = models.CharField(max_length=100)  # e.g. the meter or phone it is installed on
+    key_hash = models.CharField(max_length=64, unique=True)  # SHA-256; the key itself is only shown once
+    created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
-        return self.title 
\ No newline at end of file
+        return f"{self.user.username} - {self.name}"
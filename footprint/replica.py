@@ -0,0 +1,106 @@
+import os
+import sqlite3
+import tempfile
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+REPLICA = 'replica'
+
+# Set on responses to clients that just wrote; while present their reads
+# stay on the primary so they see their own changes
+STICKY_COOKIE = 'read_primary'
+
+_use_replica = ContextVar('use_replica', default=False)
+_wrote = ContextVar('wrote', default=False)
+
+
+def replica_configured():
+    return REPLICA in settings.DATABASES
+
+
+def replica_reads(view):
+    """Serve a read-only view from the replica, unless the client wrote recently"""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if (
+            not replica_configured()
+            or request.method not in ('GET', 'HEAD')
+            or STICKY_COOKIE in request.COOKIES
+        ):
+            return view(request, *args, **kwargs)
+        token = _use_replica.set(True)
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _use_replica.reset(token)
+    return wrapper
+
+
+class ReplicaRouter:
+    """Send reads inside ``replica_reads`` views to the replica, everything else to the primary.
+
+    Reads inside a transaction always use the primary, and any write is
+    recorded so ReadReplicaMiddleware can make the client sticky. Must be
+    the last router, as it answers for every model.
+    """
+
+    def db_for_read(self, model, **hints):
+        if _use_replica.get() and not connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return REPLICA
+        # Explicit, so instances loaded from the replica do not pull their
+        # related queries there
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        _wrote.set(True)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica is a copy of the primary, so rows from either relate
+        if {obj1._state.db, obj2._state.db} <= {DEFAULT_DB_ALIAS, REPLICA}:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica gets its schema with every copy of the primary
+        return False if db == REPLICA else None
+
+
+def track_writes():
+    """Start recording writes for a request; returns a callable saying whether any happened"""
+    token = _wrote.set(False)
+
+    def wrote():
+        result = _wrote.get()
+        _wrote.reset(token)
+        return result
+    return wrote
+
+
+def refresh_replica():
+    """Copy the primary into the replica file with SQLite's online backup API.
+
+    The copy is written beside the replica and renamed over it, so readers
+    never see a half-written file; connections opened afterwards read the
+    new copy.
+    """
+    target = str(settings.DATABASES[REPLICA]['NAME'])
+    fd, partial = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(target)), suffix='.partial')
+    os.close(fd)
+    source = sqlite3.connect(str(settings.DATABASES[DEFAULT_DB_ALIAS]['NAME']))
+    try:
+        destination = sqlite3.connect(partial)
+        try:
+            source.backup(destination)
+        finally:
+            destination.close()
+        os.replace(partial, target)
+    finally:
+        source.close()
+        if os.path.exists(partial):
+            os.remove(partial)
+    return target
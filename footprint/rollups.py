@@ -0,0 +1,147 @@
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+
+from .models import CarbonFootprint, Organisation, OrganisationMember, OrganisationRollup
+from .sharding import household_db, map_shards, shard_for, sharding_enabled
+
+
+FIELDS = ['total_footprint', 'energy_footprint', 'transport_footprint', 'diet_footprint', 'waste_footprint']
+
+
+def organisation_parents():
+    """Map of organisation id to parent id for the whole (small) tree"""
+    return dict(Organisation.objects.values_list('id', 'parent_id'))
+
+
+def with_ancestors(organisation_ids, parents):
+    """The given organisations plus every organisation above them"""
+    result = set()
+    for organisation_id in organisation_ids:
+        while organisation_id is not None and organisation_id not in result:
+            result.add(organisation_id)
+            organisation_id = parents.get(organisation_id)
+    return result
+
+
+def with_descendants(organisation_id, parents):
+    """The given organisation plus every organisation below it"""
+    children = {}
+    for child, parent in parents.items():
+        children.setdefault(parent, []).append(child)
+    result, stack = set(), [organisation_id]
+    while stack:
+        current = stack.pop()
+        if current not in result:
+            result.add(current)
+            stack.extend(children.get(current, ()))
+    return result
+
+
+def household_organisations(household_id, exclude=None):
+    """Every organisation whose rollups include the household.
+
+    ``exclude`` drops one direct membership, to find what a household
+    still belongs to when that membership is removed.
+    """
+    direct = OrganisationMember.objects.filter(household_id=household_id)
+    if exclude is not None:
+        direct = direct.exclude(pk=exclude)
+    direct = list(direct.values_list('organisation_id', flat=True))
+    if not direct:
+        return set()
+    return with_ancestors(direct, organisation_parents())
+
+
+def figures(footprint):
+    """Category values of a CarbonFootprint as a dict keyed by field name"""
+    return {field: Decimal(getattr(footprint, field)).quantize(Decimal('0.01')) for field in FIELDS}
+
+
+def ensure_rollups(organisation_ids, *months):
+    """Create any missing (empty) rollup rows for the months"""
+    OrganisationRollup.objects.bulk_create(
+        [OrganisationRollup(organisation_id=o, month=month) for month in months for o in organisation_ids],
+        ignore_conflicts=True,
+    )
+
+
+def apply_delta(organisation_ids, month, old=None, new=None, ensure=True):
+    """Replace one household's ``old`` figures with ``new`` in each rollup.
+
+    Either side may be None for a footprint that is being created or
+    removed. Costs two statements however many households the
+    organisations hold, or one when the caller has already run
+    ensure_rollups for the month (``ensure=False``).
+    """
+    if not organisation_ids or (old is None and new is None):
+        return
+    if ensure:
+        ensure_rollups(organisation_ids, month)
+    changes = {
+        field: F(field) + Decimal((new or {}).get(field, 0)) - Decimal((old or {}).get(field, 0))
+        for field in FIELDS
+    }
+    OrganisationRollup.objects.filter(organisation_id__in=organisation_ids, month=month).update(
+        household_count=F('household_count') + (new is not None) - (old is not None),
+        updated_at=timezone.now(),
+        **changes,
+    )
+
+
+def apply_membership(household_id, organisation_ids, sign):
+    """Add (sign=1) or remove (sign=-1) all of a household's months from rollups"""
+    footprints = CarbonFootprint.objects.using(household_db(household_id)).filter(household_id=household_id)
+    for footprint in footprints.values('month', *FIELDS):
+        month = footprint.pop('month')
+        if sign > 0:
+            apply_delta(organisation_ids, month, new=footprint)
+        else:
+            apply_delta(organisation_ids, month, old=footprint)
+
+
+def rebuild_rollups():
+    """Recompute every rollup from CarbonFootprint, returning the number written"""
+    parents = organisation_parents()
+
+    def shard_totals(alias):
+        totals = {}
+        for organisation_id in parents:
+            members = OrganisationMember.objects.filter(
+                organisation_id__in=with_descendants(organisation_id, parents)
+            ).values_list('household_id', flat=True)
+            if sharding_enabled():
+                # Memberships are on the default database, so this shard's
+                # households are passed by value rather than as a subquery
+                members = [household_id for household_id in members if shard_for(household_id) == alias]
+            months = (
+                CarbonFootprint.objects.filter(household_id__in=members)
+                .values('month')
+                .annotate(household_count=Count('id'), **{f'{field}_sum': Sum(field) for field in FIELDS})
+            )
+            for row in months:
+                totals[(organisation_id, row['month'])] = [
+                    row['household_count'], *(row[f'{field}_sum'] for field in FIELDS)
+                ]
+        return totals
+
+    # Shards hold disjoint households, so their totals add up
+    combined = {}
+    for totals in map_shards(shard_totals):
+        for key, values in totals.items():
+            combined[key] = [a + b for a, b in zip(combined[key], values)] if key in combined else values
+    rollups = [
+        OrganisationRollup(
+            organisation_id=organisation_id,
+            month=month,
+            household_count=values[0],
+            **dict(zip(FIELDS, values[1:])),
+        )
+        for (organisation_id, month), values in combined.items()
+    ]
+    with transaction.atomic():
+        OrganisationRollup.objects.all().delete()
+        OrganisationRollup.objects.bulk_create(rollups, batch_size=1000)
+    return len(rollups)
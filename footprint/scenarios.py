@@ -0,0 +1,306 @@
+from datetime import date
+
+import numpy as np
+from django.db.models import DecimalField, ExpressionWrapper, F, Sum
+
+from .grid import grid_factors
+from .models import EnergyUsage, Transportation, Diet, TripMonth
+from .utils import CarbonCalculator
+
+
+# Energy content per unit (MJ), used to convert between fuels measured in
+# different units: replacing 1 kg of LPG needs about 2.3 m3 of biogas.
+ENERGY_CONTENT_MJ = {
+    'electricity': 3.6,   # per kWh
+    'lpg': 46.1,          # per kg
+    'kerosene': 35.0,     # per liter
+    'biogas': 20.0,       # per m3
+    'firewood': 15.0,     # per kg
+    'charcoal': 29.0,     # per kg
+}
+
+WEEKS_PER_MONTH = 4.33
+
+# Fractions of a source activity a suggested substitution may move
+FRACTIONS = (0.5, 1.0)
+
+
+class ScenarioError(ValueError):
+    """Raised when a requested substitution cannot be applied"""
+
+
+class FactorTable:
+    """Emission factors of every substitutable activity as flat arrays.
+
+    Energy fuels, vehicles and foods share one index space so a scenario is
+    a set of (source index, target index, fraction) moves and can be scored
+    with plain array arithmetic. ``factors`` holds the static factors; a
+    household's electricity is priced at its state's grid factor instead
+    (see with_electricity).
+    """
+
+    DOMAINS = (
+        ('energy', EnergyUsage.FUEL_CHOICES, CarbonCalculator.ENERGY_EMISSION_FACTORS),
+        ('transport', Transportation.VEHICLE_CHOICES, CarbonCalculator.TRANSPORT_EMISSION_FACTORS),
+        ('diet', Diet.FOOD_CHOICES, CarbonCalculator.FOOD_EMISSION_FACTORS),
+    )
+
+    def __init__(self):
+        self.keys = []
+        self.labels = []
+        domains = []
+        factors = []
+        units = []
+        for domain_index, (domain, choices, emission_factors) in enumerate(self.DOMAINS):
+            for key, label in choices:
+                self.keys.append(key)
+                self.labels.append(label)
+                domains.append(domain_index)
+                factors.append(emission_factors.get(key, 0))
+                # Transport and diet swap 1:1 (km, kg); fuels swap on energy content
+                units.append(ENERGY_CONTENT_MJ[key] if domain == 'energy' else 1.0)
+        self.index = {key: i for i, key in enumerate(self.keys)}
+        self.domain_names = [domain for domain, _, _ in self.DOMAINS]
+        self.domains = np.array(domains)
+        self.factors = np.array(factors, dtype=np.float64)
+        self.units = np.array(units, dtype=np.float64)
+
+    def with_electricity(self, factor):
+        """Emission factors with electricity at ``factor`` kg CO2e per kWh"""
+        factors = self.factors.copy()
+        factors[self.index['electricity']] = factor
+        return factors
+
+    def conversion(self, sources, targets):
+        """Units of target needed to replace one unit of source"""
+        return self.units[sources] / self.units[targets]
+
+    def savings(self, quantities, factors, sources, targets, fractions):
+        """Annual kg CO2e saved by each move, vectorized over the moves"""
+        moved = quantities[sources] * fractions
+        return moved * (
+            factors[sources]
+            - self.conversion(sources, targets) * factors[targets]
+        )
+
+
+FACTORS = FactorTable()
+
+
+def annual_activity(household, today=None):
+    """Project the household's last twelve months of activity onto a year.
+
+    Returns ``(quantities, factors)``, each with one value per FactorTable
+    index. Quantities are kWh/kg/liters/m3 for fuels, km for vehicles and
+    kg for foods. Months without any data are ignored so a household with
+    three months of history is scaled up, not diluted. As in the stored
+    footprints, a vehicle's logged trips replace its weekly estimate in the
+    months they were logged.
+
+    Electricity is priced as the stored footprints price it, at the state
+    grid factor of each month, averaged over the year weighted by
+    consumption (or evenly, when the household used none).
+    """
+    today = today or date.today()
+    year, month = today.year, today.month - 11
+    if month < 1:
+        year, month = year - 1, month + 12
+    start = date(year, month, 1)
+    quantities = np.zeros(len(FACTORS.keys))
+    months = set()
+    grid = grid_factors()
+    electricity_kwh = electricity_kg = 0.0
+    trips = {
+        (vehicle, month): distance
+        for vehicle, month, distance in TripMonth.objects.filter(household=household, month__gte=start)
+        .values_list('vehicle_type', 'month', 'distance_km')
+    }
+
+    rows = [
+        EnergyUsage.objects.filter(household=household, month__gte=start)
+        .values_list('fuel_type', 'month').annotate(total=Sum('consumption')),
+        Transportation.objects.filter(household=household, month__gte=start)
+        .values_list('vehicle_type', 'month').annotate(total=Sum(ExpressionWrapper(
+            F('distance_km') * F('frequency_per_week'),
+            output_field=DecimalField(),
+        ))),
+        Diet.objects.filter(household=household, month__gte=start)
+        .values_list('food_type', 'month').annotate(total=Sum('consumption_kg')),
+    ]
+    for domain_index, queryset in enumerate(rows):
+        transport = FACTORS.domain_names[domain_index] == 'transport'
+        scale = WEEKS_PER_MONTH if transport else 1.0
+        for key, month, total in queryset:
+            if transport and (key, month) in trips:
+                continue
+            if key in FACTORS.index:
+                quantities[FACTORS.index[key]] += float(total) * scale
+                months.add(month)
+            if key == 'electricity':
+                electricity_kwh += float(total)
+                electricity_kg += float(total) * grid.factor(household.state, month)
+    for (vehicle, month), distance in trips.items():
+        if vehicle in FACTORS.index:
+            quantities[FACTORS.index[vehicle]] += float(distance)
+            months.add(month)
+
+    if months:
+        quantities *= 12.0 / len(months)
+    if electricity_kwh:
+        electricity = electricity_kg / electricity_kwh
+    else:
+        window = [
+            date(start.year + (start.month - 1 + i) // 12, (start.month - 1 + i) % 12 + 1, 1)
+            for i in range(12)
+        ]
+        electricity = float(np.mean([grid.factor(household.state, m) for m in window]))
+    return quantities, FACTORS.with_electricity(electricity)
+
+
+def parse_substitution(value):
+    """Parse 'source:target[:fraction]' into a move of FactorTable indices"""
+    parts = value.split(':')
+    if len(parts) not in (2, 3):
+        raise ScenarioError(f'Invalid substitution "{value}", expected source:target[:fraction].')
+    source, target = parts[0], parts[1]
+    for key in (source, target):
+        if key not in FACTORS.index:
+            raise ScenarioError(f'Unknown activity "{key}".')
+    source, target = FACTORS.index[source], FACTORS.index[target]
+    if FACTORS.domains[source] != FACTORS.domains[target]:
+        raise ScenarioError('Substitutions must stay within energy, transport or diet.')
+    if source == target:
+        raise ScenarioError('Source and target of a substitution must differ.')
+    try:
+        fraction = float(parts[2]) if len(parts) == 3 else 1.0
+    except ValueError:
+        raise ScenarioError(f'Invalid fraction "{parts[2]}".')
+    if not 0 < fraction <= 1:
+        raise ScenarioError('Fraction must be between 0 and 1.')
+    return source, target, fraction
+
+
+def candidate_moves(quantities, factors):
+    """Every single substitution that would reduce emissions.
+
+    Returns parallel arrays of sources, targets, fractions and savings.
+    """
+    active = np.flatnonzero(quantities > 0)
+    all_items = np.arange(len(FACTORS.keys))
+    sources, targets = np.meshgrid(active, all_items, indexing='ij')
+    sources, targets = sources.ravel(), targets.ravel()
+    same_domain = (FACTORS.domains[sources] == FACTORS.domains[targets]) & (sources != targets)
+    sources, targets = sources[same_domain], targets[same_domain]
+
+    fractions = np.repeat(np.array(FRACTIONS), len(sources))
+    sources = np.tile(sources, len(FRACTIONS))
+    targets = np.tile(targets, len(FRACTIONS))
+    savings = FACTORS.savings(quantities, factors, sources, targets, fractions)
+
+    useful = savings > 0
+    return sources[useful], targets[useful], fractions[useful], savings[useful]
+
+
+def scenario_moves(sources):
+    """Candidate scenarios as a sparse list of (scenario, move) entries.
+
+    Every single move is a scenario, and so is every pair of moves with
+    distinct sources, so no activity is moved more than once. Returns the
+    parallel ``scenarios`` and ``moves`` arrays and the number of scenarios.
+    """
+    count = len(sources)
+    first, second = np.triu_indices(count, k=1)
+    distinct = sources[first] != sources[second]
+    first, second = first[distinct], second[distinct]
+
+    singles = np.arange(count)
+    pairs = np.arange(count, count + len(first))
+    scenarios = np.concatenate([singles, pairs, pairs])
+    moves = np.concatenate([singles, first, second])
+    return scenarios, moves, count + len(first)
+
+
+def _describe_moves(sources, targets, fractions):
+    return [
+        {
+            'from': FACTORS.keys[s],
+            'from_label': FACTORS.labels[s],
+            'to': FACTORS.keys[t],
+            'to_label': FACTORS.labels[t],
+            'fraction': float(f),
+        }
+        for s, t, f in zip(sources, targets, fractions)
+    ]
+
+
+def baseline_footprint(quantities, factors):
+    """Annual kg CO2e per substitutable domain (waste is not simulated)"""
+    emissions = quantities * factors
+    return {
+        domain: float(emissions[FACTORS.domains == i].sum())
+        for i, domain in enumerate(FACTORS.domain_names)
+    }
+
+
+def evaluate_substitutions(quantities, factors, substitutions):
+    """Score one explicit scenario given as a list of parsed moves"""
+    if not substitutions:
+        return None
+    sources, targets, fractions = (np.array(column) for column in zip(*substitutions))
+    if len(set(sources.tolist())) != len(sources):
+        raise ScenarioError('Each activity can only be substituted once per scenario.')
+    savings = FACTORS.savings(quantities, factors, sources, targets, fractions)
+    return {
+        'moves': _describe_moves(sources, targets, fractions),
+        'annual_savings_kg': float(savings.sum()),
+    }
+
+
+def top_scenarios(quantities, factors, limit=10):
+    """Evaluate every candidate scenario at once and return the best ones"""
+    sources, targets, fractions, savings = candidate_moves(quantities, factors)
+    if not len(sources):
+        return [], 0
+    scenarios, moves, count = scenario_moves(sources)
+    # Scatter-add each move's savings into its scenarios' totals
+    totals = np.bincount(scenarios, weights=savings[moves], minlength=count)
+
+    limit = min(limit, len(totals))
+    best = np.argpartition(-totals, limit - 1)[:limit]
+    best = best[np.argsort(-totals[best])]
+
+    results = []
+    for row in best:
+        chosen = np.sort(moves[scenarios == row])
+        results.append({
+            'moves': _describe_moves(sources[chosen], targets[chosen], fractions[chosen]),
+            'annual_savings_kg': float(totals[row]),
+        })
+    return results, len(totals)
+
+
+def simulate(household, substitutions=(), limit=10, today=None):
+    """Run the what-if simulator for a household.
+
+    Returns the projected annual baseline, the result of the requested
+    substitutions (if any) and the top suggested scenarios.
+    """
+    quantities, factors = annual_activity(household, today)
+    baseline = baseline_footprint(quantities, factors)
+    baseline_total = sum(baseline.values())
+
+    requested = evaluate_substitutions(quantities, factors, list(substitutions))
+    suggestions, evaluated = top_scenarios(quantities, factors, limit)
+    for result in filter(None, [requested, *suggestions]):
+        result['annual_footprint_kg'] = baseline_total - result['annual_savings_kg']
+        result['savings_percent'] = (
+            100 * result['annual_savings_kg'] / baseline_total if baseline_total else 0
+        )
+
+    return {
+        'baseline': baseline,
+        'baseline_total': baseline_total,
+        'requested': requested,
+        'suggestions': suggestions,
+        'scenarios_evaluated': evaluated,
+    }
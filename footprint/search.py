@@ -0,0 +1,84 @@
+import re
+
+from .models import SustainabilityTip
+
+
+# FTS5 index over tips (see migrations 0014_tip_search and 0018_tip_search_triggers)
+FTS_TABLE = 'footprint_sustainabilitytip_fts'
+
+# bm25 weights of the indexed columns: a word in the title counts for more
+# than one in the description; category only filters
+WEIGHTS = (10.0, 1.0, 0.0)
+
+# Most tips a search returns
+LIMIT = 50
+
+# Words too common to narrow a search, left out of queries. bm25 scores
+# every tip that matches, so one of these costs as much as the whole table.
+STOPWORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'how', 'i', 'in', 'is', 'it',
+    'my', 'of', 'on', 'or', 'the', 'to', 'with', 'you', 'your',
+}
+
+
+def search_terms(query):
+    """FTS5 terms for free text: one per word, the last matched as a prefix.
+
+    Words are quoted, so FTS5 operators and punctuation typed by users are
+    searched for literally rather than raising a syntax error.
+    """
+    words = re.findall(r'\w+', query.lower())
+    terms = [f'"{word}"' for word in words if word not in STOPWORDS]
+    if terms:
+        terms[-1] += '*'
+    return terms
+
+
+def match_expression(terms, columns, category=''):
+    """FTS5 expression matching tips with every term in ``columns``"""
+    expression = f'{columns} : ({" ".join(terms)})'
+    if category:
+        expression += ' AND category : "{}"'.format(category.replace('"', '""'))
+    return f'({expression})'
+
+
+def _ranked(match, min_impact, limit):
+    """Indian-context tips matching an FTS5 expression, best bm25 score first"""
+    tips = SustainabilityTip._meta.db_table
+    sql = (
+        f'SELECT {tips}.* FROM {FTS_TABLE} JOIN {tips} ON {tips}.id = {FTS_TABLE}.rowid '
+        f'WHERE {FTS_TABLE} MATCH %s AND {tips}.indian_context = %s'
+    )
+    params = [match, True]
+    if min_impact is not None:
+        sql += f' AND {tips}.impact_kg_co2 >= %s'
+        params.append(min_impact)
+    sql += f' ORDER BY bm25({FTS_TABLE}, {", ".join(["%s"] * len(WEIGHTS))}) LIMIT %s'
+    return list(SustainabilityTip.objects.raw(sql, [*params, *WEIGHTS, limit]))
+
+
+def search_tips(query, category='', min_impact=None, limit=LIMIT):
+    """Tips matching every word of ``query``, best match first.
+
+    Tips are ranked in tiers: every word in the title, then some of them,
+    then none, each tier by bm25 and only scored when the ones before it
+    don't fill ``limit``. bm25 costs a lookup per tip it scores, and titles
+    are short, so words found in thousands of descriptions still only score
+    the few hundred titles they are in.
+    """
+    terms = search_terms(query)
+    if not terms:
+        return []
+    matches = match_expression(terms, '{title description}', category)
+    every_in_title = match_expression(terms, 'title')
+    some_in_title = f'(title : ({" OR ".join(terms)}))'
+    tiers = [match_expression(terms, 'title', category)]
+    if len(terms) > 1:
+        tiers.append(f'({matches} AND {some_in_title}) NOT {every_in_title}')
+    tiers.append(f'{matches} NOT {some_in_title}')
+    tips = []
+    for match in tiers:
+        tips += _ranked(match, min_impact, limit - len(tips))
+        if len(tips) == limit:
+            break
+    return tips
@@ -0,0 +1,180 @@
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from .replica import REPLICA
+
+
+# Household-owned models stored on the household's shard; everything else
+# stays on the default database and refers to households by id
+SHARDED_MODELS = {
+    'footprint.household', 'footprint.energyusage', 'footprint.transportation',
+    'footprint.diet', 'footprint.waste', 'footprint.activityarchive',
+    'footprint.carbonfootprint', 'footprint.footprintevent',
+}
+
+# Shard for queries that carry no instance hint: an alias, or a callable
+# returning one (so the request's household is only resolved when needed)
+_shard = ContextVar('shard', default=None)
+
+
+class ShardRoutingError(Exception):
+    """A write to household-owned rows that names no household, so no shard"""
+
+
+def shard_aliases():
+    return [f'shard_{i}' for i in range(settings.DATABASE_SHARDS)]
+
+
+def sharding_enabled():
+    return settings.DATABASE_SHARDS > 0
+
+
+def is_sharded(model):
+    return model._meta.label_lower in SHARDED_MODELS
+
+
+def shard_for(household_id):
+    """Database alias holding a household, by a hash that is stable across processes"""
+    return f'shard_{zlib.crc32(str(household_id).encode()) % settings.DATABASE_SHARDS}'
+
+
+def household_db(household_id):
+    """Alias for ``.using()`` on a household's rows; None (the router decides) when not sharded"""
+    return shard_for(household_id) if sharding_enabled() else None
+
+
+def user_household_db(user_id):
+    """Alias holding the user's household, looked up in the directory"""
+    if not sharding_enabled():
+        return None
+    from .models import HouseholdDirectory
+    household_id = (
+        HouseholdDirectory.objects.using(DEFAULT_DB_ALIAS).filter(user_id=user_id)
+        .values_list('pk', flat=True).first()
+    )
+    return shard_for(household_id) if household_id is not None else None
+
+
+def allocate_household_ids(households):
+    """Give new households ids from the directory on the default database.
+
+    The id picks the shard, so it has to exist before the row is written.
+    Does nothing when sharding is off.
+    """
+    if not sharding_enabled():
+        return
+    from .models import HouseholdDirectory
+    entries = HouseholdDirectory.objects.using(DEFAULT_DB_ALIAS).bulk_create(
+        [HouseholdDirectory(user_id=household.user_id) for household in households]
+    )
+    for household, entry in zip(households, entries):
+        household.pk = entry.pk
+
+
+@contextmanager
+def use_shard(target):
+    """Route unhinted queries on sharded models to ``target`` inside the block.
+
+    ``target`` is an alias or a callable returning one (or None).
+    """
+    token = _shard.set(target)
+    try:
+        yield
+    finally:
+        _shard.reset(token)
+
+
+def current_shard():
+    target = _shard.get()
+    return target() if callable(target) else target
+
+
+def map_shards(func):
+    """Call ``func(alias)`` for every shard in parallel and return the results in shard order.
+
+    Each call runs in its own thread with its own connections, routed to
+    its shard. Without sharding, or when the caller is inside a transaction
+    whose uncommitted rows other connections could not see, the calls run
+    one after another in this thread instead.
+    """
+    aliases = shard_aliases()
+    if not aliases:
+        return [func(DEFAULT_DB_ALIAS)]
+    if any(connections[alias].in_atomic_block for alias in [DEFAULT_DB_ALIAS, *aliases]):
+        results = []
+        for alias in aliases:
+            with use_shard(alias):
+                results.append(func(alias))
+        return results
+
+    def run(alias):
+        try:
+            with use_shard(alias):
+                return func(alias)
+        finally:
+            connections.close_all()
+
+    with ThreadPoolExecutor(max_workers=len(aliases)) as pool:
+        return list(pool.map(run, aliases))
+
+
+class ShardRouter:
+    """Send household-owned rows to the household's shard.
+
+    The shard comes from the instance hint (the row itself, or the household
+    or user it hangs off) and otherwise from ``use_shard``, which the
+    ``household_shard`` view decorator sets to the request's household.
+    Unhinted reads outside it go to the default database; unhinted writes
+    raise ShardRoutingError rather than landing there. Other models are
+    left to the next router, so ReplicaRouter must come after this one.
+    """
+
+    def _shard(self, model, instance):
+        if not is_sharded(model):
+            return None
+        if instance is not None:
+            if instance._state.db in shard_aliases():
+                return instance._state.db
+            if isinstance(instance, User):
+                return user_household_db(instance.pk)
+            if instance._meta.label_lower == 'footprint.household':
+                household_id = instance.pk
+            else:
+                household_id = getattr(instance, 'household_id', None)
+            if household_id is not None:
+                return shard_for(household_id)
+        return current_shard()
+
+    def db_for_read(self, model, **hints):
+        return self._shard(model, hints.get('instance'))
+
+    def db_for_write(self, model, **hints):
+        instance = hints.get('instance')
+        alias = self._shard(model, instance)
+        # Instances without a shard yet (a new household) are placed on save
+        if alias is None and instance is None and is_sharded(model):
+            raise ShardRoutingError(
+                f'No shard for a write to {model._meta.label}: use .using(household_db(...)) '
+                f'or run it inside use_shard()'
+            )
+        return alias
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Households on a shard relate to users and organisations on default
+        databases = {DEFAULT_DB_ALIAS, REPLICA, *shard_aliases()}
+        if {obj1._state.db, obj2._state.db} <= databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Shards get the full schema, so cascades find every table, but data
+        # migrations only run against the default database
+        if db in shard_aliases():
+            return model_name is not None
+        return None
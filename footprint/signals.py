@@ -0,0 +1,176 @@
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .anomalies import score_row
+from .caching import forget_household, forget_user
+from .leaderboards import place_footprints, remove_footprints
+from .live import record_events
+from .models import (
+    Household, HouseholdDirectory, EnergyUsage, Transportation, Diet, Waste,
+    CarbonFootprint, Organisation, OrganisationMember
+)
+from .rollups import (
+    FIELDS as ROLLUP_FIELDS, apply_delta, apply_membership, figures,
+    household_organisations, organisation_parents, rebuild_rollups, with_ancestors
+)
+from .sharding import is_sharded, user_household_db
+from .units import normalise_row
+
+
+@receiver([post_save, post_delete], sender=Household)
+def invalidate_household(sender, instance, **kwargs):
+    """Drop the per-user household cache entry when the household changes"""
+    forget_household(instance.user_id)
+
+
+# Household fields that decide its leaderboards and how it appears on them
+LEADERBOARD_FIELDS = ['name', 'city', 'state', 'family_size']
+
+
+@receiver(pre_save, sender=Household)
+def remember_leaderboard_fields(sender, instance, using, **kwargs):
+    instance._leaderboard_old = None
+    if instance.pk is not None:
+        instance._leaderboard_old = (
+            Household.objects.using(using).filter(pk=instance.pk).values(*LEADERBOARD_FIELDS).first()
+        )
+
+
+@receiver(post_save, sender=Household)
+def move_household_entries(sender, instance, created, using, raw=False, **kwargs):
+    """Re-place every month on the leaderboards after a move, rename or family size change"""
+    old = getattr(instance, '_leaderboard_old', None)
+    if raw or created or old is None:
+        return
+    if all(old[field] == getattr(instance, field) for field in LEADERBOARD_FIELDS):
+        return
+    footprints = CarbonFootprint.objects.using(using).filter(household=instance)
+    place_footprints(instance, footprints.values_list('month', 'total_footprint'))
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_user(sender, instance, **kwargs):
+    """Drop the cached user (logins, password and permission changes)"""
+    forget_user(instance.pk)
+
+
+@receiver(pre_delete, sender=User)
+def delete_sharded_household(sender, instance, **kwargs):
+    """Cascade a user's deletion to their household on its shard"""
+    alias = user_household_db(instance.pk)
+    if alias is not None:
+        Household.objects.using(alias).filter(user_id=instance.pk).delete()
+
+
+@receiver(post_delete, sender=Household)
+def delete_household_rows(sender, instance, using, **kwargs):
+    """Delete a sharded household's rows on the default database.
+
+    The ORM only cascades within the shard the household was deleted from.
+    """
+    if using == DEFAULT_DB_ALIAS:
+        return
+    for relation in Household._meta.related_objects:
+        if relation.many_to_many or is_sharded(relation.related_model):
+            continue
+        relation.related_model._base_manager.using(DEFAULT_DB_ALIAS).filter(
+            **{relation.field.name: instance.pk}
+        ).delete()
+    HouseholdDirectory.objects.filter(pk=instance.pk).delete()
+
+
+@receiver(pre_save, sender=EnergyUsage)
+@receiver(pre_save, sender=Transportation)
+@receiver(pre_save, sender=Diet)
+@receiver(pre_save, sender=Waste)
+def prepare_activity(sender, instance, raw=False, **kwargs):
+    """Normalise every activity row and score new ones before they are stored"""
+    if raw:
+        return
+    normalise_row(instance)
+    if instance._state.adding:
+        score_row(instance, instance.household)
+
+
+@receiver(pre_save, sender=CarbonFootprint)
+def remember_footprint(sender, instance, using, **kwargs):
+    """Keep the stored figures so post_save can roll up only the difference"""
+    instance._rollup_old = None
+    if instance.pk is not None:
+        instance._rollup_old = (
+            CarbonFootprint.objects.using(using).filter(pk=instance.pk).values(*ROLLUP_FIELDS).first()
+        )
+
+
+@receiver(post_save, sender=CarbonFootprint)
+def rollup_saved_footprint(sender, instance, raw=False, **kwargs):
+    """Apply an individually saved footprint (admin, shell) to organisation rollups"""
+    if raw:
+        return
+    organisations = household_organisations(instance.household_id)
+    apply_delta(organisations, instance.month, getattr(instance, '_rollup_old', None), figures(instance))
+
+
+@receiver(post_save, sender=CarbonFootprint)
+def publish_saved_footprint(sender, instance, raw=False, **kwargs):
+    """Send an individually saved footprint to the household's open dashboards"""
+    if raw:
+        return
+    record_events([instance])
+
+
+@receiver(post_save, sender=CarbonFootprint)
+def place_saved_footprint(sender, instance, raw=False, **kwargs):
+    """Put an individually saved footprint on the household's leaderboards"""
+    if raw:
+        return
+    place_footprints(instance.household, [(instance.month, instance.total_footprint)])
+
+
+@receiver(post_delete, sender=CarbonFootprint)
+def rollup_deleted_footprint(sender, instance, **kwargs):
+    organisations = household_organisations(instance.household_id)
+    apply_delta(organisations, instance.month, old=figures(instance))
+
+
+@receiver(post_delete, sender=CarbonFootprint)
+def remove_deleted_footprint(sender, instance, **kwargs):
+    """Take a deleted footprint off the leaderboards, including when its household is deleted"""
+    remove_footprints(instance.household_id, [instance.month])
+
+
+@receiver([post_save, post_delete], sender=OrganisationMember)
+def rollup_membership(sender, instance, created=None, raw=False, **kwargs):
+    """Add or remove a household's history where membership coverage changed"""
+    if raw or created is False:
+        return
+    # Deleting an organisation rebuilds all rollups once it is gone
+    origin = kwargs.get('origin')
+    if getattr(origin, 'model', type(origin)) is Organisation:
+        return
+    # Organisations still covering the household through another membership
+    # already count it.
+    remaining = household_organisations(instance.household_id, exclude=instance.pk)
+    changed = with_ancestors([instance.organisation_id], organisation_parents()) - remaining
+    apply_membership(instance.household_id, changed, 1 if created else -1)
+
+
+@receiver(pre_save, sender=Organisation)
+def remember_parent(sender, instance, **kwargs):
+    instance._old_parent_id = (
+        Organisation.objects.filter(pk=instance.pk).values_list('parent_id', flat=True).first()
+        if instance.pk is not None else None
+    )
+
+
+@receiver(post_save, sender=Organisation)
+@receiver(post_delete, sender=Organisation)
+def rebuild_moved_organisation(sender, instance, created=False, raw=False, **kwargs):
+    """Moving or deleting an organisation changes every ancestor's totals, so
+    recompute rather than patch; reorganisations are rare."""
+    if raw or created:
+        return
+    if kwargs.get('signal') is post_delete or instance.parent_id != getattr(instance, '_old_parent_id', None):
+        rebuild_rollups()
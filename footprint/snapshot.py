@@ -0,0 +1,226 @@
+import json
+import os
+import shutil
+import threading
+from datetime import datetime, timezone
+
+import numpy as np
+from django.conf import settings
+from django.db.models import FloatField, IntegerField
+from django.db.models.functions import Cast, ExtractMonth, ExtractYear
+
+from .forecasting import month_ordinal, ordinal_to_date
+from .models import CarbonFootprint, Household
+from .sharding import map_shards
+
+
+FORMAT_VERSION = 1
+
+CATEGORIES = ('total', 'energy', 'transport', 'diet', 'waste')
+
+# One 32-byte record per household-month, sorted by household then month
+RECORD_DTYPE = np.dtype(
+    [('household_id', '<i8'), ('month', '<i4')] + [(c, '<f4') for c in CATEGORIES]
+)
+
+# Sidecar index: one record per household pointing at its slice of records
+INDEX_DTYPE = np.dtype([
+    ('household_id', '<i8'),
+    ('start', '<i8'),
+    ('count', '<i4'),
+    ('state', '<i2'),
+    ('family_size', '<i2'),
+])
+
+RECORDS_FILE = 'footprints.bin'
+INDEX_FILE = 'footprints.idx'
+META_FILE = 'footprints.json'
+
+# Each build writes its files into a new subdirectory; this file names the
+# current one, so replacing it publishes a whole snapshot at once
+CURRENT_FILE = 'CURRENT'
+
+
+def snapshot_dir():
+    return os.fspath(settings.ANALYTICS_SNAPSHOT_DIR)
+
+
+def _write_atomic(path, data):
+    tmp = f'{path}.tmp'
+    with open(tmp, 'wb') as handle:
+        handle.write(data)
+    os.replace(tmp, path)
+
+
+def current_build(directory):
+    """Name of the build directory CURRENT points at, None before the first build"""
+    try:
+        with open(os.path.join(directory, CURRENT_FILE)) as handle:
+            return handle.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def build_snapshot(directory=None):
+    """Write every CarbonFootprint into the fixed-layout snapshot files.
+
+    Values are cast in SQL and streamed straight into a NumPy array (one
+    per shard, read in parallel). The records, sidecar index and metadata
+    go into a fresh build directory and CURRENT is then replaced to point
+    at it, so readers see either the old snapshot or the new one, never a
+    mix. Builds other than the new and the previous one are removed.
+    """
+    directory = directory or snapshot_dir()
+    os.makedirs(directory, exist_ok=True)
+
+    def load(alias):
+        rows = (
+            CarbonFootprint.objects
+            .order_by('household_id', 'month')
+            .annotate(
+                ordinal=Cast(ExtractYear('month') * 12 + ExtractMonth('month') - 1, IntegerField()),
+                **{f'{c}_value': Cast(f'{c}_footprint', FloatField()) for c in CATEGORIES},
+            )
+            .values_list('household_id', 'ordinal', *[f'{c}_value' for c in CATEGORIES])
+        )
+        records = np.fromiter(
+            (tuple(row) for row in rows.iterator(chunk_size=10000)), dtype=RECORD_DTYPE
+        )
+        households = {
+            household_id: (state, family_size)
+            for household_id, state, family_size in
+            Household.objects.values_list('id', 'state', 'family_size').iterator(chunk_size=10000)
+        }
+        return records, households
+
+    parts = map_shards(load)
+    records = np.concatenate([part[0] for part in parts])
+    households = {}
+    for _, part in parts:
+        households.update(part)
+    if len(parts) > 1:
+        # Each shard's rows are sorted; restore the global household order
+        records = records[np.argsort(records['household_id'], kind='stable')]
+
+    household_ids, starts, counts = np.unique(
+        records['household_id'], return_index=True, return_counts=True
+    )
+    states = sorted({households[h][0] for h in household_ids.tolist()})
+    state_index = {state: i for i, state in enumerate(states)}
+
+    index = np.zeros(len(household_ids), dtype=INDEX_DTYPE)
+    index['household_id'] = household_ids
+    index['start'] = starts
+    index['count'] = counts
+    index['state'] = [state_index[households[h][0]] for h in household_ids.tolist()]
+    index['family_size'] = [max(households[h][1], 1) for h in household_ids.tolist()]
+
+    meta = {
+        'version': FORMAT_VERSION,
+        'built_at': datetime.now(timezone.utc).isoformat(),
+        'records': int(len(records)),
+        'households': int(len(index)),
+        'states': states,
+    }
+    previous = current_build(directory)
+    build = 'build-' + datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%f')
+    os.makedirs(os.path.join(directory, build))
+    for name, data in (
+        (RECORDS_FILE, records.tobytes()),
+        (INDEX_FILE, index.tobytes()),
+        (META_FILE, json.dumps(meta).encode()),
+    ):
+        with open(os.path.join(directory, build, name), 'wb') as handle:
+            handle.write(data)
+    _write_atomic(os.path.join(directory, CURRENT_FILE), build.encode())
+
+    # Processes may still have the previous build mapped; older ones are unused
+    for name in os.listdir(directory):
+        if name.startswith('build-') and name not in (build, previous):
+            shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+    return meta
+
+
+class AnalyticsSnapshot:
+    """Read-only, memory-mapped view of the latest snapshot.
+
+    Arrays are np.memmap views over the files, so aggregates are computed
+    by NumPy directly on the page cache without copying the data or
+    touching the database.
+    """
+
+    _lock = threading.Lock()
+    _current = None
+
+    def __init__(self, directory):
+        with open(os.path.join(directory, META_FILE)) as handle:
+            self.meta = json.load(handle)
+        if self.meta['version'] != FORMAT_VERSION:
+            raise ValueError(f"Unsupported snapshot format {self.meta['version']}")
+        self.records = self._map(os.path.join(directory, RECORDS_FILE), RECORD_DTYPE)
+        self.index = self._map(os.path.join(directory, INDEX_FILE), INDEX_DTYPE)
+        self.states = self.meta['states']
+        # Position of each record's household in the index
+        self.household_row = np.repeat(np.arange(len(self.index)), self.index['count'])
+
+    @staticmethod
+    def _map(path, dtype):
+        if os.path.getsize(path) == 0:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode='r')
+
+    @classmethod
+    def load(cls, directory=None):
+        """Return the current snapshot, re-mapping it when a new one is built"""
+        directory = directory or snapshot_dir()
+        build = current_build(directory)
+        if build is None:
+            return None
+        with cls._lock:
+            current = cls._current
+            if current is None or current[0] != (directory, build):
+                cls._current = ((directory, build), cls(os.path.join(directory, build)))
+            return cls._current[1]
+
+    @property
+    def months(self):
+        """Sorted month ordinals present in the snapshot"""
+        return np.unique(self.records['month'])
+
+    def national_series(self):
+        """Per-month household count and mean kg CO2e per household and person"""
+        months, inverse = np.unique(self.records['month'], return_inverse=True)
+        households = np.bincount(inverse, minlength=len(months))
+        people = np.bincount(
+            inverse, weights=self.index['family_size'][self.household_row], minlength=len(months)
+        )
+        series = {
+            'months': [ordinal_to_date(int(m)).isoformat() for m in months],
+            'households': households.tolist(),
+        }
+        for category in CATEGORIES:
+            sums = np.bincount(inverse, weights=self.records[category], minlength=len(months))
+            series[f'{category}_per_household'] = (sums / households).round(2).tolist()
+        totals = np.bincount(inverse, weights=self.records['total'], minlength=len(months))
+        series['total_per_person'] = (totals / people).round(2).tolist()
+        return series
+
+    def state_breakdown(self, month):
+        """Mean kg CO2e per household and per person for each state in a month"""
+        selected = self.records['month'] == month_ordinal(month)
+        rows = self.household_row[selected]
+        state = self.index['state'][rows]
+        size = len(self.states)
+        households = np.bincount(state, minlength=size)
+        people = np.bincount(state, weights=self.index['family_size'][rows], minlength=size)
+        totals = np.bincount(state, weights=self.records['total'][selected], minlength=size)
+        result = []
+        for i, name in enumerate(self.states):
+            if households[i]:
+                result.append({
+                    'state': name,
+                    'households': int(households[i]),
+                    'per_household': round(float(totals[i] / households[i]), 2),
+                    'per_person': round(float(totals[i] / people[i]), 2),
+                })
+        return sorted(result, key=lambda row: row['per_person'])
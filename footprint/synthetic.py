@@ -0,0 +1,167 @@
+import random
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+
+from .models import (
+    Household, EnergyUsage, Transportation, Diet, Waste, CarbonFootprint, SustainabilityTip
+)
+from .leaderboards import place_footprints
+from .sharding import allocate_household_ids, household_db, use_shard
+from .utils import CarbonCalculator
+
+
+CITIES = [
+    ('Mumbai', 'Maharashtra'),
+    ('Pune', 'Maharashtra'),
+    ('Delhi', 'Delhi'),
+    ('Bengaluru', 'Karnataka'),
+    ('Chennai', 'Tamil Nadu'),
+    ('Kolkata', 'West Bengal'),
+    ('Ahmedabad', 'Gujarat'),
+    ('Jaipur', 'Rajasthan'),
+]
+
+# Words synthetic tips are made of: common words, then words of the tip's
+# category, then rarer filler words, drawn with Zipf-like frequencies
+TIP_WORDS = {
+    'energy': ['solar', 'electricity', 'bulb', 'fan', 'cooler', 'inverter', 'geyser', 'fridge', 'star', 'rating'],
+    'transport': ['bus', 'metro', 'auto', 'cycle', 'carpool', 'train', 'walk', 'petrol', 'cng', 'electric'],
+    'diet': ['millet', 'dal', 'rice', 'local', 'seasonal', 'vegetables', 'paneer', 'meat', 'cooking', 'leftovers'],
+    'waste': ['compost', 'segregate', 'plastic', 'recycle', 'kabadiwala', 'cloth', 'bag', 'bottle', 'steel', 'repair'],
+    'general': ['water', 'tree', 'rainwater', 'monsoon', 'festival', 'neighbours', 'society', 'habit', 'bill', 'save'],
+}
+COMMON_WORDS = ['the', 'your', 'to', 'and', 'use', 'switch', 'instead', 'home', 'family', 'every', 'week', 'less']
+SYLLABLES = ['ka', 'ri', 'mo', 'ta', 'na', 'shi', 'pa', 'la', 've', 'du', 'go', 'ra', 'bi', 'se', 'tho']
+
+
+def create_synthetic_tips(count, seed=0):
+    """Create tips with generated text, to size the tip search"""
+    rng = random.Random(seed)
+    filler = sorted({''.join(rng.choices(SYLLABLES, k=3)) for _ in range(3000)})
+    rng.shuffle(filler)
+    vocabularies = {
+        category: COMMON_WORDS + words + filler for category, words in TIP_WORDS.items()
+    }
+    weights = [1 / rank for rank in range(1, len(COMMON_WORDS) + 10 + len(filler) + 1)]
+    tips = []
+    for _ in range(count):
+        category = rng.choice(list(TIP_WORDS))
+        words = vocabularies[category]
+        tips.append(SustainabilityTip(
+            title=' '.join(rng.choices(words, weights, k=5)).capitalize(),
+            description=' '.join(rng.choices(words, weights, k=40)).capitalize() + '.',
+            category=category,
+            impact_kg_co2=_amount(rng, 1, 500),
+            indian_context=rng.random() < 0.9,
+        ))
+    return SustainabilityTip.objects.bulk_create(tips, batch_size=2000)
+
+
+def _amount(rng, low, high):
+    return Decimal(f'{rng.uniform(low, high):.2f}')
+
+
+def month_range(months, end=None):
+    """Return the first day of each of the last `months` months, oldest first"""
+    end = (end or date.today()).replace(day=1)
+    result = []
+    year, month = end.year, end.month
+    for _ in range(months):
+        result.append(date(year, month, 1))
+        month -= 1
+        if month == 0:
+            year, month = year - 1, 12
+    return result[::-1]
+
+
+def create_synthetic_households(count, months=12, prefix='synthetic', seed=0, password=None):
+    """Create households with a plausible activity history.
+
+    Used by the benchmark and load-test commands. Users can only log in
+    with ``password`` when one is given; otherwise their password is
+    unusable and callers log them in with ``force_login``. With sharding
+    on, each shard's households are written to that shard.
+    """
+    rng = random.Random(seed)
+    password = make_password(password)
+    users = User.objects.bulk_create([
+        User(username=f'{prefix}-{i}', password=password)
+        for i in range(count)
+    ])
+    households = []
+    for user in users:
+        city, state = rng.choice(CITIES)
+        households.append(Household(
+            user=user,
+            name=user.username,
+            address=f'{rng.randint(1, 999)} Main Road',
+            city=city,
+            state=state,
+            pincode=f'{rng.randint(110000, 799999)}',
+            family_size=rng.randint(1, 6),
+        ))
+    allocate_household_ids(households)
+    by_shard = defaultdict(list)
+    for household in households:
+        by_shard[household_db(household.pk)].append(household)
+    for alias, shard_households in by_shard.items():
+        with use_shard(alias):
+            _create_history(shard_households, months, rng)
+    return households
+
+
+def _create_history(households, months, rng):
+    """Store households with activity and footprint rows on the current database"""
+    households = Household.objects.bulk_create(households)
+
+    energy, transport, diet, waste = [], [], [], []
+    for household in households:
+        for month in month_range(months):
+            energy.append(EnergyUsage(
+                household=household, fuel_type='electricity',
+                consumption=_amount(rng, 80, 400), unit='kWh', month=month,
+            ))
+            energy.append(EnergyUsage(
+                household=household, fuel_type='lpg',
+                consumption=_amount(rng, 5, 20), unit='kg', month=month,
+            ))
+            transport.append(Transportation(
+                household=household,
+                vehicle_type=rng.choice(['car_petrol', 'bike_petrol', 'bus', 'metro']),
+                distance_km=_amount(rng, 5, 60),
+                frequency_per_week=rng.randint(1, 7), month=month,
+            ))
+            for food_type in ('rice', 'wheat', 'milk'):
+                diet.append(Diet(
+                    household=household, food_type=food_type,
+                    consumption_kg=_amount(rng, 2, 30), month=month,
+                ))
+            waste.append(Waste(
+                household=household, waste_type=rng.choice(['organic', 'plastic']),
+                quantity_kg=_amount(rng, 1, 25), month=month,
+            ))
+    EnergyUsage.objects.bulk_create(energy)
+    Transportation.objects.bulk_create(transport)
+    Diet.objects.bulk_create(diet)
+    Waste.objects.bulk_create(waste)
+
+    footprints = defaultdict(list)
+    for household in households:
+        for month in month_range(months):
+            data = CarbonCalculator.calculate_total_footprint(household, month)
+            footprints[household].append(CarbonFootprint(
+                household=household,
+                month=month,
+                total_footprint=data['total'],
+                energy_footprint=data['energy'],
+                transport_footprint=data['transport'],
+                diet_footprint=data['diet'],
+                waste_footprint=data['waste'],
+            ))
+    CarbonFootprint.objects.bulk_create([f for rows in footprints.values() for f in rows])
+    for household, rows in footprints.items():
+        place_footprints(household, [(f.month, f.total_footprint) for f in rows])
@@ -0,0 +1,720 @@
+import io
+import json
+import math
+import os
+import shutil
+import tempfile
+import threading
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.contrib.admin import site
+from django.contrib.auth import authenticate, get_user
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.db.models import Count
+from django.test import Client, RequestFactory, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .anomalies import ACTIVITIES, Sketch
+from .archive import pack, unpack
+from .apikeys import create_api_key
+from .backends import CachedModelBackend
+from .caching import household_cache_key, identity_cache_enabled, user_cache_key
+from . import live
+from .grid import grid_factors
+from .leaderboards import rank, rebuild_leaderboards
+from .management.commands.query_budget import BUDGETS, Command as QueryBudgetCommand
+from .metering import ingest_readings
+from .models import (
+    ActivityArchive, ActivitySketch, CarbonFootprint, EnergyUsage, FootprintEvent, GridFactor, Household,
+    LeaderboardEntry, LeaderboardNode, SustainabilityTip, Transportation, TripMonth,
+)
+from .replica import REPLICA, STICKY_COOKIE, refresh_replica
+from .scenarios import simulate
+from .search import search_tips
+from .sharding import ShardRoutingError, shard_aliases, shard_for
+from .snapshot import CURRENT_FILE, AnalyticsSnapshot, build_snapshot, current_build
+from .synthetic import CITIES, create_synthetic_households, month_range
+from .utils import CarbonCalculator, upsert_activities
+
+
+class ConcurrentUpsertTests(TransactionTestCase):
+    """Concurrent bulk entries and recalculations of one household-month.
+
+    Each thread has its own connection, so these need a test database on
+    disk (see DATABASES['default']['TEST'] in settings).
+    """
+
+    month = '2025-01'
+    threads = 8
+    iterations = 5
+
+    def setUp(self):
+        self.household = create_synthetic_households(1, months=0, prefix='stress')[0]
+
+    def client_for(self, household):
+        client = Client()
+        client.force_login(household.user)
+        return client
+
+    def bulk_entry(self, client, electricity_kwh=200, car_km=50):
+        return client.post(reverse('bulk_data_entry'), {
+            'month': self.month,
+            'electricity_kwh': electricity_kwh,
+            'lpg_kg': 14,
+            'car_km': car_km,
+            'rice_kg': 10,
+            'organic_waste_kg': 20,
+        })
+
+    def sketch_totals(self):
+        return dict(
+            ActivitySketch.objects.filter(activity='energy', item_type='electricity')
+            .values_list('state', 'total')
+        )
+
+    def test_concurrent_submissions_write_one_row_per_type(self):
+        errors = []
+
+        def worker(worker_id):
+            client = self.client_for(self.household)
+            try:
+                for i in range(self.iterations):
+                    response = self.bulk_entry(client, 200 + worker_id, 50 + i)
+                    if response.status_code != 302:
+                        errors.append(f'bulk entry returned {response.status_code}')
+                    response = client.get(reverse('calculate_footprint_month', args=[self.month]))
+                    if response.status_code != 200:
+                        errors.append(f'calculate returned {response.status_code}')
+            except Exception as exc:
+                errors.append(f'{type(exc).__name__}: {exc}')
+            finally:
+                connections.close_all()
+
+        workers = [threading.Thread(target=worker, args=(i,)) for i in range(self.threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        self.assertEqual(errors, [])
+
+        for model, (activity, type_field, _) in ACTIVITIES.items():
+            duplicates = (
+                model.objects.filter(household=self.household)
+                .values('month', type_field)
+                .annotate(rows=Count('id'))
+                .filter(rows__gt=1)
+            )
+            self.assertEqual(list(duplicates), [], activity)
+        self.assertEqual(CarbonFootprint.objects.filter(household=self.household).count(), 1)
+        # Every submission replaced the same row, so it is observed once
+        self.assertEqual(self.sketch_totals(), {'': 1, self.household.state: 1})
+
+    def test_resubmitting_a_month_replaces_its_sketch_observation(self):
+        client = self.client_for(self.household)
+        self.bulk_entry(client, electricity_kwh=200)
+        self.bulk_entry(client, electricity_kwh=2000)
+        self.assertEqual(self.sketch_totals(), {'': 1, self.household.state: 1})
+        sketch = ActivitySketch.objects.get(activity='energy', item_type='electricity', state='')
+        median, _ = Sketch(sketch.counts).median_mad()
+        self.assertAlmostEqual(median, math.log10(2000 / self.household.family_size), delta=Sketch.WIDTH)
+
+
+class SnapshotTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        create_synthetic_households(3, months=4, prefix='snapshot')
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def builds(self):
+        return sorted(name for name in os.listdir(self.directory) if name.startswith('build-'))
+
+    def test_build_publishes_a_new_directory_through_the_pointer(self):
+        self.assertIsNone(AnalyticsSnapshot.load(self.directory))
+        meta = build_snapshot(self.directory)
+        first = current_build(self.directory)
+        snapshot = AnalyticsSnapshot.load(self.directory)
+        self.assertEqual(meta['records'], 12)
+        self.assertEqual(len(snapshot.records), 12)
+
+        build_snapshot(self.directory)
+        second = current_build(self.directory)
+        self.assertNotEqual(first, second)
+        self.assertIsNot(AnalyticsSnapshot.load(self.directory), snapshot)
+        with open(os.path.join(self.directory, CURRENT_FILE)) as handle:
+            self.assertEqual(handle.read(), second)
+
+    def test_only_the_current_and_previous_builds_are_kept(self):
+        for _ in range(4):
+            build_snapshot(self.directory)
+        self.assertEqual(len(self.builds()), 2)
+        self.assertIn(current_build(self.directory), self.builds())
+
+
+class CachedModelBackendTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('asha', password='first-pass-1')
+        self.addCleanup(cache.clear)
+
+    def test_wrong_password_is_checked_once(self):
+        with self.assertNumQueries(1):
+            self.assertIsNone(authenticate(username='asha', password='wrong'))
+        self.assertEqual(authenticate(username='asha', password='first-pass-1'), self.user)
+
+    def test_sessions_logged_in_by_model_backend_stay_valid(self):
+        client = Client()
+        client.force_login(self.user, backend='django.contrib.auth.backends.ModelBackend')
+        request = RequestFactory().get('/')
+        request.session = client.session
+        self.assertEqual(get_user(request), self.user)
+
+    def test_per_process_cache_never_serves_users(self):
+        self.assertFalse(identity_cache_enabled())
+        CachedModelBackend().get_user(self.user.pk)
+        self.assertIsNone(cache.get(user_cache_key(self.user.pk)))
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertIsNone(CachedModelBackend().get_user(self.user.pk))
+
+    def test_shared_cache_serves_users_until_they_are_saved(self):
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location, ignore_errors=True)
+        shared = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location}}
+        with self.settings(CACHES=shared):
+            self.assertTrue(identity_cache_enabled())
+            backend = CachedModelBackend()
+            backend.get_user(self.user.pk)
+            with self.assertNumQueries(0):
+                self.assertEqual(backend.get_user(self.user.pk), self.user)
+            self.user.set_password('second-pass-2')
+            self.user.save()
+            self.assertIsNone(cache.get(user_cache_key(self.user.pk)))
+            self.assertTrue(backend.get_user(self.user.pk).check_password('second-pass-2'))
+
+
+class MeterIngestionTests(TestCase):
+
+    def setUp(self):
+        self.household = create_synthetic_households(1, months=0, prefix='meter')[0]
+        self.current, = month_range(1)
+        self.previous, _ = month_range(2)
+
+    def readings(self, month, kwh=0.5):
+        return [{'timestamp': f'{month.isoformat()}T{hour:02d}:00:00', 'kwh': kwh} for hour in range(24)]
+
+    def electricity(self, month):
+        return EnergyUsage.objects.get(household=self.household, month=month, fuel_type='electricity')
+
+    def sketch_total(self):
+        return sum(
+            ActivitySketch.objects.filter(activity='energy', item_type='electricity')
+            .values_list('total', flat=True)
+        )
+
+    def test_manual_electricity_is_not_overwritten(self):
+        upsert_activities(self.household, [EnergyUsage(
+            fuel_type='electricity', consumption=250, unit='kWh', month=self.previous,
+        )])
+        result = ingest_readings(self.household, self.readings(self.previous))
+        self.assertEqual(result['manual_months'], [self.previous.isoformat()])
+        row = self.electricity(self.previous)
+        self.assertEqual((row.consumption, row.source), (250, 'manual'))
+
+    def test_only_closed_months_are_scored(self):
+        ingest_readings(self.household, self.readings(self.current))
+        self.assertEqual(self.sketch_total(), 0)
+        self.assertIsNone(self.electricity(self.current).anomaly_score)
+
+        ingest_readings(self.household, self.readings(self.previous))
+        ingest_readings(self.household, self.readings(self.previous, kwh=0.75))
+        # National and state sketch, one observation each for the closed month
+        self.assertEqual(self.sketch_total(), 2)
+        row = self.electricity(self.previous)
+        self.assertEqual((row.consumption, row.source), (18, 'meter'))
+
+
+class ApiAuthTests(TestCase):
+    """JSON upload endpoints accept an API key without CSRF, and sessions with it"""
+
+    def setUp(self):
+        self.household = create_synthetic_households(1, months=0, prefix='device')[0]
+        self.client = Client(enforce_csrf_checks=True)
+        self.url = reverse('api_meter_readings')
+        self.body = json.dumps({'readings': [{'timestamp': '2025-03-01T00:15:00', 'kwh': 0.2}]})
+
+    def post(self, **headers):
+        return self.client.post(self.url, self.body, content_type='application/json', headers=headers)
+
+    def test_api_key_needs_no_csrf_token(self):
+        key = create_api_key(self.household.user, 'meter')
+        response = self.post(Authorization=f'Bearer {key}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['readings'], 1)
+
+    def test_unknown_or_inactive_keys_are_rejected(self):
+        self.assertEqual(self.post(Authorization='Bearer not-a-key').status_code, 401)
+        key = create_api_key(self.household.user, 'meter')
+        self.household.user.is_active = False
+        self.household.user.save()
+        self.assertEqual(self.post(Authorization=f'Bearer {key}').status_code, 401)
+
+    def test_trip_uploads_accept_api_keys(self):
+        key = create_api_key(self.household.user, 'phone')
+        body = json.dumps({'batch_id': 'phone-1', 'trips': [{'mode': 'bus', 'distance_km': 7.5, 'date': '2025-03-04'}]})
+        response = self.client.post(
+            reverse('api_trips'), body, content_type='application/json', headers={'Authorization': f'Bearer {key}'}
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_range_calculation_needs_a_key_or_the_csrf_header(self):
+        url = reverse('api_calculate_range')
+        body = json.dumps({'from': '2025-01', 'to': '2025-02'})
+        self.assertEqual(self.client.post(url, body, content_type='application/json').status_code, 401)
+        self.client.force_login(self.household.user)
+        self.assertEqual(self.client.post(url, body, content_type='application/json').status_code, 403)
+        key = create_api_key(self.household.user, 'script')
+        response = self.client.post(url, body, content_type='application/json', headers={'Authorization': f'Bearer {key}'})
+        self.assertEqual([month['month'] for month in response.json()['months']], ['2025-01', '2025-02'])
+
+    def test_sessions_still_need_the_csrf_header(self):
+        self.assertEqual(self.post().status_code, 401)
+        self.client.force_login(self.household.user)
+        self.assertEqual(self.post().status_code, 403)
+        self.client.get(reverse('bulk_data_entry'))
+        token = self.client.cookies['csrftoken'].value
+        self.assertEqual(self.post(**{'X-CSRFToken': token}).status_code, 200)
+
+
+class GridFactorTests(TestCase):
+
+    def test_changes_are_seen_without_any_cache_invalidation(self):
+        month = date(2025, 1, 1)
+        self.assertEqual(grid_factors().factor('Kerala', month), 0.82)
+        # bulk_create sends no signals, like a write from another process
+        GridFactor.objects.bulk_create([GridFactor(state='Kerala', month=month, factor='0.3100')])
+        self.assertEqual(grid_factors().factor('Kerala', month), 0.31)
+        GridFactor.objects.all().delete()
+        self.assertEqual(grid_factors().factor('Kerala', month), 0.82)
+
+
+class ArchiveTests(TestCase):
+    """Archived months must calculate as their live rows did"""
+
+    def setUp(self):
+        self.household = create_synthetic_households(1, months=28, prefix='archive')[0]
+        # Before the cutoff of the default --older-than, 24 months ago
+        self.months = month_range(28)[:3]
+
+    def footprints(self):
+        return {month: CarbonCalculator.calculate_total_footprint(self.household, month) for month in self.months}
+
+    def assertFootprintsEqual(self, first, second):
+        for month in self.months:
+            for part, value in first[month].items():
+                self.assertAlmostEqual(value, second[month][part], places=4, msg=f'{month} {part}')
+
+    def test_archiving_keeps_footprints_and_merges_late_rows(self):
+        live = self.footprints()
+        call_command('archive_activity', stdout=io.StringIO())
+        self.assertFalse(EnergyUsage.objects.filter(household=self.household, month__in=self.months).exists())
+        self.assertEqual(ActivityArchive.objects.filter(household=self.household).count(), len(self.months))
+        self.assertFootprintsEqual(self.footprints(), live)
+        self.assertFootprintsEqual(CarbonCalculator.calculate_footprints(self.household, self.months), live)
+
+        # A row entered late for an archived month is merged into its archive
+        month = self.months[0]
+        EnergyUsage.objects.create(
+            household=self.household, fuel_type='kerosene', consumption=3, unit='liter', month=month,
+        )
+        late = self.footprints()
+        self.assertNotEqual(late[month]['energy'], live[month]['energy'])
+        call_command('archive_activity', stdout=io.StringIO())
+        self.assertFalse(EnergyUsage.objects.filter(household=self.household, month=month).exists())
+        self.assertFootprintsEqual(self.footprints(), late)
+        archive = ActivityArchive.objects.get(household=self.household, month=month)
+        rows = unpack(archive.data, self.household, month)
+        self.assertEqual(sorted(row.fuel_type for row in rows[EnergyUsage]), ['electricity', 'kerosene', 'lpg'])
+
+    def test_archives_packed_with_other_choices_are_refused(self):
+        month = self.months[0]
+        rows = {EnergyUsage: list(EnergyUsage.objects.filter(household=self.household, month=month))}
+        blob = pack(rows)
+        # Version 1 archives have no layout and were packed with today's choices
+        version_1 = bytes([1]) + blob[9:]
+        self.assertEqual(
+            sorted((row.fuel_type, row.consumption) for row in unpack(version_1, self.household, month)[EnergyUsage]),
+            sorted((row.fuel_type, row.consumption) for row in rows[EnergyUsage]),
+        )
+        other_layout = blob[:1] + bytes(8) + blob[9:]
+        with self.assertRaisesMessage(ValueError, 'different activity choices'):
+            unpack(other_layout, self.household, month)
+
+
+class ScenarioTests(TestCase):
+    """The simulator's baseline must agree with the household's stored footprints"""
+
+    def setUp(self):
+        # A different grid factor every month, so averaging them matters
+        GridFactor.objects.bulk_create([
+            GridFactor(state=state, month=month, factor=f'{0.5 + i / 20:.4f}')
+            for state in {state for _, state in CITIES}
+            for i, month in enumerate(month_range(12))
+        ])
+        self.household = create_synthetic_households(1, months=12, prefix='scenario')[0]
+
+    def stored(self, field):
+        return float(sum(CarbonFootprint.objects.filter(household=self.household).values_list(field, flat=True)))
+
+    def test_baseline_matches_stored_footprints(self):
+        baseline = simulate(self.household)['baseline']
+        self.assertAlmostEqual(baseline['energy'], self.stored('energy_footprint'), delta=0.1)
+
+    def test_logged_trips_replace_the_weekly_estimate(self):
+        months = month_range(12)
+        estimated = Transportation.objects.get(household=self.household, month=months[-1]).vehicle_type
+        TripMonth.objects.bulk_create([
+            TripMonth(household=self.household, month=months[-1], vehicle_type=estimated, distance_km=40, trips=4),
+            TripMonth(household=self.household, month=months[-2], vehicle_type='metro', distance_km=300, trips=20),
+        ])
+        calculated = sum(CarbonCalculator.calculate_transport_footprint(self.household, month) for month in months)
+        self.assertAlmostEqual(simulate(self.household)['baseline']['transport'], float(calculated), delta=0.01)
+
+    def test_api_limit_is_clamped(self):
+        client = Client()
+        client.force_login(self.household.user)
+        for limit, listed in [('-3', 0), ('0', 0), ('2', 2)]:
+            with self.subTest(limit=limit):
+                response = client.get(reverse('api_scenarios'), {'limit': limit})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.json()['suggestions']), listed)
+
+
+class LeaderboardTests(TestCase):
+    """Ranks read off the Fenwick trees must match counting everyone ahead"""
+
+    def setUp(self):
+        self.households = create_synthetic_households(12, months=2, prefix='board')
+        self.month = month_range(1)[0]
+
+    def assert_ranks_match_counts(self):
+        for entry in LeaderboardEntry.objects.all():
+            board = LeaderboardEntry.objects.filter(scope=entry.scope, region=entry.region, month=entry.month)
+            expected = (board.filter(per_person__lt=entry.per_person).count() + 1, board.count(), entry.per_person)
+            self.assertEqual(rank(entry.household_id, entry.scope, entry.month), expected)
+
+    def boards(self):
+        """Entries and non-empty tree nodes, to compare with a rebuild"""
+        entries = set(LeaderboardEntry.objects.values_list(
+            'scope', 'region', 'month', 'household_id', 'name', 'per_person', 'bucket'
+        ))
+        nodes = set(LeaderboardNode.objects.filter(count__gt=0).values_list(
+            'scope', 'region', 'month', 'node', 'count'
+        ))
+        return entries, nodes
+
+    def test_ranks_follow_saves_moves_and_deletes(self):
+        saved, moved, grown, deleted, gone = self.households[:5]
+        footprint = CarbonFootprint.objects.get(household=saved, month=self.month)
+        footprint.total_footprint *= 3
+        footprint.save()
+        moved.city, moved.state = 'Nagpur', 'Maharashtra'
+        moved.save()
+        grown.family_size = grown.family_size % 6 + 1
+        grown.save()
+        CarbonFootprint.objects.filter(household=deleted, month=self.month).delete()
+        gone.user.delete()
+
+        self.assertFalse(LeaderboardEntry.objects.filter(household_id=gone.pk).exists())
+        self.assertEqual(LeaderboardEntry.objects.filter(household_id=moved.pk, region='Nagpur').count(), 2)
+        self.assert_ranks_match_counts()
+
+        boards = self.boards()
+        rebuild_leaderboards()
+        self.assertEqual(self.boards(), boards)
+        self.assert_ranks_match_counts()
+
+    def test_api_limit_is_clamped(self):
+        client = Client()
+        client.force_login(self.households[0].user)
+        for limit, listed in [('-3', 0), ('0', 0), ('5', 5), ('1000', 12)]:
+            with self.subTest(limit=limit):
+                response = client.get(reverse('api_leaderboard'), {'limit': limit})
+                self.assertEqual(response.status_code, 200)
+                state_board = response.json()['boards'][1]
+                self.assertEqual(len(state_board['top']), min(listed, state_board['households']))
+        self.assertEqual(client.get(reverse('api_leaderboard'), {'limit': 'ten'}).status_code, 400)
+
+
+class TipSearchTests(TestCase):
+    """Search runs on the FTS5 index the migrations build, kept in sync by triggers"""
+
+    def tip(self, title, category='energy', impact=10):
+        return SustainabilityTip.objects.create(
+            title=title, description='Worth doing this year.', category=category, impact_kg_co2=impact,
+        )
+
+    def test_index_follows_inserts_updates_and_deletes(self):
+        tip = self.tip('Switch to LED bulbs')
+        self.assertEqual(search_tips('led bulb'), [tip])
+
+        SustainabilityTip.objects.filter(pk=tip.pk).update(title='Insulate the geyser')
+        self.assertEqual(search_tips('led'), [])
+        self.assertEqual(search_tips('geyser'), [tip])
+
+        SustainabilityTip.objects.filter(pk=tip.pk).delete()
+        self.assertEqual(search_tips('geyser'), [])
+
+    def test_category_and_minimum_impact_filters(self):
+        heater = self.tip('Solar water heater', 'energy', 200)
+        lamp = self.tip('Solar garden lamp', 'energy', 5)
+        rickshaw = self.tip('Solar rickshaw rides', 'transport', 50)
+
+        self.assertCountEqual(search_tips('solar'), [heater, lamp, rickshaw])
+        self.assertCountEqual(search_tips('solar', category='energy'), [heater, lamp])
+        self.assertCountEqual(search_tips('solar', min_impact=40), [heater, rickshaw])
+        self.assertEqual(search_tips('solar', category='transport', min_impact=100), [])
+
+    def test_search_syntax_in_user_input_is_searched_literally(self):
+        self.tip('Not every bus is crowded', 'transport')
+        for query in ['NOT OR "', '"', '*', 'title:', 'bus AND (', "bus* -", 'NEAR(bus']:
+            with self.subTest(query=query):
+                search_tips(query)
+                search_tips(query, category='en"ergy')
+        self.assertEqual(len(search_tips('NOT OR "')), 1)
+
+
+class QueryBudgetTests(TestCase):
+    """The pages checked by ``manage.py query_budget``, run as tests"""
+
+    @classmethod
+    def setUpTestData(cls):
+        command = QueryBudgetCommand()
+        command.seed({'households': 3, 'months': 12})
+        cls.household = command.household
+        cls.pages = list(command.pages())
+
+    def setUp(self):
+        self.addCleanup(cache.clear)
+
+    def test_pages_render_within_their_budgets(self):
+        for label, budget, user, method, path, data in self.pages:
+            with self.subTest(label):
+                client = Client()
+                client.force_login(user)
+                cache.clear()
+                with CaptureQueriesContext(connection) as queries:
+                    response = getattr(client, method)(path, data)
+                self.assertLess(response.status_code, 400)
+                self.assertLessEqual(len(queries), budget, '\n'.join(q['sql'] for q in queries.captured_queries))
+
+    def test_reports_runs_a_fixed_number_of_queries(self):
+        client = Client()
+        client.force_login(self.household.user)
+        with self.assertNumQueries(BUDGETS['reports']):
+            response = client.get(reverse('reports'))
+        self.assertTemplateUsed(response, 'footprint/reports.html')
+        self.assertEqual(len(response.context['footprints']), 12)
+
+
+class ReadReplicaTests(TransactionTestCase):
+    """Replica routing against a real copy of the test database.
+
+    Runs outside a transaction, which would keep every read on the primary,
+    and adds the replica to the database settings for each test.
+    """
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        # settings.DATABASES is the dict the connection handler reads aliases
+        # from, already filled in with defaults for the test database
+        settings.DATABASES[REPLICA] = {
+            **settings.DATABASES[DEFAULT_DB_ALIAS], 'NAME': os.path.join(directory, 'replica.sqlite3'),
+        }
+        self.addCleanup(self.remove_replica)
+        routers = self.settings(DATABASE_ROUTERS=['footprint.replica.ReplicaRouter'])
+        routers.enable()
+        self.addCleanup(routers.disable)
+
+        self.household = create_synthetic_households(1, months=2, prefix='replica')[0]
+        self.client.force_login(self.household.user)
+        refresh_replica()
+
+    def remove_replica(self):
+        connections[REPLICA].close()
+        del connections[REPLICA]
+        del settings.DATABASES[REPLICA]
+
+    def chart_months(self):
+        return len(self.client.get(reverse('api_footprint_data')).json()['labels'])
+
+    def test_reads_use_the_replica_until_the_client_writes(self):
+        CarbonFootprint.objects.filter(household=self.household).delete()
+        self.assertEqual(self.chart_months(), 2)
+        self.assertNotIn(STICKY_COOKIE, self.client.cookies)
+
+        response = self.client.post(reverse('bulk_data_entry'), {'month': '2025-01', 'electricity_kwh': 200})
+        self.assertEqual(response.status_code, 302)
+        self.assertIn(STICKY_COOKIE, response.cookies)
+        primary = CarbonFootprint.objects.filter(household=self.household).count()
+        self.assertEqual(self.chart_months(), primary)
+
+    def test_household_is_read_on_the_primary(self):
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location, ignore_errors=True)
+        shared = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location}}
+        Household.objects.filter(pk=self.household.pk).update(name='Renamed')
+        with self.settings(CACHES=shared):
+            response = self.client.get(reverse('reports'))
+            self.assertEqual(response.context['household'].name, 'Renamed')
+            self.assertEqual(cache.get(household_cache_key(self.household.user_id)).name, 'Renamed')
+
+    def test_refresh_copies_committed_rows(self):
+        create_synthetic_households(1, months=0, prefix='later')
+        self.assertEqual(Household.objects.using(REPLICA).count(), 1)
+        # Connections keep reading the file they opened
+        connections[REPLICA].close()
+        refresh_replica()
+        self.assertEqual(Household.objects.using(REPLICA).count(), 2)
+        self.assertEqual(Household.objects.using(DEFAULT_DB_ALIAS).count(), 2)
+
+
+class ShardingTests(TransactionTestCase):
+    """Households spread over two SQLite shard files.
+
+    The shards are added to the database settings for each test and
+    created with ``manage.py shard_households``.
+    """
+
+    shards = 2
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        overrides = self.settings(
+            DATABASE_SHARDS=self.shards,
+            DATABASE_SHARD_DIR=directory,
+            DATABASE_ROUTERS=['footprint.sharding.ShardRouter', 'footprint.replica.ReplicaRouter'],
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        for alias in shard_aliases():
+            # Filled in with defaults like the test database, see ReadReplicaTests
+            settings.DATABASES[alias] = {
+                **settings.DATABASES[DEFAULT_DB_ALIAS], 'NAME': os.path.join(directory, f'{alias}.sqlite3'),
+            }
+            self.addCleanup(self.remove_shard, alias)
+        call_command('shard_households', stdout=io.StringIO())
+
+    def remove_shard(self, alias):
+        connections[alias].close()
+        del connections[alias]
+        del settings.DATABASES[alias]
+
+    def create_household(self, user):
+        return Household.objects.create(
+            user=user, name=user.username, address='1 Main Road', city='Pune',
+            state='Maharashtra', pincode='411001',
+        )
+
+    def test_households_created_outside_requests_go_to_their_shard(self):
+        household = self.create_household(User.objects.create_user('owner'))
+        self.assertEqual(household._state.db, shard_for(household.pk))
+        self.assertTrue(Household.objects.using(shard_for(household.pk)).filter(pk=household.pk).exists())
+        self.assertFalse(Household.objects.using(DEFAULT_DB_ALIAS).exists())
+
+    def test_writes_without_a_household_raise(self):
+        with self.assertRaises(ShardRoutingError):
+            CarbonFootprint.objects.filter(month=date(2025, 1, 1)).delete()
+        with self.assertRaises(ShardRoutingError):
+            EnergyUsage.objects.update(source='meter')
+
+    def test_household_views_use_the_users_shard(self):
+        households = create_synthetic_households(4, months=2, prefix='sharded')
+        household = households[-1]
+        alias = shard_for(household.pk)
+        self.client.force_login(household.user)
+        response = self.client.post(reverse('bulk_data_entry'), {'month': '2025-01', 'electricity_kwh': 200})
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(
+            EnergyUsage.objects.using(alias).filter(household_id=household.pk, month=date(2025, 1, 1)).exists()
+        )
+        response = self.client.get(reverse('reports'))
+        self.assertEqual(len(response.context['footprints']), 2)
+
+        # Live events are stored beside the footprints and read from there
+        self.client.get(reverse('calculate_footprint_month', args=['2025-01']))
+        self.assertTrue(FootprintEvent.objects.using(alias).filter(household_id=household.pk).exists())
+        self.assertFalse(FootprintEvent.objects.using(DEFAULT_DB_ALIAS).exists())
+        self.assertIn('event: footprint', live.poll_events(household.pk, 0))
+        self.assertEqual(
+            [event['household_id'] for _, event in live.new_events(dict.fromkeys(shard_aliases(), 0))],
+            [household.pk],
+        )
+
+    def test_admin_lists_one_shard_at_a_time(self):
+        admin = User.objects.create_superuser('shard-admin', 'admin@example.com', 'admin-pass-1')
+        # A household of its own used to send every admin query to its shard
+        self.create_household(admin)
+        create_synthetic_households(6, months=1, prefix='listed')
+        self.client.force_login(admin)
+        url = reverse('admin:footprint_household_changelist')
+        for alias in shard_aliases():
+            response = self.client.get(url, {'shard': alias})
+            listed = {household.pk for household in response.context['cl'].result_list}
+            self.assertEqual(listed, set(Household.objects.using(alias).values_list('pk', flat=True)))
+            household = Household.objects.using(alias).first()
+            response = self.client.get(
+                reverse('admin:footprint_household_change', args=[household.pk]),
+                {'_changelist_filters': f'shard={alias}'},
+            )
+            self.assertEqual(response.status_code, 200)
+
+        response = self.client.get(reverse('admin:footprint_carbonfootprint_changelist'), {'shard': 'shard_1'})
+        self.assertEqual(response.context['cl'].result_count, CarbonFootprint.objects.using('shard_1').count())
+
+    def test_every_admin_changelist_renders(self):
+        admin = User.objects.create_superuser('shard-admin', 'admin@example.com', 'admin-pass-1')
+        create_synthetic_households(4, months=1, prefix='listed')
+        self.client.force_login(admin)
+        for model in site._registry:
+            opts = model._meta
+            with self.subTest(opts.label):
+                response = self.client.get(reverse(f'admin:{opts.app_label}_{opts.model_name}_changelist'), {'q': 'listed'})
+                self.assertEqual(response.status_code, 200)
+
+
+class LiveEventTests(TestCase):
+
+    def setUp(self):
+        self.household = create_synthetic_households(1, months=1, prefix='live')[0]
+        self.footprint = CarbonFootprint.objects.get(household=self.household)
+        live._pruned.clear()
+        self.addCleanup(live._pruned.clear)
+
+    def expired_event(self):
+        live.record_events([self.footprint])
+        event = FootprintEvent.objects.latest('pk')
+        retention = timedelta(seconds=settings.LIVE_EVENT_RETENTION_SECONDS + 1)
+        FootprintEvent.objects.filter(pk=event.pk).update(created_at=timezone.now() - retention)
+        return event
+
+    def test_recording_prunes_expired_events_once_a_minute(self):
+        expired = self.expired_event()
+        live._pruned.clear()
+        live.record_events([self.footprint])
+        self.assertFalse(FootprintEvent.objects.filter(pk=expired.pk).exists())
+
+        expired = self.expired_event()
+        with self.assertNumQueries(1):
+            live.record_events([self.footprint])
+        self.assertTrue(FootprintEvent.objects.filter(pk=expired.pk).exists())
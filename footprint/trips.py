@@ -0,0 +1,94 @@
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal, InvalidOperation
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Transportation, TripBatch, TripMonth
+from .units import first_of_month
+
+
+# Largest batch accepted in one request
+MAX_TRIPS = 5000
+
+# Longest single trip accepted, in km
+MAX_TRIP_KM = Decimal('5000')
+
+VEHICLE_TYPES = {key for key, _ in Transportation.VEHICLE_CHOICES}
+
+
+class TripError(ValueError):
+    """A batch of trips could not be accepted"""
+
+
+def parse_trips(trips):
+    """Sum a batch of trips into {(month, vehicle_type): (km, count)}.
+
+    Each trip is ``{"mode": vehicle type, "distance_km": number, "date": "YYYY-MM-DD"}``.
+    """
+    if not isinstance(trips, list) or not trips:
+        raise TripError('trips must be a non-empty list.')
+    if len(trips) > MAX_TRIPS:
+        raise TripError(f'At most {MAX_TRIPS} trips per request.')
+
+    totals = defaultdict(lambda: [Decimal('0'), 0])
+    for i, trip in enumerate(trips):
+        try:
+            mode = trip['mode']
+            distance = Decimal(str(trip['distance_km']))
+            day = date.fromisoformat(trip['date'])
+        except (KeyError, TypeError, ValueError, InvalidOperation):
+            raise TripError(f'Trip {i} needs a mode, a numeric distance_km and a YYYY-MM-DD date.')
+        if mode not in VEHICLE_TYPES:
+            raise TripError(f"Trip {i}: unknown mode '{mode}'.")
+        if not 0 < distance <= MAX_TRIP_KM:
+            raise TripError(f'Trip {i}: distance_km must be between 0 and {MAX_TRIP_KM}.')
+        total = totals[(first_of_month(day), mode)]
+        total[0] += distance.quantize(Decimal('0.01'))
+        total[1] += 1
+    return totals
+
+
+def ingest_trips(household, trips, batch_id=None):
+    """Add a batch of trips to the per-month, per-vehicle totals.
+
+    The batch is summed in memory first, so each upload costs one
+    increment per (month, vehicle) it touches however many trips it holds.
+    A repeated ``batch_id`` is acknowledged without being counted again.
+    """
+    totals = parse_trips(trips)
+
+    with transaction.atomic():
+        # Insert before reading anything: SQLite cannot upgrade a read
+        # transaction to a write one while another writer is busy.
+        if batch_id:
+            try:
+                with transaction.atomic():
+                    TripBatch.objects.create(
+                        household=household, batch_id=str(batch_id)[:64], trips=len(trips),
+                    )
+            except IntegrityError:
+                return {'trips': 0, 'duplicate': True, 'months': []}
+
+        TripMonth.objects.bulk_create(
+            [
+                TripMonth(household=household, month=month, vehicle_type=mode)
+                for month, mode in totals
+            ],
+            ignore_conflicts=True,
+        )
+        now = timezone.now()
+        for (month, mode), (distance, count) in totals.items():
+            TripMonth.objects.filter(household=household, month=month, vehicle_type=mode).update(
+                distance_km=F('distance_km') + distance,
+                trips=F('trips') + count,
+                updated_at=now,
+            )
+
+    return {
+        'trips': len(trips),
+        'duplicate': False,
+        'months': sorted({month.isoformat() for month, _ in totals}),
+    }
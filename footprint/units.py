@@ -0,0 +1,84 @@
+from datetime import date, datetime
+from decimal import Decimal
+
+
+# Unit each fuel's emission factor is quoted in; stored quantities use it
+CANONICAL_UNITS = {
+    'electricity': 'kWh',
+    'lpg': 'kg',
+    'kerosene': 'liter',
+    'biogas': 'm3',
+    'firewood': 'kg',
+    'charcoal': 'kg',
+}
+
+ENERGY = {'kwh': 1, 'unit': 1, 'units': 1, 'wh': '0.001', 'mwh': 1000}
+MASS = {'kg': 1, 'kgs': 1, 'g': '0.001', 'gram': '0.001', 'quintal': 100, 'tonne': 1000, 't': 1000}
+LIQUID = {'liter': 1, 'litre': 1, 'l': 1, 'ml': '0.001'}
+GAS = {'m3': 1, 'cubicmeter': 1, 'cubicmetre': 1, 'cum': 1}
+
+# Multiplier from every accepted spelling to the canonical unit, per fuel.
+# A domestic LPG cylinder holds 14.2 kg.
+CONVERSIONS = {
+    fuel: {alias: Decimal(str(factor)) for alias, factor in table.items()}
+    for fuel, table in {
+        'electricity': ENERGY,
+        'lpg': {**MASS, 'cylinder': '14.2', 'cylinders': '14.2'},
+        'kerosene': LIQUID,
+        'biogas': GAS,
+        'firewood': MASS,
+        'charcoal': MASS,
+    }.items()
+}
+
+
+class UnitError(ValueError):
+    """A quantity was given in a unit that cannot be converted"""
+
+
+def unit_key(unit):
+    """Spelling-insensitive lookup key for a unit, e.g. 'm³' -> 'm3'"""
+    return (unit or '').strip().lower().replace(' ', '').replace('.', '').replace('³', '3')
+
+
+def to_canonical(fuel_type, quantity, unit):
+    """Convert a fuel quantity to its canonical unit, returning (quantity, unit).
+
+    A blank unit is taken to be the canonical one already.
+    """
+    canonical = CANONICAL_UNITS[fuel_type]
+    key = unit_key(unit)
+    if not key:
+        return Decimal(str(quantity)), canonical
+    factor = CONVERSIONS[fuel_type].get(key)
+    if factor is None:
+        raise UnitError(f"Unknown unit '{unit}' for {fuel_type}; use {canonical}.")
+    return (Decimal(str(quantity)) * factor).quantize(Decimal('0.01')), canonical
+
+
+def first_of_month(value):
+    """Truncate a date (or datetime) to the first day of its month"""
+    if isinstance(value, datetime):
+        value = value.date()
+    if isinstance(value, date):
+        return value.replace(day=1)
+    return value
+
+
+def months_between(start, end):
+    """First day of every month from ``start`` to ``end`` inclusive"""
+    months = []
+    year, month = start.year, start.month
+    while (year, month) <= (end.year, end.month):
+        months.append(date(year, month, 1))
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
+
+def normalise_row(row):
+    """Store an activity row the way aggregation expects: month on day 1 and,
+    for energy, the quantity in the fuel's canonical unit"""
+    row.month = first_of_month(row.month)
+    if hasattr(row, 'unit') and row.fuel_type in CANONICAL_UNITS:
+        row.consumption, row.unit = to_canonical(row.fuel_type, row.consumption, row.unit)
+    return row
@@ -12,9 +12,25 @@ urlpatterns = [
     path('add-waste/', views.add_waste_data, name='add_waste_data'),
     path('bulk-entry/', views.bulk_data_entry, name='bulk_data_entry'),
     path('calculate/', views.calculate_footprint, name='calculate_footprint'),
+    path('calculate/range/', views.calculate_range, name='calculate_range'),
     path('calculate/<str:month>/', views.calculate_footprint, name='calculate_footprint_month'),
     path('tips/', views.tips, name='tips'),
     path('reports/', views.reports, name='reports'),
+    path('scenarios/', views.scenarios, name='scenarios'),
+    path('leaderboard/', views.leaderboard, name='leaderboard'),
+    path('analytics/', views.analytics, name='analytics'),
+    path('organisations/', views.organisations, name='organisations'),
+    path('organisations/<int:pk>/', views.organisation_dashboard, name='organisation_dashboard'),
     path('api/footprint-data/', views.api_footprint_data, name='api_footprint_data'),
+    path('api/footprint-stream/', views.api_footprint_stream, name='api_footprint_stream'),
+    path('api/scenarios/', views.api_scenarios, name='api_scenarios'),
+    path('api/analytics/', views.api_analytics, name='api_analytics'),
+    path('api/meter-readings/', views.api_meter_readings, name='api_meter_readings'),
+    path('api/trips/', views.api_trips, name='api_trips'),
+    path('api/calculate/', views.api_calculate_range, name='api_calculate_range'),
+    path('api/load-profile/', views.api_load_profile, name='api_load_profile'),
+    path('api/leaderboard/', views.api_leaderboard, name='api_leaderboard'),
+    path('api/tips/search/', views.api_tip_search, name='api_tip_search'),
+    path('api/organisations/<int:pk>/rollups/', views.api_organisation_rollups, name='api_organisation_rollups'),
     path('setup-sample-data/', views.setup_sample_data, name='setup_sample_data'),
 ] 
\ No newline at end of file
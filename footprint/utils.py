@@ -1,6 +1,19 @@
+from collections import defaultdict
 from decimal import Decimal
 from datetime import date
-from .models import EnergyUsage, Transportation, Diet, Waste, CarbonFootprint
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, Sum, Value, When
+from .models import (
+    EnergyUsage, Transportation, Diet, Waste, CarbonFootprint, ActivityArchive, TripMonth
+)
+from .anomalies import ACTIVITIES, score_rows
+from .leaderboards import place_footprints
+from .live import record_events
+from .units import normalise_row
+from .rollups import (
+    FIELDS as ROLLUP_FIELDS, apply_delta, ensure_rollups, figures, household_organisations
+)
+from .sharding import household_db
 
 
 class CarbonCalculator:
@@ -16,6 +29,17 @@ class CarbonCalculator:
         'charcoal': 2.93,    # kg CO2e per kg
     }
     
+    # Weekly trips to a monthly figure
+    WEEKS_PER_MONTH = Decimal('4.33')
+    
+    # Monthly quantity of an activity row, in SQL
+    MONTHLY_QUANTITY = {
+        EnergyUsage: F('consumption'),
+        Transportation: F('distance_km') * F('frequency_per_week') * Value(WEEKS_PER_MONTH),
+        Diet: F('consumption_kg'),
+        Waste: F('quantity_kg'),
+    }
+    
     TRANSPORT_EMISSION_FACTORS = {
         'car_petrol': 0.2,      # kg CO2e per km
         'car_diesel': 0.18,     # kg CO2e per km
@@ -55,78 +79,128 @@ class CarbonCalculator:
     }
     
     @classmethod
-    def calculate_energy_footprint(cls, household, month):
-        """Calculate energy-related carbon footprint"""
-        energy_usage = EnergyUsage.objects.filter(
-            household=household, 
-            month=month
+    def archived_rows(cls, household, month):
+        """Activity rows packed into the archive for a closed month, by model"""
+        archive = (
+            ActivityArchive.objects.using(household_db(household.id))
+            .filter(household=household, month=month).first()
         )
-        
-        total_footprint = Decimal('0.0')
-        for usage in energy_usage:
-            factor = cls.ENERGY_EMISSION_FACTORS.get(usage.fuel_type, 0)
-            footprint = usage.consumption * Decimal(str(factor))
-            total_footprint += footprint
-            
-        return total_footprint
+        if not archive:
+            return {}
+        # Only closed months need the NumPy-backed decoder
+        from .archive import unpack
+        return unpack(archive.data, household, month)
+    
+    @classmethod
+    def factor_sum(cls, queryset, type_field, factors, quantity):
+        """SUM(quantity x emission factor) over a queryset, computed in SQL"""
+        return queryset.aggregate(total=Sum(Case(
+            *[
+                When(**{type_field: key}, then=quantity * Value(Decimal(str(factor))))
+                for key, factor in factors.items()
+            ],
+            default=Value(Decimal('0')),
+            output_field=DecimalField(max_digits=20, decimal_places=6),
+        )))['total'] or Decimal('0.0')
+    
+    @classmethod
+    def activity_footprint(cls, model, household, month, archived, factors, quantity, exclude=None):
+        """Sum of quantity x emission factor for one activity table.
+
+        Stored quantities are normalised at write time, so live rows are
+        summed by a single SQL aggregate; only archived rows of types with
+        no live row are added in Python. Types listed in ``exclude`` are
+        left out entirely.
+        """
+        _, type_field, row_quantity = ACTIVITIES[model]
+        queryset = model.objects.using(household_db(household.id)).filter(household=household, month=month)
+        if exclude:
+            queryset = queryset.exclude(**{f'{type_field}__in': exclude})
+        total = cls.factor_sum(queryset, type_field, factors, quantity)
+
+        if archived and archived.get(model):
+            skip = set(queryset.values_list(type_field, flat=True))
+            if exclude:
+                skip.update(exclude)
+            for row in archived[model]:
+                if getattr(row, type_field) not in skip:
+                    total += row_quantity(row) * cls.quantity_multiplier(model) * Decimal(
+                        str(factors.get(getattr(row, type_field), 0))
+                    )
+        return total
+    
+    @classmethod
+    def quantity_multiplier(cls, model):
+        """Scale from a row's stored quantity to its monthly quantity"""
+        return cls.WEEKS_PER_MONTH if model is Transportation else 1
     
     @classmethod
-    def calculate_transport_footprint(cls, household, month):
-        """Calculate transportation-related carbon footprint"""
-        transport_data = Transportation.objects.filter(
-            household=household, 
-            month=month
+    def calculate_energy_footprint(cls, household, month, archived=None):
+        """Calculate energy-related carbon footprint.
+
+        Electricity uses the household's state grid factor for the month.
+        """
+        from .grid import grid_factors
+        factors = {
+            **cls.ENERGY_EMISSION_FACTORS,
+            'electricity': grid_factors().factor(household.state, month),
+        }
+        return cls.activity_footprint(
+            EnergyUsage, household, month, archived, factors, F('consumption'),
         )
-        
-        total_footprint = Decimal('0.0')
-        for transport in transport_data:
-            factor = cls.TRANSPORT_EMISSION_FACTORS.get(transport.vehicle_type, 0)
-            # Calculate monthly distance
-            monthly_distance = transport.distance_km * transport.frequency_per_week * 4.33
-            footprint = monthly_distance * Decimal(str(factor))
-            total_footprint += footprint
-            
-        return total_footprint
     
     @classmethod
-    def calculate_diet_footprint(cls, household, month):
+    def calculate_transport_footprint(cls, household, month, archived=None):
+        """Calculate transportation-related carbon footprint.
+
+        Vehicles with logged trips count their logged distance; the weekly
+        estimate only applies to vehicles with no trips that month.
+        """
+        # Trip totals are on the default database and Transportation may be
+        # on a shard, so they are read first rather than as a subquery
+        trips = dict(
+            TripMonth.objects.filter(household=household, month=month)
+            .values_list('vehicle_type', 'distance_km')
+        )
+        logged = sum(
+            (
+                distance * Decimal(str(cls.TRANSPORT_EMISSION_FACTORS.get(vehicle, 0)))
+                for vehicle, distance in trips.items()
+            ),
+            Decimal('0.0'),
+        )
+        # Monthly distance from the weekly estimate
+        return logged + cls.activity_footprint(
+            Transportation, household, month, archived,
+            cls.TRANSPORT_EMISSION_FACTORS,
+            F('distance_km') * F('frequency_per_week') * Value(cls.WEEKS_PER_MONTH),
+            exclude=list(trips),
+        )
+    
+    @classmethod
+    def calculate_diet_footprint(cls, household, month, archived=None):
         """Calculate diet-related carbon footprint"""
-        diet_data = Diet.objects.filter(
-            household=household, 
-            month=month
+        return cls.activity_footprint(
+            Diet, household, month, archived,
+            cls.FOOD_EMISSION_FACTORS, F('consumption_kg'),
         )
-        
-        total_footprint = Decimal('0.0')
-        for diet in diet_data:
-            factor = cls.FOOD_EMISSION_FACTORS.get(diet.food_type, 0)
-            footprint = diet.consumption_kg * Decimal(str(factor))
-            total_footprint += footprint
-            
-        return total_footprint
     
     @classmethod
-    def calculate_waste_footprint(cls, household, month):
+    def calculate_waste_footprint(cls, household, month, archived=None):
         """Calculate waste-related carbon footprint"""
-        waste_data = Waste.objects.filter(
-            household=household, 
-            month=month
+        return cls.activity_footprint(
+            Waste, household, month, archived,
+            cls.WASTE_EMISSION_FACTORS, F('quantity_kg'),
         )
-        
-        total_footprint = Decimal('0.0')
-        for waste in waste_data:
-            factor = cls.WASTE_EMISSION_FACTORS.get(waste.waste_type, 0)
-            footprint = waste.quantity_kg * Decimal(str(factor))
-            total_footprint += footprint
-            
-        return total_footprint
     
     @classmethod
     def calculate_total_footprint(cls, household, month):
         """Calculate total carbon footprint for a household"""
-        energy_footprint = cls.calculate_energy_footprint(household, month)
-        transport_footprint = cls.calculate_transport_footprint(household, month)
-        diet_footprint = cls.calculate_diet_footprint(household, month)
-        waste_footprint = cls.calculate_waste_footprint(household, month)
+        archived = cls.archived_rows(household, month)
+        energy_footprint = cls.calculate_energy_footprint(household, month, archived)
+        transport_footprint = cls.calculate_transport_footprint(household, month, archived)
+        diet_footprint = cls.calculate_diet_footprint(household, month, archived)
+        waste_footprint = cls.calculate_waste_footprint(household, month, archived)
         
         total_footprint = (
             energy_footprint + 
@@ -143,6 +217,85 @@ class CarbonCalculator:
             'waste': waste_footprint,
         }
     
+    @classmethod
+    def calculate_footprints(cls, household, months):
+        """Calculate total carbon footprints for several months, keyed by month.
+
+        Gives the same figures as calculate_total_footprint with a fixed
+        number of queries: one grouped by month and type per activity table,
+        plus one each for archives and logged trips.
+        """
+        from .grid import grid_factors
+        months = sorted(set(months))
+        using = household_db(household.id)
+
+        archived = {}
+        for archive in ActivityArchive.objects.using(using).filter(household=household, month__in=months):
+            from .archive import unpack
+            archived[archive.month] = unpack(archive.data, household, archive.month)
+        trips = defaultdict(dict)
+        for month, vehicle, distance in (
+            TripMonth.objects.filter(household=household, month__in=months)
+            .values_list('month', 'vehicle_type', 'distance_km')
+        ):
+            trips[month][vehicle] = distance
+        live = {}
+        for model, (_, type_field, _) in ACTIVITIES.items():
+            live[model] = defaultdict(dict)
+            for row in (
+                model.objects.using(using).filter(household=household, month__in=months)
+                .values('month', type_field)
+                .annotate(quantity=Sum(
+                    cls.MONTHLY_QUANTITY[model],
+                    output_field=DecimalField(max_digits=20, decimal_places=6),
+                ))
+            ):
+                live[model][row['month']][row[type_field]] = row['quantity']
+
+        factors = {
+            EnergyUsage: cls.ENERGY_EMISSION_FACTORS,
+            Transportation: cls.TRANSPORT_EMISSION_FACTORS,
+            Diet: cls.FOOD_EMISSION_FACTORS,
+            Waste: cls.WASTE_EMISSION_FACTORS,
+        }
+        grid = grid_factors()
+        results = {}
+        for month in months:
+            factors[EnergyUsage] = {
+                **cls.ENERGY_EMISSION_FACTORS,
+                'electricity': grid.factor(household.state, month),
+            }
+            footprint = {'energy': Decimal('0.0'), 'diet': Decimal('0.0'), 'waste': Decimal('0.0')}
+            footprint['transport'] = sum(
+                (
+                    distance * Decimal(str(cls.TRANSPORT_EMISSION_FACTORS.get(vehicle, 0)))
+                    for vehicle, distance in trips[month].items()
+                ),
+                Decimal('0.0'),
+            )
+            for model, (activity, type_field, row_quantity) in ACTIVITIES.items():
+                # Logged trips replace the weekly estimate for their vehicle
+                exclude = trips[month] if model is Transportation else {}
+                quantities = {
+                    key: quantity for key, quantity in live[model][month].items() if key not in exclude
+                }
+                for row in archived.get(month, {}).get(model, ()):
+                    key = getattr(row, type_field)
+                    if key not in live[model][month] and key not in exclude:
+                        quantities[key] = row_quantity(row) * cls.quantity_multiplier(model)
+                footprint[activity] += sum(
+                    (
+                        quantity * Decimal(str(factors[model].get(key, 0)))
+                        for key, quantity in quantities.items()
+                    ),
+                    Decimal('0.0'),
+                )
+            footprint['total'] = (
+                footprint['energy'] + footprint['transport'] + footprint['diet'] + footprint['waste']
+            )
+            results[month] = footprint
+        return results
+    
     @classmethod
     def get_indian_average_footprint(cls):
         """Get average Indian household carbon footprint (per person per month)"""
@@ -164,6 +317,109 @@ class CarbonCalculator:
             return 'high', 'Your footprint is high. Consider making changes.'
 
 
+def upsert_activities(household, rows, score=True):
+    """Insert activity rows, replacing any row for the same month and type.
+
+    Rows are normalised and scored for anomalies first (bulk_create bypasses
+    the pre_save hook), then written with one INSERT ... ON CONFLICT DO UPDATE statement
+    per model, so resubmitting a form never creates duplicates and
+    concurrent submissions cannot race. A resubmitted row replaces the old
+    one in the anomaly sketches too, rather than being counted twice. With
+    ``score=False`` rows are stored unscored and the sketches left alone,
+    for figures that are not a whole month yet.
+    """
+    by_model = defaultdict(list)
+    for row in rows:
+        row.household = household
+        normalise_row(row)
+        by_model[type(row)].append(row)
+
+    # Sketches are on the default database, the rows on their shard; the
+    # sketch lock is held until the rows are written
+    with transaction.atomic(), transaction.atomic(using=household_db(household.id), savepoint=False):
+        if score:
+            score_rows(rows, household, replacing=True)
+        for model, objs in by_model.items():
+            _, type_field, _ = ACTIVITIES[model]
+            unique_fields = ['household', 'month', type_field]
+            update_fields = [
+                field.name for field in model._meta.concrete_fields
+                if not field.primary_key and field.name not in unique_fields
+                and field.name != 'created_at'
+            ]
+            model.objects.using(household_db(household.id)).bulk_create(
+                objs,
+                update_conflicts=True,
+                unique_fields=unique_fields,
+                update_fields=update_fields,
+            )
+    return rows
+
+
+def upsert_footprint(household, month, footprint_data):
+    """Store a calculated footprint with a single upsert statement"""
+    return upsert_footprints(household, {month: footprint_data})[0]
+
+
+def upsert_footprints(household, footprints_by_month):
+    """Store calculated footprints for any number of months with a single upsert statement.
+
+    When the household belongs to organisations their rollups are updated
+    too, with one UPDATE per month. The household's city and state
+    leaderboards are updated and open dashboards are sent the new figures.
+    """
+    objs = [
+        CarbonFootprint(
+            household=household,
+            month=month,
+            total_footprint=footprint_data['total'],
+            energy_footprint=footprint_data['energy'],
+            transport_footprint=footprint_data['transport'],
+            diet_footprint=footprint_data['diet'],
+            waste_footprint=footprint_data['waste'],
+        )
+        for month, footprint_data in footprints_by_month.items()
+    ]
+    footprints = CarbonFootprint.objects.using(household_db(household.id))
+    organisations = household_organisations(household.id)
+    if not organisations:
+        footprints.bulk_create(
+            objs,
+            update_conflicts=True,
+            unique_fields=['household', 'month'],
+            update_fields=ROLLUP_FIELDS,
+        )
+        place_footprints(household, [(footprint.month, footprint.total_footprint) for footprint in objs])
+        record_events(objs)
+        return objs
+
+    months = list(footprints_by_month)
+    # Rollups are on the default database, the footprints on their shard
+    with transaction.atomic(), transaction.atomic(using=household_db(household.id), savepoint=False):
+        # Touch the rollup rows first so the write lock is held before the
+        # old figures are read and concurrent recalculations serialise.
+        ensure_rollups(organisations, *months)
+        old = {
+            row.pop('month'): row
+            for row in footprints.select_for_update()
+            .filter(household=household, month__in=months)
+            .values('month', *ROLLUP_FIELDS)
+        }
+        footprints.bulk_create(
+            objs,
+            update_conflicts=True,
+            unique_fields=['household', 'month'],
+            update_fields=ROLLUP_FIELDS,
+        )
+        for footprint in objs:
+            apply_delta(
+                organisations, footprint.month, old=old.get(footprint.month), new=figures(footprint), ensure=False
+            )
+        place_footprints(household, [(footprint.month, footprint.total_footprint) for footprint in objs])
+        record_events(objs)
+    return objs
+
+
 def create_sample_tips():
     """Create sample sustainability tips for Indian context"""
     tips_data = [
@@ -1,22 +1,93 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib import messages
-from django.http import JsonResponse
-from django.db.models import Sum, Avg
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.db.models import Sum
 from django.utils import timezone
 from datetime import datetime, date
 from decimal import Decimal
 import json
 
 from .models import (
-    Household, EnergyUsage, Transportation, Diet, Waste, 
-    CarbonFootprint, SustainabilityTip
+    EnergyUsage, Transportation, Diet, Waste, 
+    SustainabilityTip, Organisation, OrganisationRollup
 )
 from .forms import (
     UserRegistrationForm, HouseholdForm, EnergyUsageForm, 
-    TransportationForm, DietForm, WasteForm, BulkDataForm
+    TransportationForm, DietForm, WasteForm, BulkDataForm, MonthRangeForm, ScenarioForm, TipSearchForm
 )
-from .utils import CarbonCalculator, create_sample_tips
+from .utils import (
+    CarbonCalculator, create_sample_tips, upsert_activities, upsert_footprint, upsert_footprints
+)
+from .anomalies import ACTIVITIES
+from .apikeys import api_auth
+from .caching import get_tips_version
+from .leaderboards import TOP, boards
+from .live import poll_events, stream
+from .middleware import get_household, get_household_or_404, household_shard
+from .replica import replica_reads
+from .rollups import FIELDS as FOOTPRINT_FIELDS
+from .search import LIMIT as SEARCH_LIMIT, search_tips
+
+# The NumPy-backed engines (scenarios, snapshot, forecasting) are imported
+# inside the views that use them, so booting a worker or running a
+# management command does not pay for NumPy until it is needed.
+
+
+def warn_if_anomalous(request, rows):
+    """Ask the user to double-check values flagged as outliers"""
+    for row in rows:
+        if row.is_anomaly:
+            _, type_field, _ = ACTIVITIES[type(row)]
+            label = getattr(row, f'get_{type_field}_display')()
+            direction = 'high' if row.anomaly_score > 0 else 'low'
+            messages.warning(
+                request,
+                f'{label} for {row.month:%B %Y} looks unusually {direction} compared to '
+                'similar households. Please double-check the value you entered.'
+            )
+
+
+# Columns the read paths load instead of whole CarbonFootprint/FootprintForecast rows
+FOOTPRINT_COLUMNS = ('month', *FOOTPRINT_FIELDS)
+
+
+def recent_footprints(household):
+    """The household's footprints for the chart, as named (month, figures) rows"""
+    return list(
+        household.carbonfootprint_set.order_by('month').values_list(*FOOTPRINT_COLUMNS, named=True)[:12]
+    )
+
+
+# Chart series: (dataset label, CarbonFootprint field, line colour, fill colour)
+CHART_SERIES = [
+    ('Total Footprint', 'total_footprint', '#28a745', 'rgba(40, 167, 69, 0.1)'),
+    ('Energy', 'energy_footprint', '#ffc107', 'rgba(255, 193, 7, 0.1)'),
+    ('Transport', 'transport_footprint', '#17a2b8', 'rgba(23, 162, 184, 0.1)'),
+    ('Diet', 'diet_footprint', '#dc3545', 'rgba(220, 53, 69, 0.1)'),
+    ('Waste', 'waste_footprint', '#6c757d', 'rgba(108, 117, 125, 0.1)'),
+]
+
+
+def chart_data(footprints):
+    """Chart.js data for rows from recent_footprints, oldest month first"""
+    # Transpose the rows once instead of walking them for every series
+    columns = dict(zip(FOOTPRINT_COLUMNS, zip(*footprints)))
+    return {
+        'labels': [month.strftime('%b %Y') for month in columns.get('month', ())],
+        'datasets': [
+            {
+                'label': label,
+                'data': [float(value) for value in columns.get(field, ())],
+                'borderColor': color,
+                'backgroundColor': fill,
+            }
+            for label, field, color, fill in CHART_SERIES
+        ],
+    }
 
 
 def home(request):
@@ -39,27 +110,28 @@ def register(request):
 
 
 @login_required
+@household_shard
+@replica_reads
 def dashboard(request):
     """Main dashboard view"""
-    try:
-        household = Household.objects.get(user=request.user)
-    except Household.DoesNotExist:
+    household = get_household(request)
+    if household is None:
         return redirect('setup_household')
     
     # Get current month's footprint
     current_month = date.today().replace(day=1)
-    try:
-        current_footprint = CarbonFootprint.objects.get(
-            household=household, 
-            month=current_month
-        )
-    except CarbonFootprint.DoesNotExist:
-        current_footprint = None
-    
-    # Get historical data for charts
-    footprints = CarbonFootprint.objects.filter(
-        household=household
-    ).order_by('month')[:12]  # Last 12 months
+    current_footprint = household.carbonfootprint_set.filter(
+        month=current_month
+    ).only('household', *FOOTPRINT_COLUMNS).first()
+    
+    # Get historical data for charts, loaded once for the page and the
+    # chart series embedded in it
+    footprints = recent_footprints(household)  # Last 12 months
+    
+    # Get forecasts written by the forecast_footprints batch job
+    forecasts = list(household.footprintforecast_set.filter(
+        month__gt=current_month
+    ).order_by('month').values_list(*FOOTPRINT_COLUMNS, named=True))
     
     # Get tips
     tips = SustainabilityTip.objects.filter(indian_context=True)[:5]
@@ -77,10 +149,14 @@ def dashboard(request):
         'household': household,
         'current_footprint': current_footprint,
         'footprints': footprints,
+        'chart_data': chart_data(footprints),
+        'forecasts': forecasts,
         'tips': tips,
         'per_person': per_person,
         'category': category,
         'message': message,
+        'tips_version': get_tips_version(),
+        'fragment_timeout': settings.FRAGMENT_CACHE_TIMEOUT,
     }
     
     return render(request, 'footprint/dashboard.html', context)
@@ -104,16 +180,17 @@ def setup_household(request):
 
 
 @login_required
+@household_shard
 def add_energy_data(request):
     """Add energy usage data"""
-    household = get_object_or_404(Household, user=request.user)
+    household = get_household_or_404(request)
     
     if request.method == 'POST':
         form = EnergyUsageForm(request.POST)
         if form.is_valid():
             energy_data = form.save(commit=False)
-            energy_data.household = household
-            energy_data.save()
+            upsert_activities(household, [energy_data])
+            warn_if_anomalous(request, [energy_data])
             messages.success(request, 'Energy data added successfully!')
             return redirect('dashboard')
     else:
@@ -123,16 +200,17 @@ def add_energy_data(request):
 
 
 @login_required
+@household_shard
 def add_transport_data(request):
     """Add transportation data"""
-    household = get_object_or_404(Household, user=request.user)
+    household = get_household_or_404(request)
     
     if request.method == 'POST':
         form = TransportationForm(request.POST)
         if form.is_valid():
             transport_data = form.save(commit=False)
-            transport_data.household = household
-            transport_data.save()
+            upsert_activities(household, [transport_data])
+            warn_if_anomalous(request, [transport_data])
             messages.success(request, 'Transportation data added successfully!')
             return redirect('dashboard')
     else:
@@ -142,16 +220,17 @@ def add_transport_data(request):
 
 
 @login_required
+@household_shard
 def add_diet_data(request):
     """Add dietary consumption data"""
-    household = get_object_or_404(Household, user=request.user)
+    household = get_household_or_404(request)
     
     if request.method == 'POST':
         form = DietForm(request.POST)
         if form.is_valid():
             diet_data = form.save(commit=False)
-            diet_data.household = household
-            diet_data.save()
+            upsert_activities(household, [diet_data])
+            warn_if_anomalous(request, [diet_data])
             messages.success(request, 'Diet data added successfully!')
             return redirect('dashboard')
     else:
@@ -161,16 +240,17 @@ def add_diet_data(request):
 
 
 @login_required
+@household_shard
 def add_waste_data(request):
     """Add waste generation data"""
-    household = get_object_or_404(Household, user=request.user)
+    household = get_household_or_404(request)
     
     if request.method == 'POST':
         form = WasteForm(request.POST)
         if form.is_valid():
             waste_data = form.save(commit=False)
-            waste_data.household = household
-            waste_data.save()
+            upsert_activities(household, [waste_data])
+            warn_if_anomalous(request, [waste_data])
             messages.success(request, 'Waste data added successfully!')
             return redirect('dashboard')
     else:
@@ -180,106 +260,110 @@ def add_waste_data(request):
 
 
 @login_required
+@household_shard
 def bulk_data_entry(request):
     """Bulk data entry form"""
-    household = get_object_or_404(Household, user=request.user)
+    household = get_household_or_404(request)
     
     if request.method == 'POST':
         form = BulkDataForm(request.POST)
         if form.is_valid():
             month = form.cleaned_data['month']
+            rows = []
             
             # Save energy data
             if form.cleaned_data['electricity_kwh']:
-                EnergyUsage.objects.create(
+                rows.append(EnergyUsage(
                     household=household,
                     fuel_type='electricity',
                     consumption=form.cleaned_data['electricity_kwh'],
                     unit='kWh',
                     month=month
-                )
+                ))
             
             if form.cleaned_data['lpg_kg']:
-                EnergyUsage.objects.create(
+                rows.append(EnergyUsage(
                     household=household,
                     fuel_type='lpg',
                     consumption=form.cleaned_data['lpg_kg'],
                     unit='kg',
                     month=month
-                )
+                ))
             
             # Save transport data
             if form.cleaned_data['car_km']:
-                Transportation.objects.create(
+                rows.append(Transportation(
                     household=household,
                     vehicle_type='car_petrol',
                     distance_km=form.cleaned_data['car_km'],
                     frequency_per_week=1,
                     month=month
-                )
+                ))
             
             if form.cleaned_data['bike_km']:
-                Transportation.objects.create(
+                rows.append(Transportation(
                     household=household,
                     vehicle_type='bike_petrol',
                     distance_km=form.cleaned_data['bike_km'],
                     frequency_per_week=1,
                     month=month
-                )
+                ))
             
             if form.cleaned_data['bus_km']:
-                Transportation.objects.create(
+                rows.append(Transportation(
                     household=household,
                     vehicle_type='bus',
                     distance_km=form.cleaned_data['bus_km'],
                     frequency_per_week=1,
                     month=month
-                )
+                ))
             
             # Save diet data
             if form.cleaned_data['rice_kg']:
-                Diet.objects.create(
+                rows.append(Diet(
                     household=household,
                     food_type='rice',
                     consumption_kg=form.cleaned_data['rice_kg'],
                     month=month
-                )
+                ))
             
             if form.cleaned_data['wheat_kg']:
-                Diet.objects.create(
+                rows.append(Diet(
                     household=household,
                     food_type='wheat',
                     consumption_kg=form.cleaned_data['wheat_kg'],
                     month=month
-                )
+                ))
             
             if form.cleaned_data['milk_kg']:
-                Diet.objects.create(
+                rows.append(Diet(
                     household=household,
                     food_type='milk',
                     consumption_kg=form.cleaned_data['milk_kg'],
                     month=month
-                )
+                ))
             
             # Save waste data
             if form.cleaned_data['organic_waste_kg']:
-                Waste.objects.create(
+                rows.append(Waste(
                     household=household,
                     waste_type='organic',
                     quantity_kg=form.cleaned_data['organic_waste_kg'],
                     month=month
-                )
+                ))
             
             if form.cleaned_data['plastic_waste_kg']:
-                Waste.objects.create(
+                rows.append(Waste(
                     household=household,
                     waste_type='plastic',
                     quantity_kg=form.cleaned_data['plastic_waste_kg'],
                     month=month
-                )
+                ))
             
+            upsert_activities(household, rows)
             messages.success(request, 'Bulk data added successfully!')
-            return redirect('calculate_footprint', month=month.strftime('%Y-%m'))
+            warn_if_anomalous(request, rows)
+            return redirect('calculate_footprint_month', month=month.strftime('%Y-%m'))
     else:
         form = BulkDataForm()
     
@@ -287,9 +371,10 @@ def bulk_data_entry(request):
 
 
 @login_required
+@household_shard
 def calculate_footprint(request, month=None):
     """Calculate carbon footprint for a specific month"""
-    household = get_object_or_404(Household, user=request.user)
+    household = get_household_or_404(request)
     
     if month:
         try:
@@ -304,17 +389,7 @@ def calculate_footprint(request, month=None):
     footprint_data = CarbonCalculator.calculate_total_footprint(household, month_date)
     
     # Save or update footprint
-    footprint, created = CarbonFootprint.objects.update_or_create(
-        household=household,
-        month=month_date,
-        defaults={
-            'total_footprint': footprint_data['total'],
-            'energy_footprint': footprint_data['energy'],
-            'transport_footprint': footprint_data['transport'],
-            'diet_footprint': footprint_data['diet'],
-            'waste_footprint': footprint_data['waste'],
-        }
-    )
+    footprint = upsert_footprint(household, month_date, footprint_data)
     
     # Get per person footprint
     per_person = footprint.total_footprint / household.family_size
@@ -331,26 +406,109 @@ def calculate_footprint(request, month=None):
         'message': message,
         'indian_averages': indian_averages,
         'month': month_date,
+        'fragment_timeout': settings.FRAGMENT_CACHE_TIMEOUT,
     }
     
     return render(request, 'footprint/calculate_footprint.html', context)
 
 
 @login_required
+@household_shard
+def calculate_range(request):
+    """Calculate and store carbon footprints for a range of months in one request"""
+    household = get_household_or_404(request)
+    
+    today = date.today()
+    form = MonthRangeForm(request.POST or None, initial={
+        'start': date(today.year, 1, 1) if today.month == 12 else date(today.year - 1, today.month + 1, 1),
+        'end': today.replace(day=1),
+    })
+    
+    footprints = []
+    if request.method == 'POST' and form.is_valid():
+        results = CarbonCalculator.calculate_footprints(household, form.months())
+        footprints = upsert_footprints(household, results)
+        messages.success(request, f'Calculated {len(footprints)} months.')
+    
+    context = {
+        'household': household,
+        'form': form,
+        'rows': [(footprint, footprint.total_footprint / household.family_size) for footprint in footprints],
+        'total': sum((footprint.total_footprint for footprint in footprints), Decimal('0')),
+    }
+    
+    return render(request, 'footprint/calculate_range.html', context)
+
+
+@api_auth
+@household_shard
+def api_calculate_range(request):
+    """API endpoint to calculate and store a range of months.
+
+    POST a JSON body ``{"from": "2025-01", "to": "2025-12"}``; every month
+    in the range is calculated and stored, and the figures returned.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'POST required'}, status=405)
+    household = get_household_or_404(request)
+    
+    try:
+        payload = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Body must be JSON'}, status=400)
+    if not isinstance(payload, dict):
+        return JsonResponse({'error': 'Body must be a JSON object'}, status=400)
+    form = MonthRangeForm({'start': payload.get('from'), 'end': payload.get('to')})
+    if not form.is_valid():
+        names = {'start': 'from', 'end': 'to'}
+        errors = [
+            f'{names[field]}: {error}' if field in names else error
+            for field, field_errors in form.errors.items() for error in field_errors
+        ]
+        return JsonResponse({'error': '; '.join(errors)}, status=400)
+    
+    results = CarbonCalculator.calculate_footprints(household, form.months())
+    footprints = upsert_footprints(household, results)
+    return JsonResponse({
+        'months': [
+            {
+                'month': footprint.month.strftime('%Y-%m'),
+                'total': round(float(footprint.total_footprint), 2),
+                'energy': round(float(footprint.energy_footprint), 2),
+                'transport': round(float(footprint.transport_footprint), 2),
+                'diet': round(float(footprint.diet_footprint), 2),
+                'waste': round(float(footprint.waste_footprint), 2),
+            }
+            for footprint in footprints
+        ],
+    })
+
+
+@login_required
+@replica_reads
 def tips(request):
-    """Sustainability tips page"""
-    category = request.GET.get('category', '')
-    
-    if category:
-        tips = SustainabilityTip.objects.filter(
-            category=category, 
-            indian_context=True
-        )
+    """Sustainability tips page, searched with ``?q=`` and filtered by category and impact"""
+    form = TipSearchForm(request.GET)
+    query = category = ''
+    min_impact = None
+    if form.is_valid():
+        query = form.cleaned_data['q'].strip()
+        category = form.cleaned_data['category']
+        min_impact = form.cleaned_data['min_impact']
+    
+    if query:
+        tips = search_tips(query, category, min_impact)
     else:
         tips = SustainabilityTip.objects.filter(indian_context=True)
+        if category:
+            tips = tips.filter(category=category)
+        if min_impact is not None:
+            tips = tips.filter(impact_kg_co2__gte=min_impact)
     
     context = {
         'tips': tips,
+        'form': form,
+        'query': query,
         'selected_category': category,
     }
     
@@ -358,24 +516,20 @@ def tips(request):
 
 
 @login_required
+@household_shard
+@replica_reads
 def reports(request):
     """Generate reports and analytics"""
-    household = get_object_or_404(Household, user=request.user)
+    household = get_household_or_404(request)
     
     # Get last 12 months of data
-    footprints = CarbonFootprint.objects.filter(
-        household=household
-    ).order_by('month')[:12]
+    footprints = recent_footprints(household)
     
-    # Calculate averages
+    # Calculate averages over the rows already loaded
+    averages = dict.fromkeys(FOOTPRINT_FIELDS, 0)
     if footprints:
-        avg_total = footprints.aggregate(Avg('total_footprint'))['total_footprint__avg']
-        avg_energy = footprints.aggregate(Avg('energy_footprint'))['energy_footprint__avg']
-        avg_transport = footprints.aggregate(Avg('transport_footprint'))['transport_footprint__avg']
-        avg_diet = footprints.aggregate(Avg('diet_footprint'))['diet_footprint__avg']
-        avg_waste = footprints.aggregate(Avg('waste_footprint'))['waste_footprint__avg']
-    else:
-        avg_total = avg_energy = avg_transport = avg_diet = avg_waste = 0
+        columns = dict(zip(FOOTPRINT_COLUMNS, zip(*footprints)))
+        averages = {field: sum(columns[field]) / len(footprints) for field in FOOTPRINT_FIELDS}
     
     # Get Indian averages
     indian_averages = CarbonCalculator.get_indian_average_footprint()
@@ -383,11 +537,11 @@ def reports(request):
     context = {
         'household': household,
         'footprints': footprints,
-        'avg_total': avg_total,
-        'avg_energy': avg_energy,
-        'avg_transport': avg_transport,
-        'avg_diet': avg_diet,
-        'avg_waste': avg_waste,
+        'avg_total': averages['total_footprint'],
+        'avg_energy': averages['energy_footprint'],
+        'avg_transport': averages['transport_footprint'],
+        'avg_diet': averages['diet_footprint'],
+        'avg_waste': averages['waste_footprint'],
         'indian_averages': indian_averages,
     }
     
@@ -395,53 +549,402 @@ def reports(request):
 
 
 @login_required
+@household_shard
+@replica_reads
 def api_footprint_data(request):
     """API endpoint for chart data"""
-    household = get_object_or_404(Household, user=request.user)
+    household = get_household_or_404(request)
+    
+    return JsonResponse(chart_data(recent_footprints(household)))
+
+
+@login_required
+@household_shard
+def api_footprint_stream(request):
+    """Server-sent events with the household's footprints as they are saved.
+
+    Served through asgi.py the response stays open and pushes each change
+    as it happens; under WSGI it returns the changes since the browser's
+    ``Last-Event-ID`` and asks it to reconnect later, so the dashboard polls.
+    """
+    household = get_household_or_404(request)
+    try:
+        last_event_id = int(request.headers['Last-Event-ID'])
+    except (KeyError, ValueError):
+        last_event_id = None
+    
+    if isinstance(request, ASGIRequest):
+        response = StreamingHttpResponse(stream(household.pk, last_event_id), content_type='text/event-stream')
+    else:
+        response = HttpResponse(poll_events(household.pk, last_event_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@login_required
+@household_shard
+def scenarios(request):
+    """What-if simulator: apply substitutions to the household's history"""
+    from .scenarios import ScenarioError, parse_substitution, simulate
+    household = get_household_or_404(request)
+    form = ScenarioForm(request.GET or None)
+    
+    substitutions = []
+    if form.is_valid():
+        try:
+            substitutions = [parse_substitution(s) for s in form.substitutions()]
+        except ScenarioError as exc:
+            form.add_error(None, str(exc))
+    
+    try:
+        result = simulate(household, substitutions)
+    except ScenarioError as exc:
+        form.add_error(None, str(exc))
+        result = simulate(household)
+    
+    context = {
+        'household': household,
+        'form': form,
+        'result': result,
+    }
     
-    footprints = CarbonFootprint.objects.filter(
-        household=household
-    ).order_by('month')[:12]
+    return render(request, 'footprint/scenarios.html', context)
+
+
+@login_required
+@household_shard
+def api_scenarios(request):
+    """API endpoint for the what-if simulator.
+
+    Substitutions are passed as repeated ``swap=source:target[:fraction]``
+    parameters, e.g. ``?swap=car_petrol:metro&swap=lpg:biogas:0.5``.
+    """
+    from .scenarios import ScenarioError, parse_substitution, simulate
+    household = get_household_or_404(request)
+    
+    try:
+        substitutions = [parse_substitution(s) for s in request.GET.getlist('swap')]
+        limit = max(min(int(request.GET.get('limit', 10)), 100), 0)
+        result = simulate(household, substitutions, limit=limit)
+    except (ScenarioError, ValueError) as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+    
+    return JsonResponse(result)
+
+
+@api_auth
+@household_shard
+def api_meter_readings(request):
+    """API endpoint for smart-meter uploads.
+
+    POST a JSON body ``{"readings": [{"timestamp": "...", "kwh": 0.12}, ...]}``
+    with 15-minute readings; they roll up into the month's electricity usage.
+    Meters authenticate with an API key (see apikeys.api_auth).
+    """
+    from .metering import MeterError, ingest_readings
+    
+    if request.method != 'POST':
+        return JsonResponse({'error': 'POST required'}, status=405)
+    household = get_household_or_404(request)
+    
+    try:
+        payload = json.loads(request.body)
+        result = ingest_readings(household, payload.get('readings') if isinstance(payload, dict) else None)
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Body must be JSON'}, status=400)
+    except MeterError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+    
+    return JsonResponse(result)
+
+
+@api_auth
+@household_shard
+def api_trips(request):
+    """API endpoint for trip uploads from the mobile app.
+
+    POST a JSON body ``{"batch_id": "...", "trips": [{"mode": "bus",
+    "distance_km": 7.5, "date": "2025-03-04"}, ...]}``; a batch_id that was
+    already applied is acknowledged without being counted twice. The app
+    authenticates with an API key (see apikeys.api_auth).
+    """
+    from .trips import TripError, ingest_trips
+    
+    if request.method != 'POST':
+        return JsonResponse({'error': 'POST required'}, status=405)
+    household = get_household_or_404(request)
+    
+    try:
+        payload = json.loads(request.body)
+        if not isinstance(payload, dict):
+            raise TripError('Body must be a JSON object.')
+        result = ingest_trips(household, payload.get('trips'), batch_id=payload.get('batch_id'))
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Body must be JSON'}, status=400)
+    except TripError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+    
+    return JsonResponse(result)
+
+
+@login_required
+@household_shard
+def api_load_profile(request):
+    """API endpoint for the average time-of-day electricity profile.
+
+    Optional ``from`` and ``to`` parameters (YYYY-MM) limit the months used.
+    """
+    from .metering import load_profile
+    
+    household = get_household_or_404(request)
+    
+    try:
+        start, end = [
+            datetime.strptime(request.GET[key], '%Y-%m').date() if request.GET.get(key) else None
+            for key in ('from', 'to')
+        ]
+    except ValueError:
+        return JsonResponse({'error': 'from and to must be YYYY-MM'}, status=400)
+    
+    return JsonResponse(load_profile(household, start, end))
+
+
+def _leaderboard_month(household, value):
+    """Month requested as YYYY-MM, defaulting to the household's latest footprint"""
+    if value:
+        return datetime.strptime(value, '%Y-%m').date()
+    latest = household.carbonfootprint_set.order_by('-month').values_list('month', flat=True).first()
+    return latest or date.today().replace(day=1)
+
+
+@login_required
+@household_shard
+@replica_reads
+def leaderboard(request):
+    """Lowest footprints per person in the household's city and state"""
+    household = get_household(request)
+    if household is None:
+        return redirect('setup_household')
+    
+    try:
+        month = _leaderboard_month(household, request.GET.get('month'))
+    except ValueError:
+        messages.error(request, 'Invalid month format.')
+        month = _leaderboard_month(household, None)
+    
+    context = {
+        'household': household,
+        'month': month,
+        'boards': boards(household, month),
+    }
+    
+    return render(request, 'footprint/leaderboard.html', context)
+
+
+@login_required
+@household_shard
+@replica_reads
+def api_leaderboard(request):
+    """API endpoint for the household's city and state leaderboards.
+
+    ``?month=YYYY-MM`` picks the month (default: the latest with a
+    footprint) and ``?limit=`` the number of households listed.
+    """
+    household = get_household_or_404(request)
+    
+    try:
+        month = _leaderboard_month(household, request.GET.get('month'))
+        limit = max(min(int(request.GET.get('limit', TOP)), 100), 0)
+    except ValueError:
+        return JsonResponse({'error': 'month must be YYYY-MM and limit a number'}, status=400)
     
     data = {
-        'labels': [f.month.strftime('%b %Y') for f in footprints],
-        'datasets': [
+        'month': month.strftime('%Y-%m'),
+        'boards': [
             {
-                'label': 'Total Footprint',
-                'data': [float(f.total_footprint) for f in footprints],
-                'borderColor': '#28a745',
-                'backgroundColor': 'rgba(40, 167, 69, 0.1)',
-            },
-            {
-                'label': 'Energy',
-                'data': [float(f.energy_footprint) for f in footprints],
-                'borderColor': '#ffc107',
-                'backgroundColor': 'rgba(255, 193, 7, 0.1)',
-            },
-            {
-                'label': 'Transport',
-                'data': [float(f.transport_footprint) for f in footprints],
-                'borderColor': '#17a2b8',
-                'backgroundColor': 'rgba(23, 162, 184, 0.1)',
-            },
+                'scope': board['scope'],
+                'region': board['region'],
+                'rank': board['rank'],
+                'households': board['households'],
+                'per_person': float(board['per_person']) if board['per_person'] is not None else None,
+                'top': [
+                    {
+                        'rank': row['rank'],
+                        'name': row['name'],
+                        'per_person': float(row['per_person']),
+                        'you': row['household_id'] == household.pk,
+                    }
+                    for row in board['top']
+                ],
+            }
+            for board in boards(household, month, limit)
+        ],
+    }
+    
+    return JsonResponse(data)
+
+
+@login_required
+@replica_reads
+def api_tip_search(request):
+    """API endpoint for full-text tip search.
+
+    ``?q=`` is matched against titles and descriptions, best match first;
+    ``?category=``, ``?min_impact=`` and ``?limit=`` narrow the results.
+    """
+    form = TipSearchForm(request.GET)
+    try:
+        limit = min(int(request.GET.get('limit', SEARCH_LIMIT)), SEARCH_LIMIT)
+    except ValueError:
+        return JsonResponse({'error': 'limit must be a number'}, status=400)
+    if not form.is_valid():
+        errors = [
+            f'{field}: {error}' for field, field_errors in form.errors.items() for error in field_errors
+        ]
+        return JsonResponse({'error': '; '.join(errors)}, status=400)
+
+    query = form.cleaned_data['q'].strip()
+    results = search_tips(
+        query, form.cleaned_data['category'], form.cleaned_data['min_impact'], max(limit, 1)
+    ) if query else []
+    return JsonResponse({
+        'query': query,
+        'tips': [
             {
-                'label': 'Diet',
-                'data': [float(f.diet_footprint) for f in footprints],
-                'borderColor': '#dc3545',
-                'backgroundColor': 'rgba(220, 53, 69, 0.1)',
-            },
+                'id': tip.pk,
+                'title': tip.title,
+                'description': tip.description,
+                'category': tip.category,
+                'impact_kg_co2': float(tip.impact_kg_co2),
+            }
+            for tip in results
+        ],
+    })
+
+
+def _managed_organisations(user):
+    """Organisations a user may view: all for staff, otherwise the ones they manage"""
+    if user.is_staff:
+        return Organisation.objects.all()
+    return Organisation.objects.filter(managers=user)
+
+
+@login_required
+def organisations(request):
+    """List the organisations the user manages"""
+    context = {
+        'organisations': _managed_organisations(request.user).select_related('parent').order_by('name'),
+    }
+    
+    return render(request, 'footprint/organisations.html', context)
+
+
+@login_required
+def organisation_dashboard(request, pk):
+    """Organisation dashboard read entirely from pre-aggregated rollups"""
+    organisation = get_object_or_404(_managed_organisations(request.user).select_related('parent'), pk=pk)
+    
+    rollups = list(organisation.rollups.order_by('-month')[:12])
+    current = rollups[0] if rollups else None
+    children = []
+    if current:
+        child_rollups = OrganisationRollup.objects.filter(
+            organisation__parent=organisation, month=current.month
+        ).select_related('organisation').order_by('organisation__name')
+        children = list(child_rollups)
+    
+    context = {
+        'organisation': organisation,
+        'current': current,
+        'rollups': rollups,
+        'children': children,
+    }
+    
+    return render(request, 'footprint/organisation_dashboard.html', context)
+
+
+@login_required
+def api_organisation_rollups(request, pk):
+    """API endpoint for an organisation's monthly rollups"""
+    organisation = get_object_or_404(_managed_organisations(request.user), pk=pk)
+    
+    rollups = organisation.rollups.order_by('month')
+    data = {
+        'organisation': organisation.name,
+        'months': [
             {
-                'label': 'Waste',
-                'data': [float(f.waste_footprint) for f in footprints],
-                'borderColor': '#6c757d',
-                'backgroundColor': 'rgba(108, 117, 125, 0.1)',
-            },
-        ]
+                'month': r.month.isoformat(),
+                'households': r.household_count,
+                'total': float(r.total_footprint),
+                'energy': float(r.energy_footprint),
+                'transport': float(r.transport_footprint),
+                'diet': float(r.diet_footprint),
+                'waste': float(r.waste_footprint),
+                'average': float(r.average_footprint),
+            }
+            for r in rollups
+        ],
     }
     
     return JsonResponse(data)
 
 
+def _snapshot_month(snapshot, value):
+    """Month requested as YYYY-MM, defaulting to the latest in the snapshot"""
+    from .forecasting import ordinal_to_date
+    if value:
+        return datetime.strptime(value, '%Y-%m').date()
+    months = snapshot.months
+    return ordinal_to_date(int(months[-1])) if len(months) else None
+
+
+@staff_member_required
+def analytics(request):
+    """National and state analytics served from the memory-mapped snapshot"""
+    from .snapshot import AnalyticsSnapshot
+    snapshot = AnalyticsSnapshot.load()
+    context = {'snapshot': snapshot}
+    if snapshot is not None:
+        try:
+            month = _snapshot_month(snapshot, request.GET.get('month'))
+        except ValueError:
+            messages.error(request, 'Invalid month format.')
+            month = _snapshot_month(snapshot, None)
+        series = snapshot.national_series()
+        context.update({
+            'month': month,
+            'series': list(zip(
+                series['months'], series['households'],
+                series['total_per_household'], series['total_per_person'],
+            )),
+            'states': snapshot.state_breakdown(month) if month else [],
+        })
+    
+    return render(request, 'footprint/analytics.html', context)
+
+
+@staff_member_required
+def api_analytics(request):
+    """API endpoint for snapshot analytics; ``?month=YYYY-MM`` adds a state breakdown"""
+    from .snapshot import AnalyticsSnapshot
+    snapshot = AnalyticsSnapshot.load()
+    if snapshot is None:
+        return JsonResponse({'error': 'No analytics snapshot has been built yet.'}, status=503)
+    
+    data = {'meta': snapshot.meta, 'national': snapshot.national_series()}
+    if request.GET.get('month'):
+        try:
+            month = _snapshot_month(snapshot, request.GET['month'])
+        except ValueError:
+            return JsonResponse({'error': 'month must be YYYY-MM'}, status=400)
+        data['month'] = month.isoformat()
+        data['states'] = snapshot.state_breakdown(month)
+    
+    return JsonResponse(data)
+
+
 def setup_sample_data(request):
     """Setup sample data for demonstration"""
     if request.method == 'POST':